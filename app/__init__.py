@@ -7,7 +7,6 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from authlib.integrations.flask_client import OAuth
 from config import Config
-from app.database import create_database_if_not_exists
 
 # Inicializar extensiones globalmente para que sean importables en otros módulos
 db = SQLAlchemy()
@@ -30,10 +29,11 @@ def format_datetime_filter(value, format='%d de %b, %H:%M'):
 
 
 def create_app(config_class=Config):
-    """Application Factory Pattern para crear la instancia de Flask"""
-    # Crear la base de datos si no existe antes de inicializar SQLAlchemy
-    create_database_if_not_exists()
+    """Application Factory Pattern para crear la instancia de Flask.
 
+    No abre ninguna conexión: la creación de la base de datos, las migraciones
+    y el usuario administrador se hacen una vez por despliegue con `flask init`.
+    """
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_dir = os.path.dirname(current_dir)
 
@@ -62,11 +62,16 @@ def create_app(config_class=Config):
     )
     
     # --- Configurar el user loader para Flask-Login ---
-    from .models import User
+    # Con caché por proceso (USER_CACHE_*) para no consultar users en cada petición
+    from app.user_cache import cache_usuarios, cargar_usuario
+    cache_usuarios.init_app(app)
+    from app.recurrencia import cache_ocurrencias
+    cache_ocurrencias.init_app(app)
+    from app.pomodoro import buffer_sesiones
+    buffer_sesiones.init_app(app)
     @login_manager.user_loader
     def load_user(user_id):
-        # Se usa el nuevo modelo SQLAlchemy para cargar el usuario por su ID
-        return User.query.get(int(user_id))
+        return cargar_usuario(int(user_id))
 
     # --- Registrar Blueprints ---
     from app.routes import main_bp, auth_bp
@@ -75,6 +80,40 @@ def create_app(config_class=Config):
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     
+    # --- Registrar comandos CLI (flask db ..., flask init, flask purgar-usuarios, flask contadores ...,
+    # flask limpiar-eventos) ---
+    from app.migrations import db_cli
+    from app.bootstrap import init_command
+    from app.purga import purgar_command
+    from app.contadores import contadores_cli
+    from app.eventos import limpiar_eventos_command
+    app.cli.add_command(db_cli)
+    app.cli.add_command(init_command)
+    app.cli.add_command(purgar_command)
+    app.cli.add_command(contadores_cli)
+    app.cli.add_command(limpiar_eventos_command)
+
+    # --- Métricas por petición (/admin/metrics). Antes que la compresión:
+    # los after_request se ejecutan en orden inverso y así se mide el tamaño final ---
+    from app import metricas
+    metricas.init_app(app)
+
+    # --- Detector de N+1 y consultas lentas (DETECTOR_SQL_*, solo desarrollo y pruebas) ---
+    from app import detector_sql
+    detector_sql.init_app(app)
+
+    # --- Compresión gzip/brotli de las respuestas (COMPRESION_*) ---
+    from app import compresion
+    compresion.init_app(app)
+
+    # --- Fotos de perfil: procesado en segundo plano y caché immutable ---
+    from app import avatares
+    avatares.init_app(app)
+
+    # --- Bundles de CSS/JS con hash (flask assets build) y helper assets() ---
+    from app import assets
+    assets.init_app(app)
+
     # --- Registrar filtros de Jinja2 ---
     app.jinja_env.filters['format_datetime'] = format_datetime_filter
     
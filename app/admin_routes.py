@@ -1,60 +1,212 @@
-from flask import Blueprint, render_template, abort, redirect, url_for, flash
-from flask_login import current_user, login_required
-from app.database import get_db_connection
+import base64
+import json
+
+from flask import Blueprint, Response, render_template, abort, redirect, url_for, flash, jsonify, request
+from flask_login import current_user
+from app import db, login_manager, metricas, eventos
+from app.models import User, PurgaUsuario
+from app.purga import solicitar_purga
+from app.database import conexion_db, estadisticas_pool
+from app.user_cache import cache_usuarios, invalidar as invalidar_usuario
+from app.recurrencia import cache_ocurrencias
+from app.pomodoro import buffer_sesiones
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 @admin_bp.before_request
-@login_required
 def check_admin():
     """Protege todas las rutas de este blueprint para que solo sean accesibles por administradores."""
+    # /admin/metrics admite además el token del scraper de Prometheus (METRICAS_TOKEN)
+    if request.endpoint == 'admin.metrics' and metricas.token_valido():
+        return None
+    if not current_user.is_authenticated:
+        return login_manager.unauthorized()
     if not current_user.is_admin:
         abort(403)
 
+# --- Listado de usuarios: paginación por cursor, orden y búsqueda ---
+USUARIOS_POR_PAGINA = 50
+MAX_USUARIOS_POR_PAGINA = 200
+ORDENES_USUARIOS = {'id': User.id, 'name': User.name, 'email': User.email}
+# Con búsqueda, el total se cuenta como mucho hasta este límite ("más de N")
+LIMITE_CONTEO_BUSQUEDA = 1000
+# Sin búsqueda y por encima de este número de filas se usa la estimación de PostgreSQL
+UMBRAL_ESTIMACION_TOTAL = 10000
+# Máximo de cuentas por petición de borrado masivo
+MAX_USUARIOS_BORRADO_LOTE = 500
+# Trabajos de purga que se muestran en el panel
+PURGAS_RECIENTES = 20
+
+
+def _codificar_cursor_usuario(valor, user_id):
+    """Cursor opaco con la posición (columna de orden, id) del último usuario de la página."""
+    return base64.urlsafe_b64encode(json.dumps([valor, user_id]).encode('utf-8')).decode('ascii')
+
+
+def _decodificar_cursor_usuario(cursor, orden):
+    try:
+        valor, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        valor = int(valor) if orden == 'id' else str(valor)
+        return valor, int(user_id)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _filtrar_usuarios(query, q, modo):
+    """Búsqueda en nombre y email.
+
+    modo='prefijo' usa lower(col) LIKE 'q%' (índices text_pattern_ops);
+    modo='contiene' usa col ILIKE '%q%' (índices de trigramas).
+    """
+    patron = _escapar_like(q.lower())
+    if modo == 'prefijo':
+        return query.filter(db.or_(
+            db.func.lower(User.name).like(patron + '%', escape='\\'),
+            db.func.lower(User.email).like(patron + '%', escape='\\'),
+        ))
+    return query.filter(db.or_(
+        User.name.ilike('%' + patron + '%', escape='\\'),
+        User.email.ilike('%' + patron + '%', escape='\\'),
+    ))
+
+
+def _total_usuarios(query, filtrado):
+    """Devuelve (total, tipo) con tipo 'exacto', 'aproximado' o 'minimo'.
+
+    Sin búsqueda, en PostgreSQL se usa pg_class.reltuples (mantenido por
+    autovacuum) cuando la tabla es grande; con búsqueda se cuenta con un tope.
+    """
+    if filtrado:
+        subconsulta = query.with_entities(User.id).limit(LIMITE_CONTEO_BUSQUEDA + 1).subquery()
+        total = db.session.query(db.func.count()).select_from(subconsulta).scalar()
+        if total > LIMITE_CONTEO_BUSQUEDA:
+            return LIMITE_CONTEO_BUSQUEDA, 'minimo'
+        return total, 'exacto'
+    if db.engine.dialect.name == 'postgresql':
+        estimado = db.session.execute(db.text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"
+        )).scalar()
+        if estimado is not None and estimado >= UMBRAL_ESTIMACION_TOTAL:
+            return int(estimado), 'aproximado'
+    return db.session.query(db.func.count(User.id)).scalar(), 'exacto'
+
+
 @admin_bp.route('/users')
 def list_users():
-    """Muestra una lista de todos los usuarios registrados."""
-    conn = get_db_connection()
-    users = []
-    if conn:
-        cur = conn.cursor()
-        try:
-            cur.execute("SELECT id, name, email, is_admin FROM users ORDER BY id")
-            users_data = cur.fetchall()
-            for row in users_data:
-                users.append({'id': row[0], 'name': row[1], 'email': row[2], 'is_admin': row[3]})
-        except Exception as e:
-            flash(f"Error al consultar usuarios: {e}", "error")
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
-    return render_template('admin_dashboard.html', users=users)
+    """Muestra una página de usuarios, con búsqueda por nombre/email y orden configurable."""
+    q = request.args.get('q', '').strip()
+    modo = request.args.get('modo', 'contiene')
+    orden = request.args.get('orden', 'id')
+    direccion = request.args.get('dir', 'asc')
+    if orden not in ORDENES_USUARIOS:
+        orden = 'id'
+    if direccion not in ('asc', 'desc'):
+        direccion = 'asc'
+    if modo not in ('contiene', 'prefijo'):
+        modo = 'contiene'
+    try:
+        por_pagina = min(max(int(request.args.get('por_pagina', USUARIOS_POR_PAGINA)), 1),
+                         MAX_USUARIOS_POR_PAGINA)
+    except ValueError:
+        por_pagina = USUARIOS_POR_PAGINA
+
+    columna = ORDENES_USUARIOS[orden]
+    users, siguiente, total, tipo_total = [], None, 0, 'exacto'
+    try:
+        query = User.query
+        if q:
+            query = _filtrar_usuarios(query, q, modo)
+        total, tipo_total = _total_usuarios(query, bool(q))
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                valor, user_id = _decodificar_cursor_usuario(cursor, orden)
+            except ValueError as e:
+                flash(str(e), "error")
+            else:
+                posicion = db.tuple_(columna, User.id)
+                query = query.filter(posicion > (valor, user_id) if direccion == 'asc'
+                                     else posicion < (valor, user_id))
+
+        if direccion == 'asc':
+            query = query.order_by(columna.asc(), User.id.asc())
+        else:
+            query = query.order_by(columna.desc(), User.id.desc())
+        # Se pide una fila de más para saber si existe una página siguiente
+        filas = (query.with_entities(User.id, User.name, User.email, User.is_admin, User.disabled_at)
+                 .limit(por_pagina + 1).all())
+        for row in filas[:por_pagina]:
+            users.append({'id': row.id, 'name': row.name, 'email': row.email, 'is_admin': row.is_admin,
+                          'disabled': row.disabled_at is not None})
+        if len(filas) > por_pagina:
+            ultimo = filas[por_pagina - 1]
+            siguiente = _codificar_cursor_usuario(getattr(ultimo, orden), ultimo.id)
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error al consultar usuarios: {e}", "error")
+
+    try:
+        purgas = PurgaUsuario.query.order_by(PurgaUsuario.id.desc()).limit(PURGAS_RECIENTES).all()
+    except Exception:
+        db.session.rollback()
+        purgas = []
+
+    filtros = {'q': q, 'modo': modo, 'orden': orden, 'dir': direccion, 'por_pagina': por_pagina}
+    return render_template('admin_dashboard.html', users=users, filtros=filtros,
+                           siguiente=siguiente, total=total, tipo_total=tipo_total, purgas=purgas)
 
 @admin_bp.route('/delete_user/<int:user_id>', methods=['POST'])
 def delete_user(user_id):
-    """Elimina un usuario de la base de datos."""
+    """Desactiva la cuenta al momento y programa el borrado de sus datos en segundo plano."""
     if user_id == current_user.id:
         flash("No puedes eliminar tu propia cuenta.", "error")
         return redirect(url_for('admin.list_users'))
 
-    conn = get_db_connection()
-    if conn:
-        cur = conn.cursor()
-        try:
-            cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
-            conn.commit()
-            flash("Usuario eliminado correctamente.", "success")
-        except Exception as e:
-            flash(f"Error al eliminar el usuario: {e}", "error")
-        finally:
-            if cur:
-                cur.close()
-            if conn:
-                conn.close()
+    try:
+        if solicitar_purga([user_id], solicitada_por=current_user.id):
+            flash("Cuenta desactivada. Sus datos se eliminarán en segundo plano.", "success")
+        else:
+            flash("Usuario no encontrado o ya desactivado.", "error")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error al eliminar el usuario: {e}", "error")
     return redirect(url_for('admin.list_users'))
 
+@admin_bp.route('/delete_users', methods=['POST'])
+def delete_users():
+    """Variante masiva de delete_user para los usuarios marcados en el panel."""
+    try:
+        user_ids = {int(i) for i in request.form.getlist('user_ids')}
+    except ValueError:
+        flash("Selección de usuarios inválida.", "error")
+        return redirect(url_for('admin.list_users'))
+    user_ids.discard(current_user.id)
+    if not user_ids:
+        flash("No se seleccionó ningún usuario.", "error")
+        return redirect(url_for('admin.list_users'))
+    if len(user_ids) > MAX_USUARIOS_BORRADO_LOTE:
+        flash(f"Como máximo {MAX_USUARIOS_BORRADO_LOTE} usuarios por operación.", "error")
+        return redirect(url_for('admin.list_users'))
+
+    try:
+        purgas = solicitar_purga(sorted(user_ids), solicitada_por=current_user.id)
+        flash(f"{len(purgas)} cuenta(s) desactivada(s). Sus datos se eliminarán en segundo plano.", "success")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error al eliminar los usuarios: {e}", "error")
+    return redirect(url_for('admin.list_users'))
+
+@admin_bp.route('/purgas')
+def purgas_usuarios():
+    """Progreso de los trabajos de purga más recientes (JSON, para el panel)."""
+    purgas = PurgaUsuario.query.order_by(PurgaUsuario.id.desc()).limit(PURGAS_RECIENTES).all()
+    return jsonify([purga.to_dict() for purga in purgas])
+
 @admin_bp.route('/update_role/<int:user_id>', methods=['POST'])
 def update_role(user_id):
     """Actualiza el rol de un usuario a administrador o usuario normal."""
@@ -63,28 +215,67 @@ def update_role(user_id):
         flash("No puedes cambiar tu propio rol de administrador.", "error")
         return redirect(url_for('admin.list_users'))
 
-    conn = get_db_connection()
-    if conn:
-        cur = conn.cursor()
-        try:
-            # Obtener el estado actual de is_admin
-            cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
-            user_data = cur.fetchone()
-            if user_data is not None:
-                current_is_admin = user_data[0]
-                # Alternar el estado de is_admin
-                new_is_admin = not current_is_admin
-                cur.execute("UPDATE users SET is_admin = %s WHERE id = %s", (new_is_admin, user_id))
-                conn.commit()
-                rol_txt = "Administrador" if new_is_admin else "Usuario"
-                flash(f"Rol del usuario actualizado a {rol_txt}.", "success")
-            else:
-                flash("Usuario no encontrado.", "error")
-        except Exception as e:
-            flash(f"Error al actualizar el rol: {e}", "error")
-        finally:
-            if cur:
+    try:
+        with conexion_db() as conn:
+            cur = conn.cursor()
+            try:
+                # Obtener el estado actual de is_admin
+                cur.execute("SELECT is_admin FROM users WHERE id = %s", (user_id,))
+                user_data = cur.fetchone()
+                if user_data is not None:
+                    current_is_admin = user_data[0]
+                    # Alternar el estado de is_admin
+                    new_is_admin = not current_is_admin
+                    cur.execute("UPDATE users SET is_admin = %s WHERE id = %s", (new_is_admin, user_id))
+                    conn.commit()
+                    invalidar_usuario(user_id)
+                    rol_txt = "Administrador" if new_is_admin else "Usuario"
+                    flash(f"Rol del usuario actualizado a {rol_txt}.", "success")
+                else:
+                    flash("Usuario no encontrado.", "error")
+            finally:
                 cur.close()
-            if conn:
-                conn.close()
+    except Exception as e:
+        flash(f"Error al actualizar el rol: {e}", "error")
     return redirect(url_for('admin.list_users'))
+
+@admin_bp.route('/pool')
+def pool_stats():
+    """Estadísticas del pool de conexiones a la base de datos de este proceso."""
+    return jsonify(estadisticas_pool())
+
+@admin_bp.route('/user_cache')
+def user_cache_stats():
+    """Aciertos, fallos y tamaño de la caché de usuarios de este proceso."""
+    return jsonify(cache_usuarios.estadisticas())
+
+@admin_bp.route('/metrics')
+def metrics():
+    """Métricas de este proceso en formato de texto de Prometheus (ver app/metricas.py)."""
+    pool = estadisticas_pool()
+    cache = cache_usuarios.estadisticas()
+    ocurrencias = cache_ocurrencias.estadisticas()
+    sesiones = buffer_sesiones.estadisticas()
+    texto = metricas.registro.exportar() + metricas.valores_simples([
+        ('db_pool_size', 'gauge', 'Conexiones que mantiene el pool.', pool.get('tamano')),
+        ('db_pool_checked_out', 'gauge', 'Conexiones del pool en uso.', pool.get('en_uso')),
+        # overflow() de SQLAlchemy es negativo mientras no se llena el pool
+        ('db_pool_overflow', 'gauge', 'Conexiones abiertas por encima del tamaño del pool.',
+         max(pool['overflow'], 0) if 'overflow' in pool else None),
+        ('user_cache_entries', 'gauge', 'Usuarios en la caché del user_loader.', cache['entradas']),
+        ('user_cache_hits_total', 'counter', 'Aciertos de la caché de usuarios.', cache['hits']),
+        ('user_cache_misses_total', 'counter', 'Fallos de la caché de usuarios.', cache['misses']),
+        ('sse_streams_open', 'gauge', 'Streams de /api/eventos abiertos.', eventos.repartidor.conexiones),
+        ('recurrence_cache_entries', 'gauge', 'Expansiones de tareas recurrentes en caché.', ocurrencias['entradas']),
+        ('recurrence_cache_hits_total', 'counter', 'Aciertos de la caché de repeticiones.', ocurrencias['hits']),
+        ('recurrence_cache_misses_total', 'counter', 'Fallos de la caché de repeticiones.', ocurrencias['misses']),
+        ('pomodoro_buffer_pending', 'gauge', 'Eventos de Pomodoro recibidos y aún no escritos.', sesiones['pendientes']),
+        ('pomodoro_events_written_total', 'counter', 'Eventos de Pomodoro guardados.', sesiones['escritos']),
+        ('pomodoro_events_duplicate_total', 'counter', 'Eventos de Pomodoro reenviados que ya estaban guardados.',
+         sesiones['duplicados']),
+        ('pomodoro_events_dropped_total', 'counter', 'Eventos de Pomodoro perdidos con el buffer lleno.',
+         sesiones['descartados']),
+        ('pomodoro_flush_errors_total', 'counter', 'Escrituras del buffer de Pomodoro fallidas.', sesiones['errores']),
+    ])
+    return Response(texto, mimetype='text/plain', headers={'Cache-Control': 'no-store'},
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
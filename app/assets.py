@@ -0,0 +1,285 @@
+# app/assets.py - Empaquetado de CSS y JS con hash de contenido
+"""
+`flask assets build` junta y minifica los CSS/JS de cada página (BUNDLES),
+los escribe en static/dist/ con el hash del contenido en el nombre, genera
+los hermanos precomprimidos .gz y .br, y guarda el mapa en
+static/dist/manifest.json:
+
+    {"perfil.css": "dist/perfil.3fa2c1b9e0.css", ...}
+
+Las plantillas usan {{ assets('perfil.css') }}. Con manifiesto (y fuera de
+modo debug, ver ASSETS_USAR_MANIFEST) genera una sola etiqueta con la URL
+con hash; si no, una etiqueta por cada archivo fuente, como antes.
+
+Los archivos de static/dist/ nunca cambian de contenido, así que se sirven
+con Cache-Control immutable y, si el navegador lo acepta, directamente en
+su versión .br o .gz. En producción lo mismo puede hacerlo nginx con
+gzip_static/brotli_static.
+
+Los bundles se escriben en static/dist/, al mismo nivel que static/css/, así
+que las rutas relativas url(../images/...) de los CSS siguen funcionando.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+
+try:
+    import brotli
+except ImportError:  # Los .br son opcionales: sin el paquete solo se generan .gz
+    brotli = None
+
+CARPETA_DIST = 'dist'
+MANIFIESTO = 'manifest.json'
+LONGITUD_HASH = 10
+
+Bundle = namedtuple('Bundle', ['archivos', 'atributos'])
+
+# Un bundle por grupo de archivos que una página carga seguidos. Los scripts
+# de tipo module no se mezclan con los clásicos (tienen otro ámbito y se
+# ejecutan diferidos), por eso principal.js va por separado.
+BUNDLES = {
+    'styles.css': Bundle(['css/styles.css'], {}),
+    'perfil.css': Bundle(['css/sesion.css', 'css/styles.css'], {}),
+    'sesion.css': Bundle(['css/sesion.css'], {}),
+    'admin.css': Bundle(['css/emergencia.css', 'css/sesion.css'], {}),
+    'registro.css': Bundle(['css/register.css'], {}),
+    'emergencia.css': Bundle(['css/emergencia.css'], {}),
+    'principal.js': Bundle(['js/principal.js'], {'type': 'module'}),
+    'calendario.js': Bundle(['js/cambios.js', 'js/calendario.js'], {}),
+    'pomodoro.js': Bundle(['js/pomodoro.js'], {}),
+    'tareas.js': Bundle(['js/cambios.js', 'js/tareas.js'], {}),
+    'sidebar.js': Bundle(['js/sidebar-social.js'], {}),
+    'script.js': Bundle(['js/script.js'], {'defer': True}),
+}
+
+_manifiesto = {'mtime': None, 'datos': {}}
+
+
+def init_app(app):
+    app.jinja_env.globals['assets'] = assets
+    app.add_url_rule(f'{app.static_url_path}/{CARPETA_DIST}/<path:filename>',
+                     endpoint='asset_dist', view_func=servir_dist)
+    app.cli.add_command(assets_cli)
+
+
+# =============================================================================
+# Resolución en las plantillas
+# =============================================================================
+
+def _ruta_dist():
+    return os.path.join(current_app.static_folder, CARPETA_DIST)
+
+
+def cargar_manifiesto():
+    """Lee el manifiesto (se recarga si `flask assets build` lo ha reescrito)."""
+    ruta = os.path.join(_ruta_dist(), MANIFIESTO)
+    try:
+        mtime = os.path.getmtime(ruta)
+    except OSError:
+        return {}
+    if mtime != _manifiesto['mtime']:
+        with open(ruta, encoding='utf-8') as f:
+            _manifiesto['datos'] = json.load(f)
+        _manifiesto['mtime'] = mtime
+    return _manifiesto['datos']
+
+
+def _usar_manifiesto():
+    modo = current_app.config.get('ASSETS_USAR_MANIFEST', 'auto')
+    if modo == 'auto':
+        return not current_app.debug
+    return bool(modo)
+
+
+def assets(nombre, **atributos):
+    """Etiquetas <link>/<script> del bundle indicado."""
+    bundle = BUNDLES[nombre]
+    atributos = {**bundle.atributos, **atributos}
+    manifiesto = cargar_manifiesto() if _usar_manifiesto() else {}
+    if nombre in manifiesto:
+        urls = [url_for('asset_dist', filename=manifiesto[nombre].split('/', 1)[1])]
+    else:
+        urls = [url_for('static', filename=archivo) for archivo in bundle.archivos]
+
+    extra = ''.join(f' {clave}' if valor is True else f' {clave}="{escape(valor)}"'
+                    for clave, valor in atributos.items() if valor not in (None, False))
+    if nombre.endswith('.css'):
+        etiquetas = [f'<link rel="stylesheet" href="{url}"{extra}>' for url in urls]
+    else:
+        etiquetas = [f'<script src="{url}"{extra}></script>' for url in urls]
+    return Markup('\n    '.join(etiquetas))
+
+
+def servir_dist(filename):
+    """Sirve static/dist/ con caché immutable y, si se puede, la versión precomprimida."""
+    carpeta = _ruta_dist()
+    aceptadas = request.headers.get('Accept-Encoding', '')
+    for codificacion, sufijo in (('br', '.br'), ('gzip', '.gz')):
+        if codificacion in aceptadas and os.path.isfile(os.path.join(carpeta, filename + sufijo)):
+            respuesta = send_from_directory(carpeta, filename + sufijo, max_age=31536000)
+            respuesta.headers['Content-Encoding'] = codificacion
+            respuesta.mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+            break
+    else:
+        respuesta = send_from_directory(carpeta, filename, max_age=31536000)
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta
+
+
+# =============================================================================
+# Minificación (conservadora: sin dependencias y sin reescribir el código)
+# =============================================================================
+
+# Comentarios y cadenas se reconocen juntos: un comentario puede contener comillas y viceversa
+_COMENTARIO_O_CADENA_CSS = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.S)
+_IMPORT_CSS = re.compile(r'@import\s+(?:url\([^)]*\)|"[^"]*"|\'[^\']*\')[^;]*;\s*')
+
+
+def minificar_css(texto):
+    """Quita comentarios y espacios sobrantes sin tocar el interior de las cadenas."""
+    partes = []
+    posicion = 0
+    for token in _COMENTARIO_O_CADENA_CSS.finditer(texto):
+        partes.append(_compactar_css(texto[posicion:token.start()]))
+        if not token.group(0).startswith('/*'):
+            partes.append(token.group(0))
+        posicion = token.end()
+    partes.append(_compactar_css(texto[posicion:]))
+    return ''.join(partes).strip()
+
+
+def _compactar_css(texto):
+    texto = re.sub(r'\s+', ' ', texto)
+    # No se tocan ':' ni '+'/'>' : 'a :hover' o 'calc(a + b)' dependen de esos espacios
+    texto = re.sub(r'\s*([{};,])\s*', r'\1', texto)
+    return texto.replace(';}', '}')
+
+
+def minificar_js(texto):
+    """Quita sangría, líneas vacías y comentarios de línea completa.
+
+    Se conservan los saltos de línea (la inserción automática de ';' depende
+    de ellos) y las líneas dentro de plantillas `...` se copian tal cual.
+    """
+    lineas = []
+    en_plantilla = False
+    en_comentario = False
+    for linea in texto.splitlines():
+        if en_plantilla:
+            lineas.append(linea)
+            if _comillas_invertidas(linea) % 2:
+                en_plantilla = False
+            continue
+        limpia = linea.strip()
+        if en_comentario or limpia.startswith('/*'):
+            en_comentario = '*/' not in limpia
+            # Código detrás del cierre del comentario en la misma línea
+            limpia = '' if en_comentario else limpia.split('*/', 1)[1].strip()
+        if not limpia or limpia.startswith('//'):
+            continue
+        lineas.append(limpia)
+        if _comillas_invertidas(limpia) % 2:
+            en_plantilla = True
+    return '\n'.join(lineas) + '\n'
+
+
+def _comillas_invertidas(linea):
+    return len(re.findall(r'(?<!\\)`', linea))
+
+
+# =============================================================================
+# Construcción: flask assets build
+# =============================================================================
+
+def construir_bundle(nombre, bundle, minificar=True):
+    """Contenido final de un bundle (los @import de CSS se suben al principio)."""
+    static = current_app.static_folder
+    fuentes = []
+    for archivo in bundle.archivos:
+        with open(os.path.join(static, archivo), encoding='utf-8') as f:
+            fuentes.append(f.read())
+
+    if nombre.endswith('.css'):
+        imports = []
+        cuerpos = []
+        for fuente in fuentes:
+            imports.extend(m.group(0).strip() for m in _IMPORT_CSS.finditer(fuente))
+            cuerpos.append(_IMPORT_CSS.sub('', fuente))
+        # @import solo es válido al principio de la hoja
+        contenido = '\n'.join(dict.fromkeys(imports)) + '\n' + '\n'.join(cuerpos)
+        return minificar_css(contenido) if minificar else contenido
+
+    if minificar:
+        fuentes = [minificar_js(fuente) for fuente in fuentes]
+    # ';' entre archivos por si alguno termina sin él
+    return ';\n'.join(fuentes)
+
+
+def _escribir(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def construir(minificar=True):
+    """Genera todos los bundles y el manifiesto. Devuelve {nombre: (ruta, bytes, gz, br)}."""
+    carpeta = _ruta_dist()
+    os.makedirs(carpeta, exist_ok=True)
+    anterior = cargar_manifiesto()
+    manifiesto = {}
+    informe = {}
+    for nombre, bundle in BUNDLES.items():
+        datos = construir_bundle(nombre, bundle, minificar).encode('utf-8')
+        huella = hashlib.sha256(datos).hexdigest()[:LONGITUD_HASH]
+        base, ext = nombre.rsplit('.', 1)
+        archivo = f'{base}.{huella}.{ext}'
+        ruta = os.path.join(carpeta, archivo)
+        comprimido_gz = gzip.compress(datos, compresslevel=9, mtime=0)
+        _escribir(ruta, datos)
+        _escribir(ruta + '.gz', comprimido_gz)
+        tam_br = None
+        if brotli is not None:
+            comprimido_br = brotli.compress(datos, quality=11)
+            _escribir(ruta + '.br', comprimido_br)
+            tam_br = len(comprimido_br)
+        manifiesto[nombre] = f'{CARPETA_DIST}/{archivo}'
+        informe[nombre] = (manifiesto[nombre], len(datos), len(comprimido_gz), tam_br)
+
+    _escribir(os.path.join(carpeta, MANIFIESTO),
+              json.dumps(manifiesto, indent=2, sort_keys=True).encode('utf-8'))
+
+    # Se conservan también los archivos del build anterior: las páginas ya
+    # servidas (o los workers aún sin reiniciar) pueden seguir pidiéndolos.
+    conservar = {os.path.basename(r) for r in list(manifiesto.values()) + list(anterior.values())}
+    for archivo in os.listdir(carpeta):
+        if archivo == MANIFIESTO:
+            continue
+        principal = re.sub(r'\.(gz|br)$', '', archivo)
+        if principal not in conservar:
+            os.remove(os.path.join(carpeta, archivo))
+    return informe
+
+
+assets_cli = AppGroup('assets', help='Empaquetado de CSS y JS para producción.')
+
+
+@assets_cli.command('build')
+@click.option('--sin-minificar', is_flag=True, help='Solo concatenar (útil para depurar un bundle).')
+def build_command(sin_minificar):
+    """Genera static/dist/ con los bundles, sus .gz/.br y el manifiesto."""
+    informe = construir(minificar=not sin_minificar)
+    for nombre, (ruta, tamano, tam_gz, tam_br) in informe.items():
+        br = f'{tam_br:>8} br' if tam_br is not None else '       - br'
+        click.echo(f'{nombre:<16} {ruta:<36} {tamano:>8} B {tam_gz:>8} gz {br}')
+    if brotli is None:
+        click.echo('Aviso: el paquete brotli no está instalado; no se han generado .br')
@@ -0,0 +1,179 @@
+# app/avatares.py - Procesado de fotos de perfil
+"""
+Las fotos subidas desde /upload_profile_photo no se guardan tal cual: un
+hilo en segundo plano las recorta en cuadrado, las reduce a los tamaños de
+AVATAR_TAMANOS y las guarda en WebP dentro de static/images/avatars/:
+
+    images/avatars/<hash>_<tamaño>.webp
+
+<hash> es el SHA-256 (truncado) del archivo original, así que la misma foto
+se guarda una sola vez aunque la suban varios usuarios. User.profile_image
+guarda 'images/avatars/<hash>' y User.avatar(tamaño) devuelve la variante.
+
+Como el nombre cambia cuando cambia el contenido, las variantes se sirven
+con Cache-Control immutable. Al sustituir una foto, la anterior se borra si
+ningún otro usuario la usa; `flask limpiar-avatares` elimina las huérfanas
+que hayan quedado (por ejemplo, tras un reinicio a mitad de proceso).
+"""
+import glob
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+
+from app import db
+
+CARPETA_AVATARES = 'images/avatars'
+# Carpeta de las subidas anteriores a este módulo (archivo original con nombre UUID)
+CARPETA_PERFILES_ANTIGUA = 'images/profiles'
+LONGITUD_HASH = 32
+# limpiar-avatares no toca archivos más recientes (pueden estar procesándose)
+ANTIGUEDAD_MINIMA_LIMPIEZA = 600
+
+# Un único hilo: las fotos se procesan en orden y sin competir entre sí
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatares')
+
+
+def init_app(app):
+    app.after_request(_cabeceras_cache)
+    app.cli.add_command(limpiar_command)
+
+
+def _cabeceras_cache(response):
+    """Las variantes tienen el hash del contenido en el nombre: nunca cambian."""
+    if request.path.startswith(f'{current_app.static_url_path}/{CARPETA_AVATARES}/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def hash_contenido(datos):
+    return hashlib.sha256(datos).hexdigest()[:LONGITUD_HASH]
+
+
+def _carpeta():
+    return os.path.join(current_app.static_folder, *CARPETA_AVATARES.split('/'))
+
+
+def _ruta_variante(hash_imagen, tamano):
+    return os.path.join(_carpeta(), f'{hash_imagen}_{tamano}.webp')
+
+
+def validar_imagen(datos):
+    """Comprueba que los datos son una imagen legible. Lanza ValueError si no."""
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(io.BytesIO(datos)) as imagen:
+            imagen.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValueError(f'Imagen no válida: {e}')
+
+
+def encolar(user_id, datos):
+    """Programa el procesado de la foto subida por el usuario y vuelve al momento."""
+    app = current_app._get_current_object()
+    return _executor.submit(_procesar_en_contexto, app, user_id, datos)
+
+
+def detener():
+    """Espera a que se procesen las fotos ya encoladas (al parar el proceso)."""
+    _executor.shutdown(wait=True)
+
+
+def _procesar_en_contexto(app, user_id, datos):
+    with app.app_context():
+        try:
+            procesar(user_id, datos)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error procesando la foto de perfil del usuario {user_id}: {e}")
+        finally:
+            db.session.remove()
+
+
+def procesar(user_id, datos):
+    """Genera las variantes (si no existen ya) y asigna la foto al usuario."""
+    from app.models import User
+    from app.user_cache import invalidar as invalidar_usuario
+
+    hash_imagen = hash_contenido(datos)
+    tamanos = current_app.config.get('AVATAR_TAMANOS', (80, 192))
+    if not all(os.path.exists(_ruta_variante(hash_imagen, t)) for t in tamanos):
+        _generar_variantes(datos, hash_imagen, tamanos)
+
+    user = db.session.get(User, user_id)
+    if user is None or not user.is_active:
+        recoger(f'{CARPETA_AVATARES}/{hash_imagen}')
+        return
+    anterior = user.profile_image
+    user.profile_image = f'{CARPETA_AVATARES}/{hash_imagen}'
+    db.session.commit()
+    invalidar_usuario(user_id)
+    if anterior and anterior != user.profile_image:
+        recoger(anterior)
+
+
+def _generar_variantes(datos, hash_imagen, tamanos):
+    from PIL import Image, ImageOps
+
+    calidad = current_app.config.get('AVATAR_CALIDAD', 80)
+    os.makedirs(_carpeta(), exist_ok=True)
+    with Image.open(io.BytesIO(datos)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        transparente = 'A' in imagen.getbands() or 'transparency' in imagen.info
+        imagen = imagen.convert('RGBA' if transparente else 'RGB')
+        for tamano in tamanos:
+            variante = ImageOps.fit(imagen, (tamano, tamano), Image.LANCZOS)
+            destino = _ruta_variante(hash_imagen, tamano)
+            # Escribir en un temporal y renombrar: nunca se sirve un archivo a medias
+            temporal = f'{destino}.{os.getpid()}.tmp'
+            variante.save(temporal, 'WEBP', quality=calidad, method=6)
+            os.replace(temporal, destino)
+
+
+def recoger(profile_image):
+    """Borra los archivos de una foto de perfil si ningún usuario la usa ya."""
+    from app.models import User
+
+    if not profile_image:
+        return 0
+    if User.query.filter_by(profile_image=profile_image).first() is not None:
+        return 0
+    if profile_image.startswith(CARPETA_AVATARES + '/'):
+        hash_imagen = profile_image.rsplit('/', 1)[-1]
+        rutas = glob.glob(os.path.join(_carpeta(), f'{hash_imagen}_*.webp'))
+    elif profile_image.startswith(CARPETA_PERFILES_ANTIGUA + '/'):
+        rutas = [os.path.join(current_app.static_folder, *profile_image.split('/'))]
+    else:
+        return 0
+    borrados = 0
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+            borrados += 1
+        except FileNotFoundError:
+            pass
+    return borrados
+
+
+@click.command('limpiar-avatares')
+@with_appcontext
+def limpiar_command():
+    """Borra las variantes de fotos de perfil que ningún usuario usa."""
+    from app.models import User
+
+    usadas = {fila.profile_image.rsplit('/', 1)[-1]
+              for fila in db.session.query(User.profile_image)
+              .filter(User.profile_image.like(CARPETA_AVATARES + '/%'))}
+    limite = time.time() - ANTIGUEDAD_MINIMA_LIMPIEZA
+    borrados = 0
+    for ruta in glob.glob(os.path.join(_carpeta(), '*')):
+        hash_imagen = os.path.basename(ruta).split('_', 1)[0]
+        if hash_imagen not in usadas and os.path.getmtime(ruta) < limite:
+            os.remove(ruta)
+            borrados += 1
+    click.echo(f'{borrados} archivo(s) eliminado(s).')
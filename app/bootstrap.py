@@ -0,0 +1,48 @@
+# app/bootstrap.py - Tareas de inicialización que se ejecutan una vez por despliegue
+"""
+Todo lo que antes se hacía al importar run.py (crear la base de datos,
+crear las tablas y el usuario administrador) vive aquí y se ejecuta con:
+
+    flask init
+
+Así cada proceso que sirve peticiones arranca sin abrir conexiones: el
+engine de SQLAlchemy se conecta de forma perezosa en la primera consulta.
+"""
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from app import migrations
+from app.database import create_database_if_not_exists
+from app.models import User
+
+ADMIN_EMAIL = 'admin@planeador.com'
+ADMIN_PASSWORD = 'contraseña'
+
+
+def crear_admin_si_no_existe():
+    """Crea el usuario administrador por defecto. Devuelve True si lo ha creado."""
+    if User.query.filter_by(email=ADMIN_EMAIL).first():
+        return False
+    admin = User(
+        name='Administrador',
+        email=ADMIN_EMAIL,
+        is_admin=True
+    )
+    admin.set_password(ADMIN_PASSWORD)
+    db.session.add(admin)
+    db.session.commit()
+    return True
+
+
+@click.command('init')
+@click.option('--sin-crear-bd', is_flag=True, help='No intentar crear la base de datos PostgreSQL.')
+@with_appcontext
+def init_command(sin_crear_bd):
+    """Prepara la base de datos: la crea si falta, aplica migraciones y crea el admin."""
+    if not sin_crear_bd and db.engine.dialect.name == 'postgresql':
+        create_database_if_not_exists()
+    aplicadas = migrations.upgrade(db.engine)
+    click.echo(f'{len(aplicadas)} migración(es) aplicada(s).')
+    if crear_admin_si_no_existe():
+        click.echo(f'Usuario administrador {ADMIN_EMAIL} creado.')
@@ -0,0 +1,77 @@
+# app/busqueda.py - Búsqueda de texto completo en las tareas de un usuario
+"""
+Busca en el título, el asunto y la descripción de la tarea y en los títulos
+de sus enlaces y los nombres de sus contactos, usando el índice que mantiene
+la migración 0006:
+
+- PostgreSQL: tareas.busqueda (tsvector con pesos A-D) + índice GIN. Cada
+  palabra de la consulta se busca como prefijo en las configuraciones
+  es_unaccent (raíces en español) y es_simple (palabra literal), así que
+  "matemat" encuentra "Matemáticas" mientras se escribe.
+- SQLite (desarrollo): tabla FTS5 tareas_fts con remove_diacritics y
+  consultas "palabra"* ordenadas por bm25.
+
+Los resultados se ordenan por relevancia (el título pesa más que el asunto,
+la descripción y los enlaces/contactos).
+"""
+import re
+
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app import db
+
+MAX_PALABRAS = 8
+MAX_LONGITUD_PALABRA = 50
+# Pesos bm25 de SQLite por columna: titulo, asunto, descripcion, relacionados
+_PESOS_FTS5 = '10.0, 5.0, 2.0, 1.0'
+
+
+class BusquedaNoDisponible(Exception):
+    """El índice de búsqueda no existe todavía (falta `flask db upgrade`)."""
+
+
+def palabras_consulta(q):
+    """Palabras de la consulta, sin signos de puntuación ni operadores."""
+    return [p[:MAX_LONGITUD_PALABRA] for p in re.findall(r'\w+', q.lower())][:MAX_PALABRAS]
+
+
+def buscar_tareas(user_id, q, limite):
+    """Devuelve [(tarea_id, relevancia)] ordenados de más a menos relevante."""
+    palabras = palabras_consulta(q)
+    if not palabras:
+        return []
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            return _buscar_postgres(user_id, palabras, limite)
+        return _buscar_sqlite(user_id, palabras, limite)
+    except (OperationalError, ProgrammingError) as e:
+        db.session.rollback()
+        raise BusquedaNoDisponible(str(e))
+
+
+def _buscar_postgres(user_id, palabras, limite):
+    # (prefijo con raíces | prefijo literal) para cada palabra, unidas con AND
+    terminos = [
+        f"(to_tsquery('es_unaccent', :p{i} || ':*') || to_tsquery('es_simple', :p{i} || ':*'))"
+        for i in range(len(palabras))
+    ]
+    parametros = {f'p{i}': palabra for i, palabra in enumerate(palabras)}
+    parametros.update(user_id=user_id, limite=limite)
+    filas = db.session.execute(db.text(
+        "SELECT t.id, ts_rank(t.busqueda, c.consulta) AS relevancia "
+        f"FROM tareas t, (SELECT {' && '.join(terminos)} AS consulta) c "
+        "WHERE t.user_id = :user_id AND t.busqueda @@ c.consulta "
+        "ORDER BY relevancia DESC, t.updated_at DESC LIMIT :limite"
+    ), parametros)
+    return [(fila.id, float(fila.relevancia)) for fila in filas]
+
+
+def _buscar_sqlite(user_id, palabras, limite):
+    consulta = ' '.join('"{}"*'.format(palabra.replace('"', '""')) for palabra in palabras)
+    filas = db.session.execute(db.text(
+        f"SELECT rowid AS id, bm25(tareas_fts, {_PESOS_FTS5}) AS rango FROM tareas_fts "
+        "WHERE tareas_fts MATCH :consulta AND user_id = :user_id "
+        "ORDER BY rango LIMIT :limite"
+    ), {'consulta': consulta, 'user_id': user_id, 'limite': limite})
+    # bm25 devuelve valores negativos: cuanto menor, más relevante
+    return [(fila.id, -float(fila.rango)) for fila in filas]
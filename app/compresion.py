@@ -0,0 +1,72 @@
+# app/compresion.py - Compresión gzip/brotli de las respuestas
+"""
+Comprime en un after_request las respuestas de la aplicación (sobre todo el
+JSON de /api/tareas, muy repetitivo) cuando:
+
+- el cliente la acepta en Accept-Encoding (se prefiere br a gzip si el
+  paquete brotli está instalado y el cliente no le da menos calidad),
+- el Content-Type está en COMPRESION_TIPOS,
+- el cuerpo ocupa al menos COMPRESION_MIN_BYTES,
+- y la respuesta no está ya codificada, no es un stream y no pide no-transform.
+
+Al comprimir, el ETag pasa a ser débil: la representación cambia aunque el
+contenido sea el mismo, y las validaciones If-None-Match usan comparación débil.
+"""
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # Sin el paquete brotli solo se usa gzip
+    brotli = None
+
+
+def init_app(app):
+    if app.config.get('COMPRESION_ACTIVADA', True):
+        app.after_request(comprimir_respuesta)
+
+
+def elegir_codificacion(accept_encodings):
+    """'br', 'gzip' o None según las calidades de Accept-Encoding."""
+    calidad_br = accept_encodings['br'] if brotli is not None else 0
+    calidad_gzip = accept_encodings['gzip']
+    if calidad_br and calidad_br >= calidad_gzip:
+        return 'br'
+    if calidad_gzip:
+        return 'gzip'
+    return None
+
+
+def comprimir(datos, codificacion, config):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=config.get('COMPRESION_NIVEL_BROTLI', 4))
+    # mtime=0: la misma entrada produce siempre los mismos bytes
+    return gzip.compress(datos, compresslevel=config.get('COMPRESION_NIVEL_GZIP', 6), mtime=0)
+
+
+def comprimir_respuesta(response):
+    config = current_app.config
+
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+    if response.mimetype not in config.get('COMPRESION_TIPOS', ()):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.accept_encodings)
+    if codificacion is None:
+        return response
+    datos = response.get_data()
+    if len(datos) < config.get('COMPRESION_MIN_BYTES', 1024):
+        return response
+
+    response.set_data(comprimir(datos, codificacion, config))
+    response.headers['Content-Encoding'] = codificacion
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True)
+    return response
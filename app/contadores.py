@@ -0,0 +1,189 @@
+# app/contadores.py - Contadores de tareas por usuario
+"""
+La tabla contadores_tareas guarda cuántas tareas tiene cada usuario por
+dimensión y valor, para que /api/tareas/estadisticas no recorra sus tareas:
+
+    total            ''            todas las tareas
+    status           'incompleta'  una fila por status
+    importancia      'alta'        una fila por importancia ('' = sin importancia)
+    asunto           'Lengua'      una fila por asunto ('' = sin asunto)
+    pendiente_fecha  '2025-03-01'  tareas no completadas con esa fecha
+                                   (las vencidas son las de fecha < hoy; las
+                                   recurrentes no cuentan, su fecha es solo
+                                   la primera repetición)
+
+Cada ruta que crea, modifica o borra tareas llama a registrar() con el estado
+anterior y el nuevo de las tareas afectadas, dentro de su misma transacción:
+el contador se confirma o se deshace junto con la tarea. Los incrementos son
+UPSERT atómicos (cantidad = cantidad + delta), así que dos peticiones
+concurrentes no se pisan.
+
+`flask contadores verificar` recalcula todo desde las tareas, informa de las
+diferencias y, con --reparar, las corrige.
+"""
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+from app.models import Tarea, ContadorTarea
+
+DIMENSIONES = ('status', 'importancia', 'asunto')
+CAMPOS_ESTADO = ('status', 'importancia', 'asunto', 'fecha', 'recurrencia')
+
+
+def estado(tarea):
+    """Copia de los campos que cuentan, para comparar antes/después de modificar una tarea."""
+    return {campo: getattr(tarea, campo) for campo in CAMPOS_ESTADO}
+
+
+def claves(tarea):
+    """Pares (dimension, valor) en los que cuenta una tarea (objeto Tarea o dict de estado())."""
+    if not isinstance(tarea, dict):
+        tarea = estado(tarea)
+    resultado = [('total', '')]
+    resultado += [(dimension, tarea.get(dimension) or '') for dimension in DIMENSIONES]
+    if tarea.get('fecha') and tarea.get('status') != 'completa' and not tarea.get('recurrencia'):
+        resultado.append(('pendiente_fecha', tarea['fecha'].isoformat()))
+    return resultado
+
+
+def registrar(user_id, antes=(), despues=()):
+    """Suma en la sesión actual la diferencia entre los estados antes y después.
+
+    `antes` son las tareas tal como estaban (vacío en las altas) y `despues`
+    tal como quedan (vacío en las bajas). No hace commit.
+    """
+    deltas = Counter()
+    for tarea in antes:
+        for clave in claves(tarea):
+            deltas[clave] -= 1
+    for tarea in despues:
+        for clave in claves(tarea):
+            deltas[clave] += 1
+    # Siempre en el mismo orden: dos transacciones del mismo usuario bloquean las filas igual
+    filas = [{'user_id': user_id, 'dimension': dimension, 'valor': valor, 'cantidad': cantidad}
+             for (dimension, valor), cantidad in sorted(deltas.items()) if cantidad]
+    if filas:
+        db.session.execute(_sentencia_incremento(), filas)
+
+
+def _insert_dialecto():
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _sentencia_incremento():
+    tabla = ContadorTarea.__table__
+    sentencia = _insert_dialecto()(tabla)
+    return sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.user_id, tabla.c.dimension, tabla.c.valor],
+        set_={'cantidad': tabla.c.cantidad + sentencia.excluded.cantidad})
+
+
+def leer(user_id):
+    """{(dimension, valor): cantidad} guardados para el usuario (sin los ceros)."""
+    filas = db.session.query(ContadorTarea.dimension, ContadorTarea.valor, ContadorTarea.cantidad).filter(
+        ContadorTarea.user_id == user_id, ContadorTarea.cantidad != 0)
+    return {(fila.dimension, fila.valor): fila.cantidad for fila in filas}
+
+
+def estadisticas(user_id, hoy):
+    """Resumen para /api/tareas/estadisticas a partir de los contadores."""
+    resultado = {'total': 0, 'por_status': {}, 'por_importancia': {}, 'por_asunto': {},
+                 'vencidas': 0, 'para_hoy': 0}
+    hoy = hoy.isoformat()
+    for (dimension, valor), cantidad in leer(user_id).items():
+        if dimension == 'total':
+            resultado['total'] = cantidad
+        elif dimension == 'pendiente_fecha':
+            if valor < hoy:
+                resultado['vencidas'] += cantidad
+            elif valor == hoy:
+                resultado['para_hoy'] += cantidad
+        else:
+            resultado[f'por_{dimension}'][valor] = cantidad
+    return resultado
+
+
+# =============================================================================
+# Verificación: recalcular desde las tareas
+# =============================================================================
+
+def recalcular(user_ids=None):
+    """{user_id: {(dimension, valor): cantidad}} contando las tareas desde cero."""
+    def consulta(*columnas):
+        q = db.session.query(Tarea.user_id, *columnas, db.func.count()).group_by(Tarea.user_id, *columnas)
+        return q.filter(Tarea.user_id.in_(user_ids)) if user_ids is not None else q
+
+    reales = {}
+    for user_id, cantidad in consulta():
+        reales.setdefault(user_id, {})[('total', '')] = cantidad
+    for dimension in DIMENSIONES:
+        for user_id, valor, cantidad in consulta(getattr(Tarea, dimension)):
+            clave = (dimension, valor or '')
+            # NULL y '' se cuentan juntos
+            reales[user_id][clave] = reales[user_id].get(clave, 0) + cantidad
+    pendientes = consulta(Tarea.fecha).filter(Tarea.fecha.isnot(None), Tarea.status != 'completa',
+                                              Tarea.recurrencia.is_(None))
+    for user_id, fecha, cantidad in pendientes:
+        reales[user_id][('pendiente_fecha', fecha.isoformat())] = cantidad
+    return reales
+
+
+def verificar(user_ids=None, reparar=False):
+    """Compara los contadores con las tareas. Devuelve [(user_id, dimension, valor, guardado, real)].
+
+    Con reparar=True reescribe los contadores de los usuarios con diferencias.
+    Conviene repararlos con poca actividad: una tarea creada entre el recuento
+    y la escritura se perdería (un segundo `verificar` lo detectaría).
+    """
+    reales = recalcular(user_ids)
+    guardados = {}
+    consulta = ContadorTarea.query.filter(ContadorTarea.cantidad != 0)
+    if user_ids is not None:
+        consulta = consulta.filter(ContadorTarea.user_id.in_(user_ids))
+    for contador in consulta:
+        guardados.setdefault(contador.user_id, {})[(contador.dimension, contador.valor)] = contador.cantidad
+
+    diferencias = []
+    for user_id in sorted(set(reales) | set(guardados)):
+        real, guardado = reales.get(user_id, {}), guardados.get(user_id, {})
+        for clave in sorted(set(real) | set(guardado)):
+            if real.get(clave, 0) != guardado.get(clave, 0):
+                diferencias.append((user_id, *clave, guardado.get(clave, 0), real.get(clave, 0)))
+
+    if reparar and diferencias:
+        for user_id in sorted({d[0] for d in diferencias}):
+            db.session.execute(db.delete(ContadorTarea).where(ContadorTarea.user_id == user_id))
+            filas = [{'user_id': user_id, 'dimension': dimension, 'valor': valor, 'cantidad': cantidad}
+                     for (dimension, valor), cantidad in reales.get(user_id, {}).items()]
+            if filas:
+                db.session.execute(db.insert(ContadorTarea), filas)
+        db.session.commit()
+    return diferencias
+
+
+contadores_cli = AppGroup('contadores', help='Contadores de tareas por usuario.')
+
+
+@contadores_cli.command('verificar')
+@click.option('--usuario', 'user_ids', type=int, multiple=True, help='Solo este usuario (se puede repetir).')
+@click.option('--reparar', is_flag=True, help='Reescribir los contadores que no coincidan.')
+def verificar_command(user_ids, reparar):
+    """Recalcula los contadores desde las tareas e informa de las diferencias."""
+    diferencias = verificar(list(user_ids) or None, reparar)
+    for user_id, dimension, valor, guardado, real in diferencias:
+        click.echo(f'usuario {user_id:<6} {dimension:<16} {valor!r:<24} guardado={guardado:<6} real={real}')
+    usuarios = len({d[0] for d in diferencias})
+    if not diferencias:
+        click.echo('Los contadores coinciden con las tareas.')
+    elif reparar:
+        click.echo(f'{len(diferencias)} diferencia(s) en {usuarios} usuario(s): reparadas.')
+    else:
+        click.echo(f'{len(diferencias)} diferencia(s) en {usuarios} usuario(s). Usa --reparar para corregirlas.')
+        raise SystemExit(1)
@@ -1,26 +1,57 @@
 # app/database.py - Funciones de conexión y operaciones con la base de datos
 
+from contextlib import contextmanager
+
 import psycopg2
 from config import Config
 
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 def get_db_connection():
-    """Establece una conexión a la base de datos PostgreSQL."""
+    """Presta una conexión del pool del engine de SQLAlchemy.
+
+    La conexión se comporta como una de psycopg2; al llamar a close() vuelve al
+    pool en lugar de cerrarse. Devuelve None si no se puede obtener.
+    Requiere un contexto de aplicación activo.
+    """
+    from app import db
+    from app.metricas import medir_conexion
     try:
-        conn = psycopg2.connect(
-            host=Config.DB_HOST,
-            database=Config.DB_NAME,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            port=Config.DB_PORT,
-            options=f"-c client_encoding=UTF8"
-        )
-        return conn
-    except psycopg2.Error as e:
+        return medir_conexion(db.engine.raw_connection())
+    except Exception as e:
         print(f"Error al conectar a la base de datos: {e}")
         return None
 
+@contextmanager
+def conexion_db():
+    """Context manager que garantiza que la conexión prestada vuelve al pool.
+
+    Si el bloque lanza una excepción se hace rollback antes de devolverla.
+    El commit sigue siendo explícito (conn.commit()).
+    """
+    from app import db
+    from app.metricas import medir_conexion
+    conn = medir_conexion(db.engine.raw_connection())
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def estadisticas_pool():
+    """Estado actual del pool de conexiones del proceso."""
+    from app import db
+    pool = db.engine.pool
+    estadisticas = {'tipo': type(pool).__name__, 'estado': pool.status()}
+    # size/checkedin/checkedout/overflow solo existen en QueuePool (PostgreSQL)
+    for clave, metodo in (('tamano', 'size'), ('libres', 'checkedin'),
+                          ('en_uso', 'checkedout'), ('overflow', 'overflow')):
+        if hasattr(pool, metodo):
+            estadisticas[clave] = getattr(pool, metodo)()
+    return estadisticas
+
 def create_database_if_not_exists():
     """Crea la base de datos PostgreSQL si no existe."""
     try:
@@ -0,0 +1,123 @@
+# app/detector_sql.py - Detector de consultas N+1 y lentas (desarrollo y pruebas)
+"""
+Con DETECTOR_SQL_ACTIVADO=true, cada petición registra sus sentencias SQL
+normalizadas (literales y parámetros como ?, listas IN (...) colapsadas) y
+avisa en el log de:
+
+- N+1: la misma sentencia normalizada ejecutada DETECTOR_SQL_REPETICIONES
+  veces o más en la petición (p. ej. una relación perezosa dentro de un bucle),
+- sentencias lentas: más de DETECTOR_SQL_LENTA_MS milisegundos,
+- presupuesto: más de DETECTOR_SQL_MAX_SENTENCIAS sentencias en total.
+
+Cada aviso incluye el endpoint, la sentencia normalizada y la pila de
+llamadas dentro del proyecto en el momento de ejecutarla.
+
+Con DETECTOR_SQL_ESTRICTO=true, cualquier aviso lanza PresupuestoSQLExcedido
+al terminar la petición: con TESTING=True el cliente de pruebas propaga la
+excepción y la prueba falla.
+
+No está pensado para producción: normalizar y guardar pilas cuesta más que
+las métricas de app/metricas.py.
+"""
+import os
+import re
+import time
+import traceback
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_MARCOS_PILA = 8
+
+_eventos_registrados = False
+
+_PARAMETRO = r"(?:\?|%s|%\(\w+\)s|:\w+|-?\d+(?:\.\d+)?|'(?:[^']|'')*')"
+_LISTA = re.compile(r'\(\s*' + _PARAMETRO + r'(?:\s*,\s*' + _PARAMETRO + r')*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_ESPACIOS = re.compile(r'\s+')
+
+
+class PresupuestoSQLExcedido(AssertionError):
+    """Una petición superó el presupuesto de SQL en modo estricto."""
+
+
+def normalizar(sentencia):
+    """SQL sin valores concretos, para agrupar las ejecuciones de la misma consulta."""
+    sentencia = _ESPACIOS.sub(' ', sentencia).strip()
+    sentencia = _LISTA.sub('(...)', sentencia)
+    return _LITERAL.sub('?', sentencia)
+
+
+def pila_proyecto():
+    """Marcos de la pila actual que pertenecen al proyecto (sin este módulo)."""
+    marcos = [m for m in traceback.extract_stack()[:-1]
+              if m.filename.startswith(DIRECTORIO_PROYECTO) and m.filename != __file__
+              and f'{os.sep}site-packages{os.sep}' not in m.filename]
+    return ''.join(traceback.format_list(marcos[-MAX_MARCOS_PILA:]))
+
+
+def init_app(app):
+    global _eventos_registrados
+    if not app.config.get('DETECTOR_SQL_ACTIVADO', False):
+        return
+    app.before_request(_iniciar_peticion)
+    app.after_request(_revisar_peticion)
+    if not _eventos_registrados:
+        event.listen(Engine, 'before_cursor_execute', _antes_de_sentencia)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_sentencia)
+        _eventos_registrados = True
+
+
+def _iniciar_peticion():
+    g._detector_sql = {'conteo': Counter(), 'pilas': {}, 'avisos': [], 'total': 0}
+
+
+def _antes_de_sentencia(conn, cursor, sentencia, parametros, contexto, executemany):
+    if has_request_context() and '_detector_sql' in g:
+        conn.info['detector_t0'] = time.perf_counter()
+
+
+def _despues_de_sentencia(conn, cursor, sentencia, parametros, contexto, executemany):
+    inicio = conn.info.pop('detector_t0', None)
+    if inicio is None or not has_request_context():
+        return
+    estado = g.get('_detector_sql')
+    if estado is None:
+        return
+    ms = (time.perf_counter() - inicio) * 1000
+    config = current_app.config
+    normalizada = normalizar(sentencia)
+    estado['total'] += 1
+    estado['conteo'][normalizada] += 1
+    # La pila se guarda en la repetición que alcanza el umbral: es la que hay que revisar
+    if estado['conteo'][normalizada] == config.get('DETECTOR_SQL_REPETICIONES', 5):
+        estado['pilas'][normalizada] = pila_proyecto()
+    if ms > config.get('DETECTOR_SQL_LENTA_MS', 100):
+        _avisar(estado, f'Sentencia lenta ({ms:.1f} ms) en {request.endpoint}: {normalizada}\n{pila_proyecto()}')
+
+
+def _avisar(estado, mensaje):
+    estado['avisos'].append(mensaje)
+    current_app.logger.warning(mensaje)
+
+
+def _revisar_peticion(response):
+    estado = g.pop('_detector_sql', None)
+    if estado is None:
+        return response
+    config = current_app.config
+    umbral = config.get('DETECTOR_SQL_REPETICIONES', 5)
+    for normalizada, veces in estado['conteo'].items():
+        if veces >= umbral:
+            _avisar(estado, f'Posible N+1 en {request.endpoint}: {veces} ejecuciones de {normalizada}\n'
+                            f'{estado["pilas"].get(normalizada, "")}')
+    maximo = config.get('DETECTOR_SQL_MAX_SENTENCIAS')
+    if maximo is not None and estado['total'] > maximo:
+        _avisar(estado, f'{request.endpoint}: {estado["total"]} sentencias SQL (presupuesto {maximo})')
+
+    if estado['avisos'] and config.get('DETECTOR_SQL_ESTRICTO', False):
+        raise PresupuestoSQLExcedido('\n\n'.join(estado['avisos']))
+    return response
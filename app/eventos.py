@@ -0,0 +1,318 @@
+# app/eventos.py - Canal de cambios por usuario con server-sent events
+"""
+GET /api/eventos mantiene abierta una respuesta text/event-stream por la que
+se avisa a cada usuario de los cambios confirmados en sus tareas y
+recordatorios, para que el tablero y el calendario no tengan que volver a
+pedir las listas completas:
+
+    id: 1542
+    event: tarea
+    data: {"id": 1542, "entidad": "tarea", "accion": "update", "ids": [7, 9]}
+
+Las rutas que modifican datos llaman a publicar() dentro de su transacción:
+el evento se guarda en eventos_cambios y se confirma o se deshace junto con
+el cambio. Su id es el número de secuencia: publicar() toma antes un bloqueo
+por usuario que dura hasta el final de la transacción, así que los eventos de
+un mismo usuario se confirman en el orden de sus ids (en PostgreSQL las
+transacciones solapadas podrían confirmar un id menor después de uno mayor y
+el stream se lo saltaría). Al reconectar, el navegador envía el último
+recibido en Last-Event-ID (o el cliente en ?desde=) y el stream empieza por
+los eventos posteriores. Si ya se han borrado eventos que el cliente no
+recibió (EVENTOS_RETENCION_HORAS), se envía `reset` y el cliente recarga sus
+datos.
+
+Reparto entre procesos, con un hilo por proceso (Repartidor):
+
+- PostgreSQL: publicar() ejecuta pg_notify(CANAL, user_id), que también se
+  entrega solo al confirmar. El hilo escucha el canal (LISTEN) en una
+  conexión propia, fuera del pool.
+- Otros motores (SQLite en desarrollo): el hilo consulta cada
+  EVENTOS_INTERVALO_SONDEO segundos si hay eventos nuevos.
+
+El hilo despierta solo a los streams del usuario afectado. Un stream inactivo
+no retiene conexión a la base de datos: espera en una condición compartida,
+envía un comentario cada EVENTOS_LATIDO segundos para que los proxies no
+corten la conexión y se cierra a los EVENTOS_DURACION_MAXIMA segundos (el
+navegador reconecta sin perder eventos, quizá en otro worker).
+
+Con Gunicorn gthread cada stream abierto ocupa un hilo del worker:
+EVENTOS_MAX_CONEXIONES limita cuántos hay por proceso para que queden hilos
+para el resto de peticiones. Por encima se responde 503 con Retry-After.
+"""
+import json
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Response, current_app
+from flask.cli import with_appcontext
+
+from app import db
+from app.models import EventoCambio
+
+CANAL = 'planeador_eventos'
+# Eventos enviados por consulta al ponerse al día
+LOTE_EVENTOS = 200
+# Segundos entre borrados de eventos antiguos desde el hilo de reparto
+INTERVALO_LIMPIEZA = 3600
+# Segundos de espera antes de reconectar el LISTEN tras un error
+ESPERA_RECONEXION = 5
+
+
+def publicar(user_id, entidad, accion, ids):
+    """Añade a la sesión actual el evento del cambio. No hace commit: se envía al confirmar.
+
+    Hasta el commit o el rollback bloquea la publicación de otros eventos del
+    mismo usuario, para que el id se asigne en el orden en que se confirman.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        # Antes del add: execute() vuelca lo pendiente en la sesión y el INSERT
+        # del evento tiene que ir después del bloqueo. En SQLite las escrituras
+        # ya se serializan con el bloqueo de la base de datos
+        db.session.execute(db.text('SELECT pg_advisory_xact_lock(hashtext(:canal), :usuario)'),
+                           {'canal': CANAL, 'usuario': user_id})
+    db.session.add(EventoCambio(user_id=user_id, entidad=entidad, accion=accion, ids=json.dumps(ids)))
+    if db.engine.dialect.name == 'postgresql':
+        # NOTIFY es transaccional: los que escuchan lo reciben tras el COMMIT, con la fila ya visible
+        db.session.execute(db.text('SELECT pg_notify(:canal, :usuario)'), {'canal': CANAL, 'usuario': str(user_id)})
+
+
+def limpiar(horas):
+    """Borra los eventos de hace más de `horas` horas. Devuelve cuántos ha borrado.
+
+    Conserva siempre el último: así el menor id guardado indica hasta dónde
+    se ha borrado y un cliente que reconecta sabe si se ha perdido algo.
+    """
+    ultimo = db.session.query(db.func.max(EventoCambio.id)).scalar()
+    if ultimo is None:
+        return 0
+    limite = datetime.utcnow() - timedelta(hours=horas)
+    borrados = (EventoCambio.query
+                .filter(EventoCambio.created_at < limite, EventoCambio.id < ultimo)
+                .delete(synchronize_session=False))
+    db.session.commit()
+    return borrados
+
+
+def faltan_desde(desde):
+    """True si ya no se pueden dar todos los eventos posteriores al id `desde`.
+
+    Pasa cuando limpiar() ha borrado alguno o cuando `desde` es mayor que el
+    último id (la base de datos es otra: recreada o restaurada).
+    """
+    minimo, maximo = db.session.query(db.func.min(EventoCambio.id), db.func.max(EventoCambio.id)).one()
+    if maximo is None:
+        return desde > 0
+    return desde > maximo or desde < minimo - 1
+
+
+# =============================================================================
+# Reparto de avisos entre los streams del proceso
+# =============================================================================
+
+class Repartidor:
+    """Streams abiertos por usuario y el hilo que los despierta cuando llegan cambios."""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._abiertos = {}  # user_id -> streams abiertos en este proceso
+        self._versiones = {}  # user_id -> avisos recibidos (solo usuarios con streams)
+        self._conexiones = 0
+        self._detenido = False
+        self._hilo = None
+
+    def abrir(self, user_id, maximo):
+        """Reserva un hueco para un stream. False si el proceso ya tiene `maximo` abiertos."""
+        with self._condicion:
+            if self._detenido or self._conexiones >= maximo:
+                return False
+            self._conexiones += 1
+            self._abiertos[user_id] = self._abiertos.get(user_id, 0) + 1
+            self._versiones.setdefault(user_id, 0)
+            return True
+
+    def cerrar(self, user_id):
+        with self._condicion:
+            self._conexiones -= 1
+            self._abiertos[user_id] -= 1
+            if not self._abiertos[user_id]:
+                del self._abiertos[user_id]
+                del self._versiones[user_id]
+
+    @property
+    def conexiones(self):
+        return self._conexiones
+
+    @property
+    def detenido(self):
+        return self._detenido
+
+    def version(self, user_id):
+        return self._versiones.get(user_id, 0)
+
+    def esperar(self, user_id, version, segundos):
+        """Espera a un aviso posterior a `version` o a que pasen `segundos`. True si hubo aviso."""
+        with self._condicion:
+            return self._condicion.wait_for(
+                lambda: self._detenido or self._versiones.get(user_id, 0) != version, segundos)
+
+    def avisar(self, user_ids=None):
+        """Despierta los streams de esos usuarios (de todos con None)."""
+        with self._condicion:
+            for user_id in self._abiertos if user_ids is None else user_ids:
+                if user_id in self._versiones:
+                    self._versiones[user_id] += 1
+            self._condicion.notify_all()
+
+    def detener(self):
+        """Cierra todos los streams en su próxima espera (el proceso se está parando)."""
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+
+    def lanzar(self, app):
+        """Arranca el hilo de escucha si no está en marcha en este proceso."""
+        with self._condicion:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, args=(app,), name='eventos', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self, app):
+        escuchar = _escuchar_postgres if _es_postgres(app) else _sondear
+        while True:
+            try:
+                escuchar(app, self)
+            except Exception as e:
+                app.logger.error(f"Error en el hilo de eventos: {e}")
+            # Lo ocurrido mientras no se escuchaba se recoge consultando de nuevo
+            self.avisar()
+            time.sleep(ESPERA_RECONEXION)
+
+
+repartidor = Repartidor()
+
+
+def _es_postgres(app):
+    with app.app_context():
+        return db.engine.dialect.name == 'postgresql'
+
+
+def _limpiar_si_toca(app, ultima_limpieza):
+    if time.monotonic() - ultima_limpieza < INTERVALO_LIMPIEZA:
+        return ultima_limpieza
+    with app.app_context():
+        limpiar(app.config.get('EVENTOS_RETENCION_HORAS', 24))
+    return time.monotonic()
+
+
+def _escuchar_postgres(app, repartidor):
+    with app.app_context():
+        conexion = db.engine.raw_connection()
+    # Fuera del pool: la conexión queda dedicada al LISTEN mientras viva el hilo
+    conexion.detach()
+    try:
+        dbapi = conexion.driver_connection
+        dbapi.autocommit = True
+        with dbapi.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+        repartidor.avisar()
+        ultima_limpieza = time.monotonic()
+        while True:
+            if select.select([dbapi], [], [], 5)[0]:
+                dbapi.poll()
+                user_ids = {int(aviso.payload) for aviso in dbapi.notifies}
+                dbapi.notifies.clear()
+                repartidor.avisar(user_ids)
+            ultima_limpieza = _limpiar_si_toca(app, ultima_limpieza)
+    finally:
+        conexion.close()
+
+
+def _sondear(app, repartidor):
+    with app.app_context():
+        ultimo = db.session.query(db.func.max(EventoCambio.id)).scalar() or 0
+    ultima_limpieza = time.monotonic()
+    while True:
+        time.sleep(app.config.get('EVENTOS_INTERVALO_SONDEO', 1.0))
+        with app.app_context():
+            filas = (db.session.query(EventoCambio.user_id, db.func.max(EventoCambio.id))
+                     .filter(EventoCambio.id > ultimo).group_by(EventoCambio.user_id).all())
+        if filas:
+            ultimo = max(ultimo, *(fila[1] for fila in filas))
+            repartidor.avisar({fila[0] for fila in filas})
+        ultima_limpieza = _limpiar_si_toca(app, ultima_limpieza)
+
+
+# =============================================================================
+# Stream por conexión
+# =============================================================================
+
+def _mensaje(tipo, datos, evento_id=None):
+    lineas = [f'id: {evento_id}'] if evento_id is not None else []
+    lineas += [f'event: {tipo}', f'data: {json.dumps(datos)}']
+    return '\n'.join(lineas) + '\n\n'
+
+
+def _posicion_inicial(desde):
+    """(posición desde la que enviar, True si el cliente debe recargar sus datos)."""
+    maximo = db.session.query(db.func.max(EventoCambio.id)).scalar()
+    if desde is None:
+        return maximo or 0, False
+    if faltan_desde(desde):
+        return maximo or 0, True
+    return desde, False
+
+
+def respuesta_stream(user_id, desde):
+    """Response text/event-stream para el usuario, o None si el proceso no admite más streams."""
+    app = current_app._get_current_object()
+    if not repartidor.abrir(user_id, app.config.get('EVENTOS_MAX_CONEXIONES', 20)):
+        return None
+    repartidor.lanzar(app)
+    respuesta = Response(_stream(app, user_id, desde), mimetype='text/event-stream',
+                         headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Se llama al cerrar la respuesta, aunque el generador no llegue a empezar
+    respuesta.call_on_close(lambda: repartidor.cerrar(user_id))
+    return respuesta
+
+
+def _stream(app, user_id, desde):
+    config = app.config
+    latido = config.get('EVENTOS_LATIDO', 15)
+    fin = time.monotonic() + config.get('EVENTOS_DURACION_MAXIMA', 300)
+
+    yield f"retry: {config.get('EVENTOS_REINTENTO_MS', 3000)}\n\n"
+    reanudado = desde is not None
+    with app.app_context():
+        desde, reset = _posicion_inicial(desde)
+    yield _mensaje('reset' if reset else 'conectado', {'id': desde, 'reanudado': reanudado}, desde)
+
+    while not repartidor.detenido and time.monotonic() < fin:
+        # La versión se lee antes de consultar: un aviso que llegue durante la
+        # consulta hace que la espera siguiente termine enseguida
+        version = repartidor.version(user_id)
+        with app.app_context():
+            eventos = [evento.to_dict() for evento in EventoCambio.query
+                       .filter(EventoCambio.user_id == user_id, EventoCambio.id > desde)
+                       .order_by(EventoCambio.id).limit(LOTE_EVENTOS)]
+        for evento in eventos:
+            yield _mensaje(evento['entidad'], evento, evento['id'])
+            desde = evento['id']
+        if len(eventos) == LOTE_EVENTOS:
+            continue
+        if not repartidor.esperar(user_id, version, max(0, min(latido, fin - time.monotonic()))):
+            yield ': latido\n\n'
+
+
+@click.command('limpiar-eventos')
+@click.option('--horas', type=float, default=None, help='Antigüedad mínima (por defecto EVENTOS_RETENCION_HORAS).')
+@with_appcontext
+def limpiar_eventos_command(horas):
+    """Borra los eventos de cambios antiguos de /api/eventos (para cron)."""
+    horas = horas if horas is not None else current_app.config.get('EVENTOS_RETENCION_HORAS', 24)
+    click.echo(f'{limpiar(horas)} evento(s) borrado(s).')
@@ -0,0 +1,270 @@
+# app/metricas.py - Métricas por petición en formato Prometheus
+"""
+Para cada petición se mide, por endpoint (main.obtener_tareas, admin.list_users...)
+y método:
+
+- tiempo total hasta construir la respuesta,
+- número de sentencias SQL y tiempo pasado en ellas, tanto las del engine
+  de SQLAlchemy (eventos before/after_cursor_execute) como las de las
+  conexiones psycopg2 prestadas por app/database.py (medir_conexion),
+- tamaño del cuerpo enviado (ya comprimido).
+
+Los valores se acumulan en histogramas por proceso y se publican en
+/admin/metrics en el formato de texto de Prometheus. Cada worker lleva sus
+propias métricas y se reinician al reiniciarlo; Prometheus debe consultar
+cada worker o sumar las series con rate().
+
+Coste: dos perf_counter() por sentencia y una actualización de histograma
+bajo un lock por petición; se puede desactivar con METRICAS_ACTIVADAS=false.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PREFIJO = 'planeador'
+# Límites superiores de los cubos (le) de cada histograma
+CUBOS_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUBOS_SENTENCIAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CUBOS_TAMANO = (100, 1000, 10000, 100000, 1000000, 10000000)
+# Peticiones que no corresponden a ninguna ruta (404): una sola serie
+ENDPOINT_SIN_RUTA = 'sin_ruta'
+
+_eventos_registrados = False
+
+
+class Histograma:
+    __slots__ = ('limites', 'cubos', 'suma', 'cuenta')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubos = [0] * len(limites)  # sin acumular; se acumulan al exportar
+        self.suma = 0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        indice = bisect_left(self.limites, valor)
+        if indice < len(self.cubos):
+            self.cubos[indice] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+
+# (nombre, descripción, cubos) de los histogramas por endpoint
+HISTOGRAMAS = (
+    ('http_request_duration_seconds', 'Tiempo de respuesta por endpoint.', CUBOS_DURACION),
+    ('http_request_sql_statements', 'Sentencias SQL por petición.', CUBOS_SENTENCIAS),
+    ('http_request_sql_duration_seconds', 'Tiempo en sentencias SQL por petición.', CUBOS_DURACION),
+    ('http_response_size_bytes', 'Tamaño del cuerpo de la respuesta.', CUBOS_TAMANO),
+)
+
+
+class RegistroMetricas:
+    """Histogramas por (endpoint, método) y contador por código de estado, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limpiar()
+
+    def limpiar(self):
+        with self._lock:
+            self._histogramas = {}
+            self._peticiones = {}
+
+    def registrar(self, endpoint, metodo, status, duracion, sentencias, tiempo_sql, tamano):
+        clave = (endpoint, metodo)
+        with self._lock:
+            histogramas = self._histogramas.get(clave)
+            if histogramas is None:
+                histogramas = self._histogramas[clave] = [Histograma(cubos) for _, _, cubos in HISTOGRAMAS]
+            histogramas[0].observar(duracion)
+            histogramas[1].observar(sentencias)
+            histogramas[2].observar(tiempo_sql)
+            if tamano is not None:
+                histogramas[3].observar(tamano)
+            clave_status = (endpoint, metodo, status)
+            self._peticiones[clave_status] = self._peticiones.get(clave_status, 0) + 1
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus (0.0.4)."""
+        with self._lock:
+            histogramas = {clave: [(list(h.cubos), h.suma, h.cuenta) for h in valores]
+                           for clave, valores in self._histogramas.items()}
+            peticiones = dict(self._peticiones)
+
+        lineas = [f'# HELP {PREFIJO}_http_requests_total Peticiones atendidas por endpoint, método y estado.',
+                  f'# TYPE {PREFIJO}_http_requests_total counter']
+        for (endpoint, metodo, status), cantidad in sorted(peticiones.items()):
+            lineas.append(f'{PREFIJO}_http_requests_total'
+                          f'{_etiquetas(endpoint=endpoint, method=metodo, status=status)} {cantidad}')
+
+        for posicion, (nombre, descripcion, limites) in enumerate(HISTOGRAMAS):
+            lineas.append(f'# HELP {PREFIJO}_{nombre} {descripcion}')
+            lineas.append(f'# TYPE {PREFIJO}_{nombre} histogram')
+            for (endpoint, metodo), valores in sorted(histogramas.items()):
+                cubos, suma, cuenta = valores[posicion]
+                if not cuenta:
+                    continue
+                acumulado = 0
+                for limite, cantidad in zip(limites, cubos):
+                    acumulado += cantidad
+                    lineas.append(f'{PREFIJO}_{nombre}_bucket'
+                                  f'{_etiquetas(endpoint=endpoint, method=metodo, le=_numero(limite))} {acumulado}')
+                lineas.append(f'{PREFIJO}_{nombre}_bucket{_etiquetas(endpoint=endpoint, method=metodo, le="+Inf")} '
+                              f'{cuenta}')
+                lineas.append(f'{PREFIJO}_{nombre}_sum{_etiquetas(endpoint=endpoint, method=metodo)} {_numero(suma)}')
+                lineas.append(f'{PREFIJO}_{nombre}_count{_etiquetas(endpoint=endpoint, method=metodo)} {cuenta}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _etiquetas(**etiquetas):
+    partes = []
+    for clave, valor in etiquetas.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{clave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def valores_simples(valores):
+    """Métricas sin etiquetas: valores es [(nombre, tipo, descripción, valor)], tipo gauge o counter."""
+    lineas = []
+    for nombre, tipo, descripcion, valor in valores:
+        if valor is None:
+            continue
+        lineas += [f'# HELP {PREFIJO}_{nombre} {descripcion}', f'# TYPE {PREFIJO}_{nombre} {tipo}',
+                   f'{PREFIJO}_{nombre} {_numero(valor)}']
+    return '\n'.join(lineas) + '\n' if lineas else ''
+
+
+registro = RegistroMetricas()
+
+
+# =============================================================================
+# Recogida
+# =============================================================================
+
+def init_app(app):
+    """Registra los hooks de petición. Llamar antes que los after_request que
+    cambian el cuerpo (compresión) para medir el tamaño final: Flask ejecuta
+    los after_request en orden inverso al de registro."""
+    global _eventos_registrados
+    if not app.config.get('METRICAS_ACTIVADAS', True):
+        return
+    app.before_request(_iniciar_peticion)
+    app.after_request(_registrar_peticion)
+    if not _eventos_registrados:
+        # En la clase Engine: vale para el engine de cualquier app creada después
+        event.listen(Engine, 'before_cursor_execute', _antes_de_sentencia)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_sentencia)
+        _eventos_registrados = True
+
+
+def _iniciar_peticion():
+    # [inicio, sentencias, segundos en SQL]
+    g._metricas = [time.perf_counter(), 0, 0.0]
+
+
+def _sumar_sentencia(segundos):
+    metricas = g.get('_metricas')
+    if metricas is not None:
+        metricas[1] += 1
+        metricas[2] += segundos
+
+
+def _antes_de_sentencia(conn, cursor, sentencia, parametros, contexto, executemany):
+    if has_request_context():
+        conn.info['metricas_t0'] = time.perf_counter()
+
+
+def _despues_de_sentencia(conn, cursor, sentencia, parametros, contexto, executemany):
+    inicio = conn.info.pop('metricas_t0', None)
+    if inicio is not None and has_request_context():
+        _sumar_sentencia(time.perf_counter() - inicio)
+
+
+def _registrar_peticion(response):
+    metricas = g.pop('_metricas', None)
+    if metricas is None:
+        return response
+    inicio, sentencias, tiempo_sql = metricas
+    endpoint = request.endpoint or ENDPOINT_SIN_RUTA
+    tamano = response.content_length
+    # En streams el tamaño no se conoce hasta enviarlos
+    if tamano is None and not (response.is_streamed or response.direct_passthrough):
+        tamano = response.calculate_content_length()
+    registro.registrar(endpoint, request.method, response.status_code,
+                       time.perf_counter() - inicio, sentencias, tiempo_sql, tamano)
+    return response
+
+
+# =============================================================================
+# Conexiones psycopg2 directas (app/database.py)
+# =============================================================================
+
+def medir_conexion(conn):
+    """Envuelve una conexión DBAPI para que sus cursores sumen a las métricas de la petición."""
+    return _ConexionMedida(conn)
+
+
+class _ConexionMedida:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _CursorMedido(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+class _CursorMedido:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _medir(self, metodo, args, kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        finally:
+            if has_request_context():
+                _sumar_sentencia(time.perf_counter() - inicio)
+
+    def execute(self, *args, **kwargs):
+        return self._medir(self._cursor.execute, args, kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._medir(self._cursor.executemany, args, kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+# =============================================================================
+# Acceso al endpoint
+# =============================================================================
+
+def token_valido():
+    """True si la petición trae `Authorization: Bearer <METRICAS_TOKEN>` (para el scraper)."""
+    token = current_app.config.get('METRICAS_TOKEN')
+    cabecera = request.headers.get('Authorization', '')
+    if not token or not cabecera.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(cabecera[len('Bearer '):].encode('utf-8'), token.encode('utf-8'))
@@ -0,0 +1,718 @@
+# app/migrations.py - Migraciones versionadas del esquema de la base de datos
+"""
+Sistema de migraciones sencillo y sin dependencias externas.
+
+Cada migración tiene una versión, una descripción y dos funciones
+(upgrade/downgrade) que reciben el engine de SQLAlchemy y gestionan sus
+propias transacciones, de modo que puedan trabajar por lotes o en modo
+autocommit (CREATE INDEX CONCURRENTLY). Las versiones aplicadas se guardan
+en la tabla `schema_migrations`.
+
+Todas las migraciones son idempotentes: comprueban el estado real del
+esquema antes de actuar, porque las bases de datos existentes se crearon
+con db.create_all() y pueden tener ya parte de los cambios.
+
+Uso desde la línea de comandos (FLASK_APP=run.py):
+    flask db status
+    flask db upgrade [--hasta VERSION]
+    flask db downgrade [--hasta VERSION]
+"""
+import re
+from collections import namedtuple
+from datetime import date
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, ForeignKey, func, inspect, text
+from sqlalchemy.exc import DataError
+
+from app import db
+
+Migracion = namedtuple('Migracion', ['version', 'descripcion', 'upgrade', 'downgrade'])
+
+# Filas por transacción al rellenar columnas en tablas grandes
+TAMANO_LOTE = 1000
+
+_metadata_migraciones = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata_migraciones,
+    Column('version', String(20), primary_key=True),
+    Column('descripcion', String(200), nullable=False),
+    Column('aplicada_at', DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+
+# =============================================================================
+# Utilidades
+# =============================================================================
+
+def _es_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def _columnas(engine, tabla):
+    return {c['name']: c for c in inspect(engine).get_columns(tabla)}
+
+
+def _crear_indice(engine, nombre, tabla, columnas, metodo=None, donde=None):
+    """Crea un índice si no existe; en PostgreSQL lo hace sin bloquear escrituras.
+
+    `metodo` (p. ej. 'gin') solo se admite en PostgreSQL. `donde` crea un
+    índice parcial (PostgreSQL y SQLite).
+    """
+    parcial = f' WHERE {donde}' if donde else ''
+    if _es_postgres(engine):
+        using = f' USING {metodo}' if metodo else ''
+        # CONCURRENTLY no puede ejecutarse dentro de una transacción
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla}{using} ({columnas}){parcial}'))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas}){parcial}'))
+
+
+def _eliminar_indice(engine, nombre):
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP INDEX IF EXISTS {nombre}'))
+
+
+# =============================================================================
+# 0001 - Esquema inicial
+# =============================================================================
+
+# Tablas del esquema inicial, en orden de creación (respetando claves foráneas)
+_TABLAS_INICIALES = ['users', 'tareas', 'tareas_eliminadas', 'enlaces', 'contactos',
+                     'recordatorio', 'pomodoro_presets']
+
+
+def _tablas_iniciales():
+    # tareas_eliminadas ya no es un modelo (ver 0011), pero las migraciones anteriores la crean
+    return {**db.metadata.tables, 'tareas_eliminadas': _tabla_tareas_eliminadas()}
+
+
+def _0001_upgrade(engine):
+    tablas = _tablas_iniciales()
+    with engine.begin() as conn:
+        for nombre in _TABLAS_INICIALES:
+            tablas[nombre].create(conn, checkfirst=True)
+    # Bases de datos anteriores a la columna music (antes se añadía en run.py al arrancar)
+    if 'music' not in _columnas(engine, 'pomodoro_presets'):
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE pomodoro_presets ADD COLUMN music TEXT'))
+
+
+def _0001_downgrade(engine):
+    tablas = _tablas_iniciales()
+    with engine.begin() as conn:
+        for nombre in reversed(_TABLAS_INICIALES):
+            tablas[nombre].drop(conn, checkfirst=True)
+
+
+# =============================================================================
+# 0002 - recordatorio.fecha: VARCHAR(10) -> DATE
+# =============================================================================
+
+def _0002_upgrade(engine, tamano_lote=TAMANO_LOTE):
+    """Convierte recordatorio.fecha a DATE sin bloquear la tabla durante el relleno.
+
+    1. Añade una columna auxiliar fecha_nueva (DATE, nula).
+    2. La rellena por lotes de `tamano_lote` filas, un commit por lote.
+    3. En una transacción corta con la tabla bloqueada, corrige las filas
+       escritas o modificadas durante el relleno y sustituye la columna.
+
+    Antes de empezar comprueba que todas las fechas son 'YYYY-MM-DD' válidas
+    (la columna VARCHAR nunca se validó): si alguna no lo es, se detiene sin
+    cambiar nada e indica qué filas corregir.
+
+    En SQLite no hace nada: la columna ya guarda texto 'YYYY-MM-DD', que es
+    exactamente como SQLAlchemy almacena un Date en ese motor.
+    """
+    if not _es_postgres(engine):
+        return
+    tipo = _columnas(engine, 'recordatorio')['fecha']['type']
+    if tipo.python_type is not str:
+        return  # ya es DATE
+
+    invalidas = _fechas_invalidas(engine, tamano_lote)
+    if invalidas:
+        raise click.ClickException(_informe_fechas_invalidas(invalidas))
+
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE recordatorio ADD COLUMN IF NOT EXISTS fecha_nueva DATE'))
+
+    total = 0
+    while True:
+        # Las filas que no encajan en el patrón (escritas durante el relleno) se
+        # revisan en el paso 3; sin el filtro, una fecha NULL se repetiría sin fin
+        with engine.begin() as conn:
+            try:
+                resultado = conn.execute(text(
+                    'UPDATE recordatorio SET fecha_nueva = CAST(fecha AS DATE) '
+                    'WHERE id IN (SELECT id FROM recordatorio WHERE fecha_nueva IS NULL '
+                    f"AND fecha ~ '{_PATRON_FECHA_SQL}' ORDER BY id LIMIT :lote)"
+                ), {'lote': tamano_lote})
+            except DataError as e:
+                raise click.ClickException(_error_conversion(e))
+        if resultado.rowcount == 0:
+            break
+        total += resultado.rowcount
+        click.echo(f'  recordatorio.fecha: {total} filas convertidas')
+
+    with engine.begin() as conn:
+        conn.execute(text('LOCK TABLE recordatorio IN ACCESS EXCLUSIVE MODE'))
+        # Filas escritas durante el relleno: si alguna no es convertible, se deshace
+        # esta transacción (fecha_nueva se conserva y la migración puede repetirse)
+        nuevas = conn.execute(text(
+            f"SELECT id, fecha FROM recordatorio WHERE fecha IS NULL OR fecha !~ '{_PATRON_FECHA_SQL}' ORDER BY id"
+        )).all()
+        if nuevas:
+            raise click.ClickException(_informe_fechas_invalidas([tuple(fila) for fila in nuevas]))
+        try:
+            conn.execute(text(
+                'UPDATE recordatorio SET fecha_nueva = CAST(fecha AS DATE) '
+                'WHERE fecha_nueva IS DISTINCT FROM CAST(fecha AS DATE)'
+            ))
+        except DataError as e:
+            raise click.ClickException(_error_conversion(e))
+        conn.execute(text('ALTER TABLE recordatorio DROP COLUMN fecha'))
+        conn.execute(text('ALTER TABLE recordatorio RENAME COLUMN fecha_nueva TO fecha'))
+        conn.execute(text('ALTER TABLE recordatorio ALTER COLUMN fecha SET NOT NULL'))
+
+
+# Fechas inválidas que se muestran como máximo al detener la migración 0002
+MAX_FECHAS_INFORME = 20
+_PATRON_FECHA_SQL = '^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+_PATRON_FECHA = re.compile(_PATRON_FECHA_SQL)
+
+
+def _fechas_invalidas(engine, tamano_lote=TAMANO_LOTE):
+    """[(id, fecha)] de recordatorio cuya fecha no es 'YYYY-MM-DD' o no existe (31 de febrero).
+
+    Recorre la tabla por lotes de id, sin bloquearla.
+    """
+    invalidas, ultimo = [], 0
+    while True:
+        with engine.connect() as conn:
+            filas = conn.execute(text('SELECT id, fecha FROM recordatorio WHERE id > :ultimo ORDER BY id LIMIT :lote'),
+                                 {'ultimo': ultimo, 'lote': tamano_lote}).all()
+        if not filas:
+            return invalidas
+        invalidas += [(fila.id, fila.fecha) for fila in filas if not _es_fecha(fila.fecha)]
+        ultimo = filas[-1].id
+
+
+def _es_fecha(valor):
+    if not isinstance(valor, str) or not _PATRON_FECHA.match(valor):
+        return False
+    try:
+        date.fromisoformat(valor)
+    except ValueError:
+        return False
+    return True
+
+
+def _informe_fechas_invalidas(invalidas):
+    lineas = [f'  id={id_}: {fecha!r}' for id_, fecha in invalidas[:MAX_FECHAS_INFORME]]
+    if len(invalidas) > MAX_FECHAS_INFORME:
+        lineas.append(f'  ... y {len(invalidas) - MAX_FECHAS_INFORME} más')
+    return (f'0002: {len(invalidas)} recordatorio(s) con una fecha que no es YYYY-MM-DD válida:\n'
+            + '\n'.join(lineas)
+            + "\nCorrígelos (UPDATE recordatorio SET fecha = 'YYYY-MM-DD' WHERE id = ...) o bórralos "
+              'y vuelve a ejecutar flask db upgrade. La migración no se ha aplicado.')
+
+
+def _error_conversion(error):
+    """Mensaje cuando una fecha escrita mientras corre la migración no se puede convertir."""
+    return (f'0002: una fecha escrita durante la migración no es válida ({error.orig}). '
+            'Vuelve a ejecutar flask db upgrade para ver cuál; la migración no se ha aplicado.')
+
+
+def _0002_downgrade(engine):
+    if not _es_postgres(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE recordatorio ALTER COLUMN fecha TYPE VARCHAR(10) "
+            "USING to_char(fecha, 'YYYY-MM-DD')"
+        ))
+
+
+# =============================================================================
+# 0003 - Índices de las consultas más frecuentes
+# =============================================================================
+
+# (nombre, tabla, columnas). Deben coincidir con los declarados en app/models.py
+_INDICES_0003 = [
+    ('ix_tareas_user_fecha', 'tareas', 'user_id, fecha'),
+    ('ix_tareas_user_status', 'tareas', 'user_id, status'),
+    ('ix_tareas_user_updated', 'tareas', 'user_id, updated_at'),
+    ('ix_enlaces_tarea_id', 'enlaces', 'tarea_id'),
+    ('ix_contactos_tarea_id', 'contactos', 'tarea_id'),
+    ('ix_recordatorio_usuario_fecha', 'recordatorio', 'usuario_id, fecha'),
+]
+
+
+def _0003_upgrade(engine):
+    for nombre, tabla, columnas in _INDICES_0003:
+        _crear_indice(engine, nombre, tabla, columnas)
+
+
+def _0003_downgrade(engine):
+    for nombre, _, _ in reversed(_INDICES_0003):
+        _eliminar_indice(engine, nombre)
+
+
+# =============================================================================
+# 0004 - Índices del listado de usuarios de administración
+# =============================================================================
+
+# Búsqueda por prefijo: lower(col) LIKE 'texto%' usa un btree con text_pattern_ops
+_INDICES_PREFIJO_0004 = [
+    ('ix_users_name_lower_pattern', 'users', 'lower(name) text_pattern_ops'),
+    ('ix_users_email_lower_pattern', 'users', 'lower(email) text_pattern_ops'),
+]
+# Búsqueda por subcadena: col ILIKE '%texto%' usa un GIN de trigramas (pg_trgm)
+_INDICES_TRIGRAMA_0004 = [
+    ('ix_users_name_trgm', 'users', 'name gin_trgm_ops'),
+    ('ix_users_email_trgm', 'users', 'email gin_trgm_ops'),
+]
+
+
+def _0004_upgrade(engine):
+    _crear_indice(engine, 'ix_users_name_id', 'users', 'name, id')
+    if not _es_postgres(engine):
+        return
+    for nombre, tabla, columnas in _INDICES_PREFIJO_0004:
+        _crear_indice(engine, nombre, tabla, columnas)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except Exception as e:
+        # Crear extensiones puede requerir permisos de superusuario
+        click.echo(f'  pg_trgm no disponible ({e.__class__.__name__}); '
+                   'la búsqueda por subcadena funcionará sin índice.')
+        return
+    for nombre, tabla, columnas in _INDICES_TRIGRAMA_0004:
+        _crear_indice(engine, nombre, tabla, columnas, metodo='gin')
+
+
+def _0004_downgrade(engine):
+    for nombre, _, _ in reversed(_INDICES_TRIGRAMA_0004 + _INDICES_PREFIJO_0004):
+        _eliminar_indice(engine, nombre)
+    _eliminar_indice(engine, 'ix_users_name_id')
+
+
+# =============================================================================
+# 0005 - Desactivación de cuentas y purga en segundo plano
+# =============================================================================
+
+def _0005_upgrade(engine):
+    if 'disabled_at' not in _columnas(engine, 'users'):
+        tipo = 'TIMESTAMP' if _es_postgres(engine) else 'DATETIME'
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE users ADD COLUMN disabled_at {tipo}'))
+    with engine.begin() as conn:
+        db.metadata.tables['purgas_usuarios'].create(conn, checkfirst=True)
+
+
+def _0005_downgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['purgas_usuarios'].drop(conn, checkfirst=True)
+    if 'disabled_at' in _columnas(engine, 'users'):
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE users DROP COLUMN disabled_at'))
+
+
+# =============================================================================
+# 0006 - Búsqueda de texto completo en tareas (ver app/busqueda.py)
+# =============================================================================
+
+# PostgreSQL: columna tareas.busqueda (tsvector) mantenida por triggers, con dos
+# configuraciones sin acentos: es_unaccent (raíces en español, para palabras
+# completas) y es_simple (sin raíces, para los prefijos mientras se escribe).
+_PG_FUNCIONES_BUSQUEDA = [
+    """
+    CREATE OR REPLACE FUNCTION tarea_busqueda(p_id integer, p_titulo text, p_descripcion text, p_asunto text)
+    RETURNS tsvector LANGUAGE plpgsql STABLE AS $$
+    DECLARE
+        relacionados text;
+        cfg regconfig;
+        resultado tsvector := ''::tsvector;
+    BEGIN
+        relacionados := coalesce((SELECT string_agg(coalesce(titulo, ''), ' ') FROM enlaces WHERE tarea_id = p_id), '')
+            || ' ' || coalesce((SELECT string_agg(nombre, ' ') FROM contactos WHERE tarea_id = p_id), '');
+        FOREACH cfg IN ARRAY ARRAY['es_unaccent', 'es_simple']::regconfig[] LOOP
+            resultado := resultado
+                || setweight(to_tsvector(cfg, coalesce(p_titulo, '')), 'A')
+                || setweight(to_tsvector(cfg, coalesce(p_asunto, '')), 'B')
+                || setweight(to_tsvector(cfg, coalesce(p_descripcion, '')), 'C')
+                || setweight(to_tsvector(cfg, relacionados), 'D');
+        END LOOP;
+        RETURN resultado;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tareas_busqueda_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.busqueda := tarea_busqueda(NEW.id, NEW.titulo, NEW.descripcion, NEW.asunto);
+        RETURN NEW;
+    END $$
+    """,
+    # Enlaces y contactos: un UPDATE por sentencia (no por fila) con tablas de transición
+    """
+    CREATE OR REPLACE FUNCTION tareas_busqueda_hijos_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE tareas t SET busqueda = tarea_busqueda(t.id, t.titulo, t.descripcion, t.asunto)
+            WHERE t.id IN (SELECT tarea_id FROM nuevas);
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE tareas t SET busqueda = tarea_busqueda(t.id, t.titulo, t.descripcion, t.asunto)
+            WHERE t.id IN (SELECT tarea_id FROM viejas);
+        ELSE
+            UPDATE tareas t SET busqueda = tarea_busqueda(t.id, t.titulo, t.descripcion, t.asunto)
+            WHERE t.id IN (SELECT tarea_id FROM nuevas UNION SELECT tarea_id FROM viejas);
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+]
+_PG_TRIGGERS_BUSQUEDA = [
+    ('tareas_busqueda_biu', 'tareas',
+     'BEFORE INSERT OR UPDATE OF titulo, descripcion, asunto ON tareas '
+     'FOR EACH ROW EXECUTE FUNCTION tareas_busqueda_trigger()'),
+] + [
+    (f'{tabla}_busqueda_{sufijo}', tabla,
+     f'AFTER {operacion} ON {tabla} REFERENCING {transicion} '
+     f'FOR EACH STATEMENT EXECUTE FUNCTION tareas_busqueda_hijos_trigger()')
+    for tabla in ('enlaces', 'contactos')
+    for sufijo, operacion, transicion in (
+        ('ins', 'INSERT', 'NEW TABLE AS nuevas'),
+        ('upd', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas'),
+        ('del', 'DELETE', 'OLD TABLE AS viejas'),
+    )
+]
+
+# SQLite: tabla FTS5 tareas_fts (rowid = id de la tarea) mantenida por triggers
+_SQLITE_RELACIONADOS = (
+    "coalesce((SELECT group_concat(titulo, ' ') FROM enlaces WHERE tarea_id = {id}), '') || ' ' || "
+    "coalesce((SELECT group_concat(nombre, ' ') FROM contactos WHERE tarea_id = {id}), '')"
+)
+_SQLITE_INSERTAR_FTS = (
+    "INSERT INTO tareas_fts(rowid, titulo, asunto, descripcion, relacionados, user_id) "
+    "VALUES (new.id, new.titulo, new.asunto, new.descripcion, " + _SQLITE_RELACIONADOS.format(id='new.id') + ", new.user_id);"
+)
+_SQLITE_BUSQUEDA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tareas_fts USING fts5("
+    "titulo, asunto, descripcion, relacionados, user_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tareas_fts_ai AFTER INSERT ON tareas BEGIN " + _SQLITE_INSERTAR_FTS + " END",
+    "CREATE TRIGGER IF NOT EXISTS tareas_fts_au AFTER UPDATE OF titulo, asunto, descripcion, user_id ON tareas BEGIN "
+    "DELETE FROM tareas_fts WHERE rowid = old.id; " + _SQLITE_INSERTAR_FTS + " END",
+    "CREATE TRIGGER IF NOT EXISTS tareas_fts_ad AFTER DELETE ON tareas BEGIN "
+    "DELETE FROM tareas_fts WHERE rowid = old.id; END",
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS {tabla}_fts_{sufijo} AFTER {operacion} ON {tabla} BEGIN "
+    + ''.join(f"UPDATE tareas_fts SET relacionados = {_SQLITE_RELACIONADOS.format(id=fila + '.tarea_id')} "
+              f"WHERE rowid = {fila}.tarea_id; " for fila in filas)
+    + "END"
+    for tabla in ('enlaces', 'contactos')
+    for sufijo, operacion, filas in (('ai', 'INSERT', ['new']), ('au', 'UPDATE', ['old', 'new']),
+                                     ('ad', 'DELETE', ['old']))
+]
+_SQLITE_TRIGGERS_BUSQUEDA = ['tareas_fts_ai', 'tareas_fts_au', 'tareas_fts_ad'] + [
+    f'{tabla}_fts_{sufijo}' for tabla in ('enlaces', 'contactos') for sufijo in ('ai', 'au', 'ad')
+]
+
+
+def _0006_upgrade(engine, tamano_lote=TAMANO_LOTE):
+    if not _es_postgres(engine):
+        with engine.begin() as conn:
+            for sentencia in _SQLITE_BUSQUEDA:
+                conn.execute(text(sentencia))
+            conn.execute(text(
+                "INSERT INTO tareas_fts(rowid, titulo, asunto, descripcion, relacionados, user_id) "
+                "SELECT t.id, t.titulo, t.asunto, t.descripcion, "
+                + _SQLITE_RELACIONADOS.format(id='t.id') +
+                ", t.user_id FROM tareas t WHERE t.id NOT IN (SELECT rowid FROM tareas_fts)"
+            ))
+        return
+
+    with engine.begin() as conn:
+        try:
+            with conn.begin_nested():
+                conn.execute(text('CREATE EXTENSION IF NOT EXISTS unaccent'))
+            unaccent = True
+        except Exception as e:
+            # Crear extensiones puede requerir permisos de superusuario
+            click.echo(f'  unaccent no disponible ({e.__class__.__name__}); la búsqueda distinguirá acentos.')
+            unaccent = False
+        existentes = {fila[0] for fila in conn.execute(text(
+            "SELECT cfgname FROM pg_ts_config WHERE cfgname IN ('es_unaccent', 'es_simple')"))}
+        for nombre, base, diccionarios in (('es_unaccent', 'spanish', 'spanish_stem'),
+                                           ('es_simple', 'simple', 'simple')):
+            if nombre in existentes:
+                continue
+            conn.execute(text(f'CREATE TEXT SEARCH CONFIGURATION {nombre} (COPY = {base})'))
+            if unaccent:
+                conn.execute(text(f'ALTER TEXT SEARCH CONFIGURATION {nombre} '
+                                  f'ALTER MAPPING FOR hword, hword_part, word WITH unaccent, {diccionarios}'))
+        conn.execute(text('ALTER TABLE tareas ADD COLUMN IF NOT EXISTS busqueda tsvector'))
+        for funcion in _PG_FUNCIONES_BUSQUEDA:
+            conn.execute(text(funcion))
+        # Los triggers se crean antes del relleno para no perder las escrituras concurrentes
+        for nombre, tabla, definicion in _PG_TRIGGERS_BUSQUEDA:
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {nombre} ON {tabla}'))
+            conn.execute(text(f'CREATE TRIGGER {nombre} {definicion}'))
+
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            resultado = conn.execute(text(
+                'UPDATE tareas SET busqueda = tarea_busqueda(id, titulo, descripcion, asunto) '
+                'WHERE id IN (SELECT id FROM tareas WHERE busqueda IS NULL ORDER BY id LIMIT :lote)'
+            ), {'lote': tamano_lote})
+        if resultado.rowcount == 0:
+            break
+        total += resultado.rowcount
+        click.echo(f'  tareas.busqueda: {total} filas indexadas')
+
+    _crear_indice(engine, 'ix_tareas_busqueda', 'tareas', 'busqueda', metodo='gin')
+
+
+def _0006_downgrade(engine):
+    if not _es_postgres(engine):
+        with engine.begin() as conn:
+            for nombre in _SQLITE_TRIGGERS_BUSQUEDA:
+                conn.execute(text(f'DROP TRIGGER IF EXISTS {nombre}'))
+            conn.execute(text('DROP TABLE IF EXISTS tareas_fts'))
+        return
+    _eliminar_indice(engine, 'ix_tareas_busqueda')
+    with engine.begin() as conn:
+        for nombre, tabla, _ in _PG_TRIGGERS_BUSQUEDA:
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {nombre} ON {tabla}'))
+        for funcion in ('tareas_busqueda_hijos_trigger()', 'tareas_busqueda_trigger()',
+                        'tarea_busqueda(integer, text, text, text)'):
+            conn.execute(text(f'DROP FUNCTION IF EXISTS {funcion}'))
+        conn.execute(text('ALTER TABLE tareas DROP COLUMN IF EXISTS busqueda'))
+        conn.execute(text('DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent'))
+        conn.execute(text('DROP TEXT SEARCH CONFIGURATION IF EXISTS es_simple'))
+
+
+# =============================================================================
+# 0007 - Contadores de tareas por usuario (ver app/contadores.py)
+# =============================================================================
+
+def _0007_consultas_relleno(engine):
+    fecha_iso = "to_char(fecha, 'YYYY-MM-DD')" if _es_postgres(engine) else "strftime('%Y-%m-%d', fecha)"
+    selecciones = [
+        "SELECT user_id, 'total', '', count(*) FROM tareas WHERE true GROUP BY user_id",
+    ] + [
+        f"SELECT user_id, '{columna}', coalesce({columna}, ''), count(*) FROM tareas WHERE true "
+        f"GROUP BY user_id, coalesce({columna}, '')"
+        for columna in ('status', 'importancia', 'asunto')
+    ] + [
+        f"SELECT user_id, 'pendiente_fecha', {fecha_iso}, count(*) FROM tareas "
+        f"WHERE fecha IS NOT NULL AND status <> 'completa' GROUP BY user_id, {fecha_iso}",
+    ]
+    # ON CONFLICT sobrescribe lo que hayan sumado las escrituras hechas entre
+    # la creación de la tabla y el relleno: el recuento es el valor correcto
+    return [
+        f"INSERT INTO contadores_tareas (user_id, dimension, valor, cantidad) {seleccion} "
+        "ON CONFLICT (user_id, dimension, valor) DO UPDATE SET cantidad = excluded.cantidad"
+        for seleccion in selecciones
+    ]
+
+
+def _0007_upgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['contadores_tareas'].create(conn, checkfirst=True)
+    # Una sola transacción: todos los contadores salen de la misma foto de las tareas
+    with engine.begin() as conn:
+        for sentencia in _0007_consultas_relleno(engine):
+            conn.execute(text(sentencia))
+
+
+def _0007_downgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['contadores_tareas'].drop(conn, checkfirst=True)
+
+
+# =============================================================================
+# 0008 - Eventos de cambios para /api/eventos (ver app/eventos.py)
+# =============================================================================
+
+def _0008_upgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['eventos_cambios'].create(conn, checkfirst=True)
+
+
+def _0008_downgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['eventos_cambios'].drop(conn, checkfirst=True)
+
+
+# =============================================================================
+# 0009 - Tareas recurrentes (ver app/recurrencia.py)
+# =============================================================================
+
+def _0009_upgrade(engine):
+    if 'recurrencia' not in _columnas(engine, 'tareas'):
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE tareas ADD COLUMN recurrencia TEXT'))
+    with engine.begin() as conn:
+        db.metadata.tables['excepciones_tareas'].create(conn, checkfirst=True)
+    _crear_indice(engine, 'ix_tareas_user_recurrentes', 'tareas', 'user_id, fecha',
+                  donde='recurrencia IS NOT NULL')
+
+
+def _0009_downgrade(engine):
+    _eliminar_indice(engine, 'ix_tareas_user_recurrentes')
+    with engine.begin() as conn:
+        db.metadata.tables['excepciones_tareas'].drop(conn, checkfirst=True)
+    if 'recurrencia' in _columnas(engine, 'tareas'):
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE tareas DROP COLUMN recurrencia'))
+
+
+# =============================================================================
+# 0010 - Historial del Pomodoro (ver app/pomodoro.py)
+# =============================================================================
+
+def _0010_upgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['sesiones_pomodoro'].create(conn, checkfirst=True)
+        db.metadata.tables['resumenes_pomodoro'].create(conn, checkfirst=True)
+
+
+def _0010_downgrade(engine):
+    with engine.begin() as conn:
+        db.metadata.tables['resumenes_pomodoro'].drop(conn, checkfirst=True)
+        db.metadata.tables['sesiones_pomodoro'].drop(conn, checkfirst=True)
+
+
+# =============================================================================
+# 0011 - Sin tareas_eliminadas: los borrados se sincronizan con eventos_cambios
+# =============================================================================
+
+def _tabla_tareas_eliminadas():
+    """La tabla de lápidas de tareas borradas, tal como la creaba el modelo TareaEliminada."""
+    metadata = MetaData()
+    db.metadata.tables['users'].to_metadata(metadata)
+    return Table(
+        'tareas_eliminadas', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False, index=True),
+        Column('tarea_id', Integer, nullable=False),
+        Column('deleted_at', DateTime, nullable=False, server_default=func.current_timestamp()),
+    )
+
+
+def _0011_upgrade(engine):
+    with engine.begin() as conn:
+        _tabla_tareas_eliminadas().drop(conn, checkfirst=True)
+
+
+def _0011_downgrade(engine):
+    # Se recrea vacía: los borrados anteriores no se recuperan
+    with engine.begin() as conn:
+        _tabla_tareas_eliminadas().create(conn, checkfirst=True)
+
+
+MIGRACIONES = [
+    Migracion('0001', 'Esquema inicial', _0001_upgrade, _0001_downgrade),
+    Migracion('0002', 'recordatorio.fecha como DATE', _0002_upgrade, _0002_downgrade),
+    Migracion('0003', 'Índices compuestos de tareas, enlaces, contactos y recordatorios',
+              _0003_upgrade, _0003_downgrade),
+    Migracion('0004', 'Índices de ordenación y búsqueda de usuarios', _0004_upgrade, _0004_downgrade),
+    Migracion('0005', 'users.disabled_at y tabla purgas_usuarios', _0005_upgrade, _0005_downgrade),
+    Migracion('0006', 'Búsqueda de texto completo en tareas', _0006_upgrade, _0006_downgrade),
+    Migracion('0007', 'Contadores de tareas por usuario', _0007_upgrade, _0007_downgrade),
+    Migracion('0008', 'Eventos de cambios de tareas y recordatorios', _0008_upgrade, _0008_downgrade),
+    Migracion('0009', 'Tareas recurrentes y sus excepciones', _0009_upgrade, _0009_downgrade),
+    Migracion('0010', 'Sesiones de Pomodoro y resúmenes de tiempo de concentración',
+              _0010_upgrade, _0010_downgrade),
+    Migracion('0011', 'Elimina tareas_eliminadas (borrados sincronizados con eventos_cambios)',
+              _0011_upgrade, _0011_downgrade),
+]
+
+
+# =============================================================================
+# Ejecución
+# =============================================================================
+
+def versiones_aplicadas(engine):
+    """Devuelve el conjunto de versiones ya aplicadas (crea la tabla de control si falta)."""
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {fila.version for fila in conn.execute(schema_migrations.select())}
+
+
+def pendientes(engine):
+    aplicadas = versiones_aplicadas(engine)
+    return [m for m in MIGRACIONES if m.version not in aplicadas]
+
+
+def upgrade(engine, hasta=None):
+    """Aplica en orden las migraciones pendientes (hasta la versión indicada, incluida)."""
+    aplicadas = []
+    for migracion in pendientes(engine):
+        if hasta is not None and migracion.version > hasta:
+            break
+        click.echo(f'Aplicando {migracion.version}: {migracion.descripcion}')
+        migracion.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                version=migracion.version, descripcion=migracion.descripcion))
+        aplicadas.append(migracion.version)
+    return aplicadas
+
+
+def downgrade(engine, hasta=None):
+    """Revierte la última migración, o todas las posteriores a `hasta` si se indica."""
+    aplicadas = versiones_aplicadas(engine)
+    revertidas = []
+    for migracion in reversed(MIGRACIONES):
+        if migracion.version not in aplicadas:
+            continue
+        if hasta is not None and migracion.version <= hasta:
+            break
+        click.echo(f'Revirtiendo {migracion.version}: {migracion.descripcion}')
+        migracion.downgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.delete().where(schema_migrations.c.version == migracion.version))
+        revertidas.append(migracion.version)
+        if hasta is None:
+            break
+    return revertidas
+
+
+# =============================================================================
+# Comandos CLI: flask db ...
+# =============================================================================
+
+db_cli = AppGroup('db', help='Migraciones versionadas del esquema.')
+
+
+@db_cli.command('status')
+def status_command():
+    """Muestra las migraciones aplicadas y pendientes."""
+    aplicadas = versiones_aplicadas(db.engine)
+    for migracion in MIGRACIONES:
+        marca = 'x' if migracion.version in aplicadas else ' '
+        click.echo(f'[{marca}] {migracion.version} {migracion.descripcion}')
+
+
+@db_cli.command('upgrade')
+@click.option('--hasta', default=None, help='Última versión a aplicar (por defecto, todas).')
+def upgrade_command(hasta):
+    """Aplica las migraciones pendientes."""
+    aplicadas = upgrade(db.engine, hasta)
+    click.echo(f'{len(aplicadas)} migración(es) aplicada(s).')
+
+
+@db_cli.command('downgrade')
+@click.option('--hasta', default=None, help='Revertir todas las posteriores a esta versión.')
+def downgrade_command(hasta):
+    """Revierte la última migración aplicada (o hasta la versión indicada)."""
+    revertidas = downgrade(db.engine, hasta)
+    click.echo(f'{len(revertidas)} migración(es) revertida(s).')
@@ -1,12 +1,19 @@
 # app/models.py - Modelos de datos de la aplicación
 from flask_login import UserMixin
 import json
+from sqlalchemy.orm import selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db # Importar la instancia de SQLAlchemy
 
 class User(UserMixin, db.Model):
     """Modelo de usuario para la base de datos, compatible con SQLAlchemy y Flask-Login."""
     __tablename__ = 'users'
+    # Orden por nombre en el listado de administración (paginación por (name, id)).
+    # Los índices de búsqueda (text_pattern_ops / trigram) son exclusivos de
+    # PostgreSQL y se crean en la migración 0004.
+    __table_args__ = (
+        db.Index('ix_users_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
@@ -31,6 +38,22 @@ class User(UserMixin, db.Model):
     # Foto de perfil personalizada
     profile_image = db.Column(db.String(255), nullable=True)
 
+    def avatar(self, tamano=80):
+        """Ruta (relativa a static/) de la foto de perfil en el tamaño indicado (ver app/avatares.py)."""
+        if not self.profile_image:
+            return 'images/user_default.png'
+        if self.profile_image.startswith('images/avatars/'):
+            return f'{self.profile_image}_{tamano}.webp'
+        return self.profile_image  # subida antigua, sin procesar
+
+    # Fecha en que un administrador desactivó la cuenta; sus datos se purgan en segundo plano
+    disabled_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_active(self):
+        """Flask-Login no permite iniciar sesión con cuentas inactivas."""
+        return self.disabled_at is None
+
     def set_password(self, password):
         """Crea un hash de la contraseña."""
         self.password_hash = generate_password_hash(password)
@@ -48,6 +71,15 @@ class User(UserMixin, db.Model):
 class Tarea(db.Model):
     """Modelo de tarea para la gestión completa de tareas con Kanban."""
     __tablename__ = 'tareas'
+    __table_args__ = (
+        db.Index('ix_tareas_user_fecha', 'user_id', 'fecha'),
+        db.Index('ix_tareas_user_status', 'user_id', 'status'),
+        db.Index('ix_tareas_user_updated', 'user_id', 'updated_at'),
+        # Solo las series recurrentes: el calendario las busca por fecha <= fin del rango
+        db.Index('ix_tareas_user_recurrentes', 'user_id', 'fecha',
+                 postgresql_where=db.text('recurrencia IS NOT NULL'),
+                 sqlite_where=db.text('recurrencia IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -57,16 +89,28 @@ class Tarea(db.Model):
     importancia = db.Column(db.String(20), nullable=True)  # Ahora es nulable
     asunto = db.Column(db.String(100), nullable=True)  # Para categorizar: "Colegio", "Vida", "Trabajo"
     status = db.Column(db.String(20), nullable=False, default='inbox')  # 'inbox', 'incompleta', 'completa'
+    # Regla de repetición en JSON (ver app/recurrencia.py); fecha es la primera repetición
+    recurrencia = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
     # Relaciones
     enlaces = db.relationship('Enlace', backref='tarea', lazy=True, cascade='all, delete-orphan')
     contactos = db.relationship('Contacto', backref='tarea', lazy=True, cascade='all, delete-orphan')
+    excepciones = db.relationship('ExcepcionTarea', lazy=True, cascade='all, delete-orphan')
     user = db.relationship('User', backref='tareas')
     
     def __repr__(self):
         return f'<Tarea {self.titulo}>'
+
+    @classmethod
+    def query_con_relaciones(cls):
+        """Query de tareas con enlaces y contactos precargados.
+
+        Usa select-in loading: tres consultas en total (tareas, enlaces, contactos)
+        sin importar cuántas tareas se serialicen con to_dict().
+        """
+        return cls.query.options(selectinload(cls.enlaces), selectinload(cls.contactos))
     
     def to_dict(self):
         """Convierte la tarea a diccionario para JSON."""
@@ -78,18 +122,122 @@ class Tarea(db.Model):
             'importancia': self.importancia,
             'asunto': self.asunto,
             'status': self.status,
+            'recurrencia': json.loads(self.recurrencia) if self.recurrencia else None,
             'enlaces': [enlace.to_dict() for enlace in self.enlaces],
             'contactos': [contacto.to_dict() for contacto in self.contactos],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_calendar_dict(self):
+        """Versión reducida para el calendario: no toca enlaces ni contactos."""
+        return {
+            'id': self.id,
+            'titulo': self.titulo,
+            'descripcion': self.descripcion,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+            'importancia': self.importancia,
+            'asunto': self.asunto,
+            'status': self.status,
+            'recurrencia': json.loads(self.recurrencia) if self.recurrencia else None
+        }
+
+class ExcepcionTarea(db.Model):
+    """Cambio en una sola repetición de una tarea recurrente (completarla u omitirla)."""
+    __tablename__ = 'excepciones_tareas'
+
+    tarea_id = db.Column(db.Integer, db.ForeignKey('tareas.id'), primary_key=True)
+    fecha = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), nullable=True)  # status de esa repetición (None = el de la serie)
+    omitida = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return f'<ExcepcionTarea {self.tarea_id} {self.fecha}>'
+
+class ContadorTarea(db.Model):
+    """Número de tareas de un usuario por dimensión y valor (ver app/contadores.py)."""
+    __tablename__ = 'contadores_tareas'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)  # total, status, importancia, asunto, pendiente_fecha
+    valor = db.Column(db.String(100), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ContadorTarea {self.user_id} {self.dimension}={self.valor}: {self.cantidad}>'
+
+class EventoCambio(db.Model):
+    """Cambio confirmado en las tareas o recordatorios de un usuario, para /api/eventos (ver app/eventos.py).
+
+    El id es el número de secuencia que los clientes envían al reconectar.
+    """
+    __tablename__ = 'eventos_cambios'
+    __table_args__ = (
+        db.Index('ix_eventos_cambios_user_id_id', 'user_id', 'id'),
+        # En SQLite, sin AUTOINCREMENT se reutilizarían los ids de los eventos borrados
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entidad = db.Column(db.String(20), nullable=False)  # tarea, recordatorio
+    accion = db.Column(db.String(20), nullable=False)  # create, update, delete (como en /api/tareas/batch)
+    ids = db.Column(db.Text, nullable=False)  # lista JSON de ids afectados
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<EventoCambio {self.id} {self.entidad} {self.accion}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entidad': self.entidad,
+            'accion': self.accion,
+            'ids': json.loads(self.ids)
+        }
+
+class PurgaUsuario(db.Model):
+    """Trabajo de borrado por lotes de los datos de una cuenta desactivada (ver app/purga.py)."""
+    __tablename__ = 'purgas_usuarios'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Sin clave foránea: la fila de users se borra al final de la purga
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=False)
+    solicitada_por = db.Column(db.Integer, nullable=True)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente, en_curso, completada, error
+    fase = db.Column(db.String(20), nullable=True)
+    filas_eliminadas = db.Column(db.Integer, nullable=False, default=0)
+    total_estimado = db.Column(db.Integer, nullable=True)
+    archivos_eliminados = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<PurgaUsuario {self.user_id} {self.estado}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'email': self.email,
+            'estado': self.estado,
+            'fase': self.fase,
+            'filas_eliminadas': self.filas_eliminadas,
+            'total_estimado': self.total_estimado,
+            'archivos_eliminados': self.archivos_eliminados,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class Enlace(db.Model):
     """Modelo para almacenar URLs asociadas a una tarea."""
     __tablename__ = 'enlaces'
     
     id = db.Column(db.Integer, primary_key=True)
-    tarea_id = db.Column(db.Integer, db.ForeignKey('tareas.id'), nullable=False)
+    tarea_id = db.Column(db.Integer, db.ForeignKey('tareas.id'), nullable=False, index=True)
     url = db.Column(db.String(500), nullable=False)
     titulo = db.Column(db.String(200), nullable=True)  # Título descriptivo del enlace
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -110,7 +258,7 @@ class Contacto(db.Model):
     __tablename__ = 'contactos'
     
     id = db.Column(db.Integer, primary_key=True)
-    tarea_id = db.Column(db.Integer, db.ForeignKey('tareas.id'), nullable=False)
+    tarea_id = db.Column(db.Integer, db.ForeignKey('tareas.id'), nullable=False, index=True)
     nombre = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=True)
     telefono = db.Column(db.String(20), nullable=True)
@@ -132,13 +280,26 @@ class Contacto(db.Model):
 
 # Mantener el modelo Recordatorio para compatibilidad
 class Recordatorio(db.Model):
+    __table_args__ = (
+        db.Index('ix_recordatorio_usuario_fecha', 'usuario_id', 'fecha'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Si usas usuarios
-    fecha = db.Column(db.String(10), nullable=False)  # Formato 'YYYY-MM-DD'
+    fecha = db.Column(db.Date, nullable=False)  # Antes String(10) 'YYYY-MM-DD', ver migración 0002
     titulo = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
     importancia = db.Column(db.String(10), nullable=False, default='baja')
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+            'titulo': self.titulo,
+            'descripcion': self.descripcion,
+            'importancia': self.importancia
+        }
+
 
 # Presets para Pomodoro por usuario
 class PomodoroPreset(db.Model):
@@ -174,3 +335,50 @@ class PomodoroPreset(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+class SesionPomodoro(db.Model):
+    """Evento de un intervalo del Pomodoro enviado por el cliente (ver app/pomodoro.py)."""
+    __tablename__ = 'sesiones_pomodoro'
+    __table_args__ = (
+        # El cliente reenvía los lotes que no sabe si llegaron: cada evento se guarda una vez
+        db.UniqueConstraint('user_id', 'intervalo', 'evento', name='uq_sesiones_pomodoro_evento'),
+        db.Index('ix_sesiones_pomodoro_user_inicio', 'user_id', 'inicio'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    intervalo = db.Column(db.String(36), nullable=False)  # UUID generado por el cliente al empezar el intervalo
+    evento = db.Column(db.String(20), nullable=False)  # iniciada, completada, abortada
+    fase = db.Column(db.String(20), nullable=False)  # trabajo, descanso_corto, descanso_largo
+    # Sin clave foránea: el historial se conserva aunque se borre el preset o la tarea
+    preset_id = db.Column(db.Integer, nullable=True)
+    tarea_id = db.Column(db.Integer, nullable=True)
+    inicio = db.Column(db.DateTime, nullable=False)  # UTC
+    dia = db.Column(db.Date, nullable=False)  # día local del usuario en que empezó el intervalo
+    duracion = db.Column(db.Integer, nullable=True)  # segundos en marcha (completada y abortada)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)
+
+    def __repr__(self):
+        return f'<SesionPomodoro {self.user_id} {self.intervalo} {self.evento}>'
+
+class ResumenPomodoro(db.Model):
+    """Tiempo de concentración de un usuario por día o por semana, al día con cada evento guardado."""
+    __tablename__ = 'resumenes_pomodoro'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    periodo = db.Column(db.String(10), primary_key=True)  # dia, semana
+    inicio = db.Column(db.Date, primary_key=True)  # el día, o el lunes de la semana
+    segundos_foco = db.Column(db.Integer, nullable=False, default=0)
+    completados = db.Column(db.Integer, nullable=False, default=0)
+    abortados = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ResumenPomodoro {self.user_id} {self.periodo} {self.inicio}>'
+
+    def to_dict(self):
+        return {
+            'inicio': self.inicio.isoformat(),
+            'segundos_foco': self.segundos_foco,
+            'completados': self.completados,
+            'abortados': self.abortados
+        }
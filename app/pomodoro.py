@@ -0,0 +1,317 @@
+# app/pomodoro.py - Historial del Pomodoro: eventos de sesión y resúmenes
+"""
+static/js/pomodoro.js cuenta los intervalos en el navegador y envía sus
+eventos por lotes a POST /api/pomodoro/sesiones:
+
+    {"eventos": [{"intervalo": "<uuid>", "evento": "completada", "fase": "trabajo",
+                  "inicio": "2025-03-01T09:00:00Z", "dia": "2025-03-01", "duracion": 1500,
+                  "preset_id": 2, "tarea_id": 17}, ...]}
+
+- intervalo: UUID que el cliente crea al empezar cada intervalo. Con el
+  evento, identifica la fila (user_id, intervalo, evento): reenviar un lote
+  que no se sabe si llegó no duplica nada.
+- evento: iniciada, completada o abortada (reiniciado o saltado antes de
+  terminar); duracion: segundos en marcha, sin las pausas.
+- dia: fecha local del usuario en que empezó el intervalo; los resúmenes se
+  agrupan por ella y no por la fecha UTC de inicio.
+- preset_id y tarea_id son opcionales; los que no son del usuario se guardan
+  como null.
+
+Los eventos válidos no se escriben en la petición: se acumulan en un buffer
+por proceso (BufferSesiones) que se vacía al juntar POMODORO_BUFFER_MAX o
+cada POMODORO_BUFFER_SEGUNDOS con un INSERT de varias filas (ON CONFLICT DO
+NOTHING). En la misma transacción, las filas realmente insertadas suman su
+tiempo en resumenes_pomodoro (una fila por usuario y día, y otra por semana
+empezando en lunes) con UPSERT atómicos, así que GET /api/pomodoro/resumen
+lee unas pocas filas en lugar de recorrer los eventos. Solo cuentan las
+fases de trabajo completadas o abortadas.
+
+Los eventos del buffer se pierden si el proceso muere sin pasar por
+detener() (gunicorn lo llama en worker_exit), y cada worker tiene su propio
+buffer: el resumen puede tardar hasta POMODORO_BUFFER_SEGUNDOS en reflejar
+un evento recibido por otro worker.
+"""
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+
+from app import db
+from app.contadores import _insert_dialecto
+from app.models import User, Tarea, PomodoroPreset, SesionPomodoro, ResumenPomodoro
+
+EVENTOS = ('iniciada', 'completada', 'abortada')
+FASES = ('trabajo', 'descanso_corto', 'descanso_largo')
+PERIODOS = ('dia', 'semana')
+MAX_EVENTOS_LOTE = 500
+MAX_DURACION = 24 * 3600
+# Días que abarca como máximo una consulta de /api/pomodoro/resumen
+MAX_DIAS_RESUMEN = 366
+# Si la base de datos no responde, el buffer guarda como mucho estas veces POMODORO_BUFFER_MAX
+FACTOR_PENDIENTES = 10
+
+
+# =============================================================================
+# Validación
+# =============================================================================
+
+def validar_evento(datos, ahora=None):
+    """Fila de sesiones_pomodoro (sin user_id) a partir de un evento recibido. Lanza ValueError."""
+    if not isinstance(datos, dict):
+        raise ValueError('cada evento debe ser un objeto')
+    intervalo = datos.get('intervalo')
+    if not isinstance(intervalo, str) or not 1 <= len(intervalo) <= 36:
+        raise ValueError('intervalo debe ser un texto de hasta 36 caracteres')
+    if datos.get('evento') not in EVENTOS:
+        raise ValueError(f'evento debe ser uno de: {", ".join(EVENTOS)}')
+    if datos.get('fase') not in FASES:
+        raise ValueError(f'fase debe ser una de: {", ".join(FASES)}')
+    inicio = _instante(datos.get('inicio'))
+    ahora = ahora or datetime.utcnow()
+    if inicio > ahora + timedelta(days=1):
+        raise ValueError('inicio no puede estar en el futuro')
+    try:
+        dia = date.fromisoformat(datos.get('dia') or '')
+    except (TypeError, ValueError):
+        raise ValueError('dia debe tener formato YYYY-MM-DD')
+    # La fecha local no puede alejarse más de un día de la UTC (husos de -12 a +14)
+    if abs((dia - inicio.date()).days) > 1:
+        raise ValueError('dia no corresponde a inicio')
+    duracion = datos.get('duracion')
+    if datos['evento'] == 'iniciada':
+        duracion = None
+    elif not isinstance(duracion, int) or isinstance(duracion, bool) or not 0 <= duracion <= MAX_DURACION:
+        raise ValueError(f'duracion debe ser un número de segundos entre 0 y {MAX_DURACION}')
+    return {
+        'intervalo': intervalo,
+        'evento': datos['evento'],
+        'fase': datos['fase'],
+        'preset_id': _id_opcional(datos.get('preset_id'), 'preset_id'),
+        'tarea_id': _id_opcional(datos.get('tarea_id'), 'tarea_id'),
+        'inicio': inicio,
+        'dia': dia,
+        'duracion': duracion,
+    }
+
+
+def _instante(valor):
+    """datetime UTC sin zona a partir de un ISO 8601 (con zona o ya en UTC)."""
+    if not isinstance(valor, str):
+        raise ValueError('inicio debe ser una fecha y hora ISO 8601')
+    try:
+        instante = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('inicio debe ser una fecha y hora ISO 8601')
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
+
+
+def _id_opcional(valor, nombre):
+    if valor is None:
+        return None
+    if not isinstance(valor, int) or isinstance(valor, bool) or valor < 1:
+        raise ValueError(f'{nombre} debe ser un id o null')
+    return valor
+
+
+def filtrar_referencias(user_id, filas):
+    """Pone a None los preset_id y tarea_id que no son del usuario (una consulta IN por tabla)."""
+    for modelo, campo in ((PomodoroPreset, 'preset_id'), (Tarea, 'tarea_id')):
+        ids = {fila[campo] for fila in filas if fila[campo] is not None}
+        if not ids:
+            continue
+        propios = {fila.id for fila in db.session.query(modelo.id).filter(modelo.id.in_(ids),
+                                                                           modelo.user_id == user_id)}
+        for fila in filas:
+            if fila[campo] not in propios:
+                fila[campo] = None
+
+
+# =============================================================================
+# Escritura por lotes
+# =============================================================================
+
+def inicio_semana(dia):
+    return dia - timedelta(days=dia.weekday())
+
+
+def incrementos(insertadas):
+    """Filas de resumenes_pomodoro a sumar por los eventos insertados, en orden de clave."""
+    totales = Counter()
+    for fila in insertadas:
+        if fila.fase != 'trabajo' or fila.evento == 'iniciada':
+            continue
+        for periodo, inicio in (('dia', fila.dia), ('semana', inicio_semana(fila.dia))):
+            clave = (fila.user_id, periodo, inicio)
+            totales[clave + ('segundos_foco',)] += fila.duracion or 0
+            totales[clave + ('completados' if fila.evento == 'completada' else 'abortados',)] += 1
+    resumenes = {}
+    for (user_id, periodo, inicio, campo), valor in totales.items():
+        resumen = resumenes.setdefault((user_id, periodo, inicio), {
+            'user_id': user_id, 'periodo': periodo, 'inicio': inicio,
+            'segundos_foco': 0, 'completados': 0, 'abortados': 0})
+        resumen[campo] = valor
+    # Siempre en el mismo orden: dos escrituras concurrentes bloquean las filas igual
+    return [resumenes[clave] for clave in sorted(resumenes)]
+
+
+def _sentencia_insercion():
+    tabla = SesionPomodoro.__table__
+    sentencia = _insert_dialecto()(tabla).on_conflict_do_nothing(
+        index_elements=[tabla.c.user_id, tabla.c.intervalo, tabla.c.evento])
+    return sentencia.returning(tabla.c.user_id, tabla.c.evento, tabla.c.fase, tabla.c.dia, tabla.c.duracion)
+
+
+def _sentencia_resumen():
+    tabla = ResumenPomodoro.__table__
+    sentencia = _insert_dialecto()(tabla)
+    return sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.user_id, tabla.c.periodo, tabla.c.inicio],
+        set_={campo: tabla.c[campo] + sentencia.excluded[campo]
+              for campo in ('segundos_foco', 'completados', 'abortados')})
+
+
+def escribir(filas):
+    """Inserta los eventos (con user_id) y actualiza los resúmenes en una transacción.
+
+    Devuelve cuántos eran nuevos. Los de cuentas desactivadas mientras
+    esperaban en el buffer se descartan: su purga ya puede haber pasado por
+    estas tablas.
+    """
+    user_ids = {fila['user_id'] for fila in filas}
+    activos = {fila.id for fila in db.session.query(User.id).filter(User.id.in_(user_ids),
+                                                                     User.disabled_at.is_(None))}
+    filas = [fila for fila in filas if fila['user_id'] in activos]
+    if not filas:
+        return 0
+    insertadas = db.session.execute(_sentencia_insercion(), filas).all()
+    resumenes = incrementos(insertadas)
+    if resumenes:
+        db.session.execute(_sentencia_resumen(), resumenes)
+    db.session.commit()
+    return len(insertadas)
+
+
+class BufferSesiones:
+    """Eventos recibidos pendientes de escribir y el hilo que los vuelca periódicamente."""
+
+    def __init__(self):
+        self.max_eventos = 200
+        self.segundos = 5
+        self._lock = threading.Lock()
+        # Una sola escritura a la vez por proceso
+        self._escritura = threading.Lock()
+        self._pendientes = []
+        self._despertar = threading.Event()
+        self._detenido = False
+        self._hilo = None
+        self._app = None
+        self.escritos = 0
+        self.duplicados = 0
+        self.descartados = 0
+        self.errores = 0
+
+    def init_app(self, app):
+        self.max_eventos = app.config.get('POMODORO_BUFFER_MAX', 200)
+        self.segundos = app.config.get('POMODORO_BUFFER_SEGUNDOS', 5)
+
+    @property
+    def pendientes(self):
+        return len(self._pendientes)
+
+    def agregar(self, filas):
+        """Encola los eventos. Sin buffer (o con el proceso parándose) los escribe en el momento."""
+        if self.segundos <= 0 or self._detenido:
+            with self._escritura:
+                self._contar(len(filas), escribir(filas))
+            return
+        with self._lock:
+            self._app = current_app._get_current_object()
+            self._pendientes.extend(filas)
+            lleno = len(self._pendientes) >= self.max_eventos
+        if lleno:
+            self.vaciar()
+        else:
+            self._lanzar()
+
+    def vaciar(self):
+        """Escribe lo pendiente (necesita contexto de aplicación). Si falla, lo vuelve a encolar."""
+        with self._escritura:
+            with self._lock:
+                filas, self._pendientes = self._pendientes, []
+            if not filas:
+                return 0
+            try:
+                nuevas = escribir(filas)
+            except Exception as e:
+                db.session.rollback()
+                self._reencolar(filas)
+                current_app.logger.error(f"Error guardando {len(filas)} eventos de Pomodoro: {e}")
+                return 0
+            self._contar(len(filas), nuevas)
+            return nuevas
+
+    def _contar(self, recibidas, nuevas):
+        with self._lock:
+            self.escritos += nuevas
+            self.duplicados += recibidas - nuevas
+
+    def _reencolar(self, filas):
+        with self._lock:
+            self.errores += 1
+            self._pendientes[:0] = filas
+            sobrantes = len(self._pendientes) - self.max_eventos * FACTOR_PENDIENTES
+            if sobrantes > 0:
+                # Se pierden los más antiguos: el cliente ya recibió su 202
+                del self._pendientes[:sobrantes]
+                self.descartados += sobrantes
+
+    def _lanzar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='pomodoro', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._detenido:
+            self._despertar.wait(self.segundos)
+            if self._detenido:
+                return
+            with self._app.app_context():
+                try:
+                    self.vaciar()
+                finally:
+                    db.session.remove()
+
+    def detener(self):
+        """Escribe lo pendiente y, a partir de aquí, cada lote en su petición (al parar el proceso)."""
+        self._detenido = True
+        self._despertar.set()
+        if self._app is not None:
+            with self._app.app_context():
+                try:
+                    self.vaciar()
+                finally:
+                    db.session.remove()
+
+    def estadisticas(self):
+        with self._lock:
+            return {'pendientes': len(self._pendientes), 'escritos': self.escritos,
+                    'duplicados': self.duplicados, 'descartados': self.descartados, 'errores': self.errores}
+
+
+buffer_sesiones = BufferSesiones()
+
+
+# =============================================================================
+# Lectura
+# =============================================================================
+
+def resumen(user_id, periodo, desde, hasta):
+    """Filas de resumen del usuario entre desde y hasta (solo las que tienen actividad)."""
+    consulta = ResumenPomodoro.query.filter(
+        ResumenPomodoro.user_id == user_id, ResumenPomodoro.periodo == periodo,
+        ResumenPomodoro.inicio >= desde, ResumenPomodoro.inicio <= hasta).order_by(ResumenPomodoro.inicio)
+    return [fila.to_dict() for fila in consulta]
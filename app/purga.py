@@ -0,0 +1,365 @@
+# app/purga.py - Borrado en segundo plano de cuentas de usuario
+"""
+Eliminar una cuenta desde el panel de administración solo la desactiva
+(users.disabled_at) y crea un trabajo en `purgas_usuarios`; la petición
+responde al momento. Un hilo en segundo plano borra después los datos del
+usuario por lotes de PURGA_TAMANO_LOTE filas, con un commit por lote:
+
+    tareas (con sus enlaces y contactos) -> recordatorios -> presets
+    -> historial del Pomodoro -> contadores -> eventos de cambios
+    -> fotos de perfil -> fila de users
+
+Los borrados no empiezan hasta PURGA_ESPERA_SEGUNDOS después de desactivar
+la cuenta (por defecto USER_CACHE_TTL + 10): hasta entonces otros workers
+pueden tener al usuario en su caché y seguir guardando sus tareas, que
+harían fallar el DELETE final de users por las claves foráneas.
+
+El progreso se guarda en el propio trabajo, así que se ve desde cualquier
+worker. Al reciclar un worker, su trabajo vuelve a 'pendiente' y el hilo
+muere con él: cada worker nuevo revisa al arrancar (revisar_al_arrancar) si
+quedan trabajos pendientes o en su espera y los retoma. Si el proceso muere
+sin poder parar (SIGKILL), el trabajo queda 'en_curso'; tras
+PURGA_CADUCIDAD_EN_CURSO segundos sin avanzar se da por abandonado y vuelve
+a la cola. Los que acaban en 'error' se reintentan con:
+
+    flask purgar-usuarios --reanudar
+"""
+import glob
+import os
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db, avatares
+from app.models import (User, Tarea, Enlace, Contacto, Recordatorio,
+                        PomodoroPreset, PurgaUsuario, ContadorTarea, EventoCambio, ExcepcionTarea,
+                        SesionPomodoro, ResumenPomodoro)
+from app.user_cache import invalidar as invalidar_usuario
+
+# Carpeta (relativa a static/) de las fotos subidas antes de app/avatares.py: "<user_id>_<uuid>.<ext>"
+CARPETA_PERFILES = os.path.join('images', 'profiles')
+
+_lock = threading.Lock()
+_hilo = None
+_hay_trabajo = False
+# Activado al parar el proceso (Gunicorn recicla o apaga el worker)
+_detener = threading.Event()
+
+
+class PurgaInterrumpida(Exception):
+    """El proceso se está parando: el trabajo vuelve a la cola tras el último lote confirmado."""
+
+
+def solicitar_purga(user_ids, solicitada_por=None):
+    """Desactiva las cuentas y crea sus trabajos de purga. Devuelve los trabajos creados.
+
+    Ignora los ids inexistentes y las cuentas que ya estaban desactivadas.
+    """
+    ahora = datetime.utcnow()
+    usuarios = User.query.filter(User.id.in_(user_ids), User.disabled_at.is_(None)).all()
+    purgas = []
+    for user in usuarios:
+        user.disabled_at = ahora
+        purga = PurgaUsuario(user_id=user.id, email=user.email, solicitada_por=solicitada_por)
+        db.session.add(purga)
+        purgas.append(purga)
+    db.session.commit()
+
+    for user in usuarios:
+        invalidar_usuario(user.id)
+    if purgas and current_app.config.get('PURGA_EN_SEGUNDO_PLANO', True):
+        lanzar_worker(current_app._get_current_object())
+    return purgas
+
+
+# =============================================================================
+# Worker en segundo plano
+# =============================================================================
+
+def lanzar_worker(app):
+    """Avisa al hilo de purga de este proceso (y lo arranca si no está en marcha)."""
+    global _hilo, _hay_trabajo
+    with _lock:
+        _hay_trabajo = True
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle_worker, args=(app,), name='purga-usuarios', daemon=True)
+            _hilo.start()
+
+
+def revisar_al_arrancar(app):
+    """Arranca el hilo de purga si hay trabajos que retomar (p. ej. de un worker ya reciclado)."""
+    if not app.config.get('PURGA_EN_SEGUNDO_PLANO', True):
+        return
+    with app.app_context():
+        try:
+            hay_trabajo = (_pendientes().first() is not None
+                           or PurgaUsuario.query.filter_by(estado='en_curso').first() is not None)
+        except Exception as e:
+            # Sin la tabla (base de datos sin migrar) el worker debe arrancar igualmente
+            app.logger.error(f"No se pudieron revisar las purgas pendientes: {e}")
+            return
+        finally:
+            db.session.remove()
+    if hay_trabajo:
+        lanzar_worker(app)
+
+
+def detener_worker(espera):
+    """Pide al hilo de purga que pare tras el lote en curso y lo espera hasta `espera` segundos.
+
+    El trabajo interrumpido queda 'pendiente': lo retoma el siguiente worker
+    que arranque (revisar_al_arrancar), otra purga solicitada o `flask purgar-usuarios`.
+    """
+    _detener.set()
+    hilo = _hilo
+    if hilo is not None:
+        hilo.join(espera)
+
+
+def _bucle_worker(app):
+    global _hilo, _hay_trabajo
+    while True:
+        # El aviso se consume bajo el lock: un trabajo creado mientras se procesaba
+        # el anterior vuelve a activar _hay_trabajo y el hilo da otra vuelta.
+        with _lock:
+            if not _hay_trabajo or _detener.is_set():
+                _hilo = None
+                return
+            _hay_trabajo = False
+        espera = None
+        with app.app_context():
+            try:
+                procesar_pendientes()
+                espera = _segundos_hasta_revision()
+            except Exception as e:
+                app.logger.error(f"Error en el worker de purga de usuarios: {e}")
+            finally:
+                db.session.remove()
+        if espera is not None:
+            # Quedan trabajos en su periodo de espera o en curso en otro worker:
+            # se duerme hasta que el primero se pueda empezar o se dé por abandonado
+            _detener.wait(espera)
+            with _lock:
+                _hay_trabajo = True
+
+
+def procesar_pendientes(reanudar=False):
+    """Procesa los trabajos pendientes. Devuelve cuántos ha procesado.
+
+    Con reanudar, los trabajos interrumpidos ('en_curso') o fallidos ('error')
+    vuelven antes a la cola. Los borrados son idempotentes, así que repetir
+    un lote ya hecho no tiene efecto.
+    """
+    if reanudar:
+        (PurgaUsuario.query.filter(PurgaUsuario.estado.in_(['en_curso', 'error']))
+         .update({'estado': 'pendiente'}, synchronize_session=False))
+        db.session.commit()
+    _recuperar_abandonados()
+    procesados = 0
+    while not _detener.is_set():
+        purga = (_pendientes().filter(db.or_(User.disabled_at.is_(None), User.disabled_at <= _limite_espera()))
+                 .order_by(PurgaUsuario.id).first())
+        if purga is None:
+            return procesados
+        # Reclamar el trabajo de forma atómica para que dos workers no lo repitan
+        reclamado = (PurgaUsuario.query.filter_by(id=purga.id, estado='pendiente')
+                     .update({'estado': 'en_curso', 'error': None}, synchronize_session=False))
+        db.session.commit()
+        if reclamado:
+            procesar_purga(purga.id)
+            procesados += 1
+    return procesados
+
+
+def _pendientes():
+    # outer join: un trabajo cuyo usuario ya no existe también se procesa (solo queda cerrarlo)
+    return PurgaUsuario.query.filter_by(estado='pendiente').outerjoin(User, User.id == PurgaUsuario.user_id)
+
+
+def _limite_espera():
+    """Cuentas desactivadas antes de este instante ya se pueden purgar."""
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('PURGA_ESPERA_SEGUNDOS', 70))
+
+
+def _limite_en_curso():
+    """Un trabajo 'en_curso' que no avanza desde antes de este instante está abandonado."""
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('PURGA_CADUCIDAD_EN_CURSO', 600))
+
+
+def _recuperar_abandonados():
+    """Devuelve a la cola los trabajos de workers que murieron sin pararlos (SIGKILL).
+
+    Cada lote confirmado actualiza updated_at, así que un trabajo activo nunca
+    pasa tanto tiempo sin cambiar.
+    """
+    recuperados = (PurgaUsuario.query
+                   .filter(PurgaUsuario.estado == 'en_curso', PurgaUsuario.updated_at < _limite_en_curso())
+                   .update({'estado': 'pendiente'}, synchronize_session=False))
+    db.session.commit()
+    if recuperados:
+        current_app.logger.warning(f"{recuperados} purga(s) abandonada(s) vuelven a la cola")
+
+
+def _segundos_hasta_revision():
+    """Segundos hasta que haya algo que hacer: un trabajo sale de su espera o uno 'en_curso'
+    de otro worker se puede dar por abandonado. None si no queda ninguno."""
+    esperas = []
+    siguiente = segundos_hasta_siguiente()
+    if siguiente is not None:
+        esperas.append(siguiente)
+    ultimo_avance = (db.session.query(db.func.min(PurgaUsuario.updated_at))
+                     .filter(PurgaUsuario.estado == 'en_curso').scalar())
+    if ultimo_avance is not None:
+        esperas.append(max((ultimo_avance - _limite_en_curso()).total_seconds(), 0) + 1)
+    return min(esperas) if esperas else None
+
+
+def segundos_hasta_siguiente():
+    """Segundos que faltan para que se pueda empezar el próximo trabajo pendiente (None si no hay)."""
+    desactivada = _pendientes().with_entities(db.func.min(User.disabled_at)).scalar()
+    if desactivada is None:
+        return None
+    return max((desactivada - _limite_espera()).total_seconds(), 0) + 1
+
+
+def procesar_purga(purga_id, tamano_lote=None):
+    """Borra por lotes los datos del usuario del trabajo indicado."""
+    tamano_lote = tamano_lote or current_app.config.get('PURGA_TAMANO_LOTE', 500)
+    purga = db.session.get(PurgaUsuario, purga_id)
+    user_id = purga.user_id
+    try:
+        if purga.total_estimado is None:
+            purga.total_estimado = _contar_filas(user_id)
+            db.session.commit()
+
+        fases = [
+            ('tareas', lambda: _borrar_lote_tareas(user_id, tamano_lote)),
+            ('recordatorios', lambda: _borrar_lote(Recordatorio, Recordatorio.usuario_id, user_id, tamano_lote)),
+            ('presets', lambda: _borrar_lote(PomodoroPreset, PomodoroPreset.user_id, user_id, tamano_lote)),
+            ('sesiones_pomodoro', lambda: _borrar_lote(SesionPomodoro, SesionPomodoro.user_id, user_id, tamano_lote)),
+            ('resumenes_pomodoro', lambda: _borrar_resumenes_pomodoro(user_id)),
+            ('contadores', lambda: _borrar_contadores(user_id)),
+            ('eventos', lambda: _borrar_lote(EventoCambio, EventoCambio.user_id, user_id, tamano_lote)),
+        ]
+        for fase, borrar_lote in fases:
+            purga.fase = fase
+            db.session.commit()
+            while True:
+                if _detener.is_set():
+                    raise PurgaInterrumpida()
+                borradas = borrar_lote()
+                if not borradas:
+                    break
+                purga.filas_eliminadas += borradas
+                db.session.commit()
+
+        purga.fase = 'archivos'
+        purga.archivos_eliminados += _borrar_archivos_perfil(user_id)
+        db.session.commit()
+
+        purga.fase = 'usuario'
+        db.session.execute(db.delete(User).where(User.id == user_id))
+        purga.estado = 'completada'
+        purga.fase = None
+        db.session.commit()
+        invalidar_usuario(user_id)
+    except PurgaInterrumpida:
+        purga.estado = 'pendiente'
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        purga = db.session.get(PurgaUsuario, purga_id)
+        purga.estado = 'error'
+        purga.error = str(e)
+        db.session.commit()
+        current_app.logger.error(f"Error purgando el usuario {user_id}: {e}")
+
+
+def _contar_filas(user_id):
+    """Número aproximado de filas a borrar, para mostrar el progreso."""
+    tareas = db.session.query(Tarea.id).filter(Tarea.user_id == user_id)
+    total = tareas.count()
+    total += Enlace.query.filter(Enlace.tarea_id.in_(tareas)).count()
+    total += Contacto.query.filter(Contacto.tarea_id.in_(tareas)).count()
+    total += ExcepcionTarea.query.filter(ExcepcionTarea.tarea_id.in_(tareas)).count()
+    total += Recordatorio.query.filter_by(usuario_id=user_id).count()
+    total += PomodoroPreset.query.filter_by(user_id=user_id).count()
+    total += SesionPomodoro.query.filter_by(user_id=user_id).count()
+    total += ResumenPomodoro.query.filter_by(user_id=user_id).count()
+    total += ContadorTarea.query.filter_by(user_id=user_id).count()
+    total += EventoCambio.query.filter_by(user_id=user_id).count()
+    return total
+
+
+def _borrar_lote(modelo, columna_usuario, user_id, tamano_lote):
+    ids = [fila.id for fila in db.session.query(modelo.id).filter(columna_usuario == user_id).limit(tamano_lote)]
+    if not ids:
+        return 0
+    db.session.execute(db.delete(modelo).where(modelo.id.in_(ids)),
+                       execution_options={'synchronize_session': False})
+    return len(ids)
+
+
+def _borrar_lote_tareas(user_id, tamano_lote):
+    """Borra un lote de tareas junto con sus enlaces, contactos y excepciones de repetición."""
+    ids = [fila.id for fila in db.session.query(Tarea.id).filter(Tarea.user_id == user_id).limit(tamano_lote)]
+    if not ids:
+        return 0
+    opciones = {'synchronize_session': False}
+    borradas = db.session.execute(db.delete(Enlace).where(Enlace.tarea_id.in_(ids)), execution_options=opciones).rowcount
+    borradas += db.session.execute(db.delete(Contacto).where(Contacto.tarea_id.in_(ids)), execution_options=opciones).rowcount
+    borradas += db.session.execute(db.delete(ExcepcionTarea).where(ExcepcionTarea.tarea_id.in_(ids)),
+                                   execution_options=opciones).rowcount
+    borradas += db.session.execute(db.delete(Tarea).where(Tarea.id.in_(ids)), execution_options=opciones).rowcount
+    return borradas
+
+
+def _borrar_contadores(user_id):
+    """Los contadores son pocas filas por usuario: se borran de una vez."""
+    return db.session.execute(db.delete(ContadorTarea).where(ContadorTarea.user_id == user_id),
+                              execution_options={'synchronize_session': False}).rowcount
+
+
+def _borrar_resumenes_pomodoro(user_id):
+    """Una fila por día y semana con actividad: se borran de una vez."""
+    return db.session.execute(db.delete(ResumenPomodoro).where(ResumenPomodoro.user_id == user_id),
+                              execution_options={'synchronize_session': False}).rowcount
+
+
+def _borrar_archivos_perfil(user_id):
+    """Fotos del usuario: la actual (si nadie más la usa) y las subidas antiguas sin procesar."""
+    borrados = 0
+    user = db.session.get(User, user_id)
+    if user is not None and user.profile_image:
+        anterior = user.profile_image
+        user.profile_image = None
+        db.session.commit()
+        borrados += avatares.recoger(anterior)
+
+    carpeta = os.path.join(current_app.static_folder, CARPETA_PERFILES)
+    for ruta in glob.glob(os.path.join(carpeta, f'{user_id}_*')):
+        try:
+            os.remove(ruta)
+            borrados += 1
+        except FileNotFoundError:
+            pass
+    return borrados
+
+
+# =============================================================================
+# Comando CLI: flask purgar-usuarios
+# =============================================================================
+
+@click.command('purgar-usuarios')
+@click.option('--reanudar', is_flag=True, help='Reintentar también los trabajos interrumpidos o con error.')
+@with_appcontext
+def purgar_command(reanudar):
+    """Procesa en primer plano los trabajos de purga de cuentas desactivadas."""
+    procesados = procesar_pendientes(reanudar=reanudar)
+    click.echo(f'{procesados} purga(s) procesada(s).')
+    espera = segundos_hasta_siguiente()
+    if espera is not None:
+        click.echo(f'Hay purgas en espera (PURGA_ESPERA_SEGUNDOS): la primera podrá procesarse en {espera:.0f} s.')
@@ -0,0 +1,283 @@
+# app/recurrencia.py - Tareas recurrentes: reglas y expansión por rango de fechas
+"""
+Una tarea recurrente es una sola fila de tareas con la regla en la columna
+`recurrencia` (JSON) y la fecha de la primera repetición en `fecha`:
+
+    {"frecuencia": "semanal", "intervalo": 1, "dias_semana": [0, 2]}   lunes y miércoles
+    {"frecuencia": "diaria", "intervalo": 2, "cuenta": 10}              10 veces, un día sí y otro no
+    {"frecuencia": "mensual", "hasta": "2025-06-30"}                    el mismo día de cada mes
+
+- frecuencia: diaria, semanal o mensual; intervalo: cada cuántos días,
+  semanas o meses (1 por defecto).
+- dias_semana (solo semanal): 0 = lunes ... 6 = domingo. Por defecto, el día
+  de la semana de `fecha`.
+- cuenta: número total de repeticiones; hasta: última fecha posible.
+- mensual: los meses sin ese día (31 de abril) se saltan y no cuentan.
+
+Las repeticiones no se guardan: se calculan solo para el rango que piden el
+calendario o el Kanban (expandir), y el resultado se guarda en una caché
+por proceso cuya clave incluye la regla y la fecha de inicio, así que
+editarlas nunca devuelve fechas viejas (invalidar() solo libera memoria).
+
+Lo que cambia en una repetición concreta (completarla u omitirla) se guarda
+en excepciones_tareas, una fila por fecha: completar una repetición no crea
+las demás.
+"""
+import json
+import threading
+from calendar import monthrange
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models import Tarea, ExcepcionTarea
+
+FRECUENCIAS = ('diaria', 'semanal', 'mensual')
+MAX_INTERVALO = 366
+MAX_CUENTA = 10000
+# Máximo de días que se expanden de una vez (/api/tareas con desde y hasta)
+MAX_DIAS_EXPANSION = 366
+
+
+# =============================================================================
+# Reglas
+# =============================================================================
+
+def validar(regla, inicio):
+    """Regla normalizada (dict) a partir de la recibida en la API. Lanza ValueError si no es válida.
+
+    `inicio` es la fecha de la tarea: una tarea recurrente necesita fecha.
+    """
+    if not isinstance(regla, dict):
+        raise ValueError('recurrencia debe ser un objeto')
+    if inicio is None:
+        raise ValueError('una tarea recurrente necesita fecha')
+    frecuencia = regla.get('frecuencia')
+    if frecuencia not in FRECUENCIAS:
+        raise ValueError(f'frecuencia debe ser una de: {", ".join(FRECUENCIAS)}')
+    normalizada = {'frecuencia': frecuencia, 'intervalo': _entero(regla.get('intervalo', 1), 'intervalo', MAX_INTERVALO)}
+    if frecuencia == 'semanal':
+        dias = regla.get('dias_semana') or [inicio.weekday()]
+        if not isinstance(dias, list) or not all(isinstance(d, int) and not isinstance(d, bool) and 0 <= d <= 6
+                                                 for d in dias):
+            raise ValueError('dias_semana debe ser una lista de números del 0 (lunes) al 6 (domingo)')
+        normalizada['dias_semana'] = sorted(set(dias))
+    if regla.get('cuenta') is not None:
+        normalizada['cuenta'] = _entero(regla['cuenta'], 'cuenta', MAX_CUENTA)
+    if regla.get('hasta') not in (None, ''):
+        try:
+            hasta = datetime.strptime(regla['hasta'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValueError('hasta debe ser una fecha YYYY-MM-DD')
+        if hasta < inicio:
+            raise ValueError('hasta no puede ser anterior a la fecha de la tarea')
+        normalizada['hasta'] = hasta.isoformat()
+    return normalizada
+
+
+def _entero(valor, nombre, maximo):
+    if not isinstance(valor, int) or isinstance(valor, bool) or not 1 <= valor <= maximo:
+        raise ValueError(f'{nombre} debe ser un número entre 1 y {maximo}')
+    return valor
+
+
+def serializar(regla):
+    """Texto que se guarda en tareas.recurrencia (claves ordenadas: sirve de clave de caché)."""
+    return json.dumps(regla, sort_keys=True) if regla is not None else None
+
+
+# =============================================================================
+# Expansión
+# =============================================================================
+
+def expandir(regla, inicio, desde, hasta):
+    """Fechas de la serie entre desde y hasta (incluidos), en orden."""
+    if isinstance(regla, str):
+        regla = json.loads(regla)
+    if regla.get('hasta'):
+        hasta = min(hasta, date.fromisoformat(regla['hasta']))
+    desde = max(desde, inicio)
+    if desde > hasta:
+        return []
+    cuenta = regla.get('cuenta')
+    intervalo = regla.get('intervalo', 1)
+    if regla['frecuencia'] == 'diaria':
+        return _expandir_diaria(inicio, intervalo, cuenta, desde, hasta)
+    if regla['frecuencia'] == 'semanal':
+        return _expandir_semanal(inicio, intervalo, regla['dias_semana'], cuenta, desde, hasta)
+    return _expandir_mensual(inicio, intervalo, cuenta, desde, hasta)
+
+
+def _expandir_diaria(inicio, intervalo, cuenta, desde, hasta):
+    # Índice de la primera repetición >= desde, sin recorrer las anteriores
+    indice = -(-(desde - inicio).days // intervalo)
+    fechas = []
+    fecha = inicio + timedelta(days=indice * intervalo)
+    while fecha <= hasta and (cuenta is None or indice < cuenta):
+        fechas.append(fecha)
+        indice += 1
+        fecha += timedelta(days=intervalo)
+    return fechas
+
+
+def _expandir_semanal(inicio, intervalo, dias, cuenta, desde, hasta):
+    lunes_inicio = inicio - timedelta(days=inicio.weekday())
+    # Repeticiones de la primera semana (los días anteriores a inicio no cuentan)
+    en_primera = sum(1 for dia in dias if dia >= inicio.weekday())
+    # Primera semana activa (múltiplo de intervalo) que puede tener fechas >= desde
+    semana = ((desde - lunes_inicio).days // 7) // intervalo * intervalo
+    fechas = []
+    while True:
+        lunes = lunes_inicio + timedelta(weeks=semana)
+        if lunes > hasta:
+            return fechas
+        # Repeticiones anteriores a esta semana, para aplicar cuenta
+        indice = 0 if semana == 0 else en_primera + (semana // intervalo - 1) * len(dias)
+        for dia in dias:
+            fecha = lunes + timedelta(days=dia)
+            if fecha < inicio:
+                continue
+            if cuenta is not None and indice >= cuenta:
+                return fechas
+            if desde <= fecha <= hasta:
+                fechas.append(fecha)
+            indice += 1
+        semana += intervalo
+
+
+def _expandir_mensual(inicio, intervalo, cuenta, desde, hasta):
+    # Se recorre desde el inicio para contar bien los meses saltados (pocas vueltas por año)
+    fechas = []
+    indice = 0
+    meses = 0
+    while True:
+        total = inicio.month - 1 + meses
+        anio, mes = inicio.year + total // 12, total % 12 + 1
+        if date(anio, mes, 1) > hasta:
+            return fechas
+        if inicio.day <= monthrange(anio, mes)[1]:
+            if cuenta is not None and indice >= cuenta:
+                return fechas
+            fecha = date(anio, mes, inicio.day)
+            if desde <= fecha <= hasta:
+                fechas.append(fecha)
+            indice += 1
+        meses += intervalo
+
+
+def es_repeticion(regla, inicio, fecha):
+    """True si la fecha es una repetición de la serie."""
+    return bool(expandir(regla, inicio, fecha, fecha))
+
+
+# =============================================================================
+# Caché por proceso
+# =============================================================================
+
+class CacheOcurrencias:
+    """LRU de expansiones por (tarea, regla, inicio, desde, hasta), segura entre hilos."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        self._por_tarea = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('RECURRENCIA_CACHE_MAXSIZE', 4096)
+        self.limpiar()
+
+    def fechas(self, tarea, desde, hasta):
+        """Repeticiones de la tarea en el rango, calculadas o desde la caché."""
+        clave = (tarea.id, tarea.recurrencia, tarea.fecha, desde, hasta)
+        with self._lock:
+            fechas = self._datos.get(clave)
+            if fechas is not None:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return fechas
+            self.misses += 1
+        fechas = tuple(expandir(tarea.recurrencia, tarea.fecha, desde, hasta))
+        with self._lock:
+            self._datos[clave] = fechas
+            self._datos.move_to_end(clave)
+            self._por_tarea.setdefault(tarea.id, set()).add(clave)
+            while len(self._datos) > self.maxsize:
+                antigua, _ = self._datos.popitem(last=False)
+                self._quitar_indice(antigua)
+        return fechas
+
+    def _quitar_indice(self, clave):
+        claves = self._por_tarea.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_tarea[clave[0]]
+
+    def invalidar(self, tarea_ids):
+        """Olvida las expansiones de esas tareas (al editarlas o borrarlas)."""
+        with self._lock:
+            for tarea_id in tarea_ids:
+                for clave in self._por_tarea.pop(tarea_id, ()):
+                    self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._por_tarea.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {'entradas': len(self._datos), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+cache_ocurrencias = CacheOcurrencias()
+
+
+# =============================================================================
+# Repeticiones con sus excepciones
+# =============================================================================
+
+def ocurrencias(tareas, desde, hasta):
+    """[(tarea, fecha, status)] de las tareas recurrentes en el rango, sin las omitidas.
+
+    Las excepciones de todas las tareas se leen con una sola consulta.
+    """
+    expandidas = [(tarea, cache_ocurrencias.fechas(tarea, desde, hasta)) for tarea in tareas]
+    ids = [tarea.id for tarea, fechas in expandidas if fechas]
+    excepciones = {}
+    if ids:
+        filas = ExcepcionTarea.query.filter(ExcepcionTarea.tarea_id.in_(ids),
+                                            ExcepcionTarea.fecha >= desde, ExcepcionTarea.fecha <= hasta)
+        excepciones = {(fila.tarea_id, fila.fecha): fila for fila in filas}
+    resultado = []
+    for tarea, fechas in expandidas:
+        for fecha in fechas:
+            excepcion = excepciones.get((tarea.id, fecha))
+            if excepcion is not None and excepcion.omitida:
+                continue
+            status = excepcion.status if excepcion is not None and excepcion.status else tarea.status
+            resultado.append((tarea, fecha, status))
+    return resultado
+
+
+def como_ocurrencia(datos, fecha, status):
+    """Diccionario de la tarea (to_dict/to_calendar_dict) como repetición de una fecha."""
+    return {**datos, 'fecha': fecha.isoformat(), 'status': status, 'recurrente': True}
+
+
+def filtro_rango(desde, hasta):
+    """Condición SQL de las tareas que pueden verse en el rango: las normales con fecha
+    en él y las recurrentes empezadas antes de su final (las que no tienen
+    repeticiones en el rango se descartan al expandir)."""
+    normales = [Tarea.recurrencia.is_(None)]
+    recurrentes = [Tarea.recurrencia.isnot(None)]
+    if desde is not None:
+        normales.append(Tarea.fecha >= desde)
+    if hasta is not None:
+        normales.append(Tarea.fecha <= hasta)
+        recurrentes.append(Tarea.fecha <= hasta)
+    return db.or_(db.and_(*normales), db.and_(*recurrentes))
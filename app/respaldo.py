@@ -0,0 +1,447 @@
+# app/respaldo.py - Exportación e importación de los datos de un usuario
+"""
+GET /api/exportar devuelve las tareas (con enlaces, contactos y excepciones de
+repetición), recordatorios y presets de Pomodoro del usuario como stream:
+
+- NDJSON (por defecto): una línea JSON por registro con su `tipo`, precedida
+  de una cabecera con la versión del formato. Es la copia completa:
+
+      {"tipo": "cabecera", "version": 1, "exportado_en": "2025-03-01T10:00:00"}
+      {"tipo": "tarea", "id": 7, "titulo": "...", "enlaces": [...], "contactos": [...], ...}
+      {"tipo": "recordatorio", "id": 3, "fecha": "2025-03-02", ...}
+
+- CSV: un tipo por fichero (?tipo=tareas|recordatorios|pomodoro_presets). Las
+  columnas con listas u objetos (enlaces, contactos, recurrencia, music...)
+  van como texto JSON.
+
+Las filas se leen con un cursor del lado del servidor (yield_per) y los hijos
+de cada lote con una consulta IN por tabla, así que la memoria no depende del
+número de tareas. En PostgreSQL la exportación se hace en una transacción
+REPEATABLE READ de solo lectura: una foto coherente aunque el usuario siga
+editando.
+
+POST /api/importar lee el cuerpo (mismo formato) línea a línea, valida cada
+registro y escribe los válidos por lotes de IMPORTACION_LOTE con INSERT de
+varias filas (una sentencia por tabla y lote; los ids nuevos se obtienen con
+RETURNING). Cada lote es una transacción, con sus contadores y su evento de
+/api/eventos. Los registros inválidos no detienen la importación: se
+informan con su número de línea. Los ids del fichero no se conservan.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app import db, contadores, eventos, recurrencia
+from app.models import Tarea, Enlace, Contacto, ExcepcionTarea, Recordatorio, PomodoroPreset
+
+VERSION_FORMATO = 1
+FORMATOS = ('ndjson', 'csv')
+# Tipo en ?tipo= (y nombre del fichero CSV) -> tipo de cada línea NDJSON
+TIPOS = {'tareas': 'tarea', 'recordatorios': 'recordatorio', 'pomodoro_presets': 'pomodoro_preset'}
+COLUMNAS_CSV = {
+    'tareas': ('id', 'titulo', 'descripcion', 'fecha', 'importancia', 'asunto', 'status', 'recurrencia',
+               'enlaces', 'contactos', 'excepciones', 'created_at', 'updated_at'),
+    'recordatorios': ('id', 'fecha', 'titulo', 'descripcion', 'importancia'),
+    'pomodoro_presets': ('id', 'name', 'work', 'short', 'long', 'color_work', 'color_short', 'color_long',
+                         'music', 'created_at'),
+}
+# Columnas CSV que contienen JSON
+COLUMNAS_JSON = {'recurrencia', 'enlaces', 'contactos', 'excepciones', 'music'}
+LOTE_EXPORTACION = 500
+STATUS_TAREA = ('inbox', 'incompleta', 'completa')
+# Como en create_pomodoro_preset
+MAX_PRESETS = 3
+
+
+# =============================================================================
+# Exportación
+# =============================================================================
+
+def _iso(valor):
+    return valor.isoformat() if valor is not None else None
+
+
+def _por_tarea(modelo, columnas, ids):
+    """{tarea_id: [dict]} de una tabla hija para un lote de tareas."""
+    tabla = modelo.__table__
+    consulta = (db.select(tabla.c.tarea_id, *(tabla.c[c] for c in columnas))
+                .where(tabla.c.tarea_id.in_(ids)).order_by(tabla.c.tarea_id, *tabla.primary_key.columns))
+    resultado = {}
+    for fila in db.session.execute(consulta):
+        resultado.setdefault(fila.tarea_id, []).append({c: _iso(getattr(fila, c)) if c == 'fecha' else getattr(fila, c)
+                                                        for c in columnas})
+    return resultado
+
+
+def _leer_por_lotes(consulta):
+    """Lotes de filas de la consulta, leídas con un cursor del lado del servidor."""
+    return db.session.execute(consulta, execution_options={'yield_per': LOTE_EXPORTACION}).partitions()
+
+
+def _tareas(user_id):
+    tabla = Tarea.__table__
+    consulta = (db.select(tabla.c.id, tabla.c.titulo, tabla.c.descripcion, tabla.c.fecha, tabla.c.importancia,
+                          tabla.c.asunto, tabla.c.status, tabla.c.recurrencia, tabla.c.created_at, tabla.c.updated_at)
+                .where(tabla.c.user_id == user_id).order_by(tabla.c.id))
+    for lote in _leer_por_lotes(consulta):
+        ids = [fila.id for fila in lote]
+        enlaces = _por_tarea(Enlace, ('url', 'titulo'), ids)
+        contactos = _por_tarea(Contacto, ('nombre', 'email', 'telefono', 'notas'), ids)
+        excepciones = _por_tarea(ExcepcionTarea, ('fecha', 'status', 'omitida'), ids)
+        yield [{
+            'id': fila.id,
+            'titulo': fila.titulo,
+            'descripcion': fila.descripcion,
+            'fecha': _iso(fila.fecha),
+            'importancia': fila.importancia,
+            'asunto': fila.asunto,
+            'status': fila.status,
+            'recurrencia': json.loads(fila.recurrencia) if fila.recurrencia else None,
+            'enlaces': enlaces.get(fila.id, []),
+            'contactos': contactos.get(fila.id, []),
+            'excepciones': excepciones.get(fila.id, []),
+            'created_at': _iso(fila.created_at),
+            'updated_at': _iso(fila.updated_at),
+        } for fila in lote]
+
+
+def _recordatorios(user_id):
+    tabla = Recordatorio.__table__
+    consulta = (db.select(tabla.c.id, tabla.c.fecha, tabla.c.titulo, tabla.c.descripcion, tabla.c.importancia)
+                .where(tabla.c.usuario_id == user_id).order_by(tabla.c.id))
+    for lote in _leer_por_lotes(consulta):
+        yield [{**fila._asdict(), 'fecha': _iso(fila.fecha)} for fila in lote]
+
+
+def _presets(user_id):
+    tabla = PomodoroPreset.__table__
+    consulta = db.select(*(tabla.c[c] for c in COLUMNAS_CSV['pomodoro_presets'])).where(
+        tabla.c.user_id == user_id).order_by(tabla.c.id)
+    for lote in _leer_por_lotes(consulta):
+        yield [{**fila._asdict(), 'music': _json_o_texto(fila.music), 'created_at': _iso(fila.created_at)}
+               for fila in lote]
+
+
+def _json_o_texto(valor):
+    try:
+        return json.loads(valor) if valor else None
+    except ValueError:
+        return valor
+
+
+_LECTORES = {'tareas': _tareas, 'recordatorios': _recordatorios, 'pomodoro_presets': _presets}
+
+
+def _iniciar_lectura():
+    """En PostgreSQL, empieza una transacción de solo lectura con una única foto de los datos."""
+    db.session.rollback()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ', 'postgresql_readonly': True})
+
+
+def exportar(user_id, formato, tipo=None):
+    """Generador del cuerpo de la exportación, un trozo de texto por lote de filas.
+
+    `tipo` limita la exportación a un tipo (obligatorio en CSV).
+    """
+    _iniciar_lectura()
+    try:
+        if formato == 'csv':
+            yield from _exportar_csv(user_id, tipo)
+            return
+        yield json.dumps({'tipo': 'cabecera', 'version': VERSION_FORMATO,
+                          'exportado_en': datetime.utcnow().isoformat(timespec='seconds')}) + '\n'
+        for nombre in ([tipo] if tipo else TIPOS):
+            for lote in _LECTORES[nombre](user_id):
+                yield ''.join(json.dumps({'tipo': TIPOS[nombre], **registro}, ensure_ascii=False) + '\n'
+                              for registro in lote)
+    finally:
+        db.session.rollback()
+
+
+def _exportar_csv(user_id, tipo):
+    columnas = COLUMNAS_CSV[tipo]
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=columnas, extrasaction='ignore')
+    escritor.writeheader()
+    for lote in _LECTORES[tipo](user_id):
+        for registro in lote:
+            escritor.writerow({columna: _celda_csv(columna, registro.get(columna)) for columna in columnas})
+        yield salida.getvalue()
+        salida.seek(0)
+        salida.truncate()
+    # Solo la cabecera si no hay filas
+    if salida.getvalue():
+        yield salida.getvalue()
+
+
+def _celda_csv(columna, valor):
+    if valor is None:
+        return ''
+    if columna in COLUMNAS_JSON:
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+
+# =============================================================================
+# Importación
+# =============================================================================
+
+def _texto(datos, campo, maximo=None, obligatorio=False, defecto=None):
+    valor = datos.get(campo)
+    if valor is None or valor == '':
+        if obligatorio:
+            raise ValueError(f'{campo} es obligatorio')
+        return defecto
+    if not isinstance(valor, str):
+        raise ValueError(f'{campo} debe ser texto')
+    if maximo is not None and len(valor) > maximo:
+        raise ValueError(f'{campo} supera {maximo} caracteres')
+    return valor
+
+
+def _fecha(valor, campo, obligatorio=False):
+    if not valor:
+        if obligatorio:
+            raise ValueError(f'{campo} es obligatorio')
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} debe tener formato YYYY-MM-DD')
+
+
+def _entero(valor, campo, defecto):
+    if valor is None or valor == '':
+        return defecto
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} debe ser un número entero')
+    if numero < 1:
+        raise ValueError(f'{campo} debe ser positivo')
+    return numero
+
+
+def _lista(datos, campo):
+    valor = datos.get(campo) or []
+    if not isinstance(valor, list):
+        raise ValueError(f'{campo} debe ser una lista')
+    return valor
+
+
+def _validar_tarea(datos):
+    """(fila de tareas, enlaces, contactos, excepciones) de un registro. Lanza ValueError."""
+    fecha = _fecha(datos.get('fecha'), 'fecha')
+    status = datos.get('status') or ('incompleta' if fecha else 'inbox')
+    if status not in STATUS_TAREA:
+        raise ValueError(f'status inválido: {status}')
+    try:
+        regla = recurrencia.validar(datos['recurrencia'], fecha) if datos.get('recurrencia') else None
+    except ValueError as e:
+        raise ValueError(f'recurrencia inválida: {e}')
+    fila = {
+        'titulo': _texto(datos, 'titulo', 200, obligatorio=True),
+        'descripcion': _texto(datos, 'descripcion', defecto=''),
+        'fecha': fecha,
+        'importancia': _texto(datos, 'importancia', 20),
+        'asunto': _texto(datos, 'asunto', 100, defecto=''),
+        'status': status,
+        'recurrencia': recurrencia.serializar(regla),
+    }
+    enlaces = []
+    for enlace in _lista(datos, 'enlaces'):
+        # Como en la API: una URL suelta o {url, titulo}
+        enlace = {'url': enlace} if isinstance(enlace, str) else enlace
+        if not isinstance(enlace, dict):
+            raise ValueError('cada enlace debe ser una URL o un objeto')
+        enlaces.append({'url': _texto(enlace, 'url', 500, obligatorio=True), 'titulo': _texto(enlace, 'titulo', 200)})
+    contactos = []
+    for contacto in _lista(datos, 'contactos'):
+        if not isinstance(contacto, dict):
+            raise ValueError('cada contacto debe ser un objeto')
+        contactos.append({'nombre': _texto(contacto, 'nombre', 100, obligatorio=True),
+                          'email': _texto(contacto, 'email', 120), 'telefono': _texto(contacto, 'telefono', 20),
+                          'notas': _texto(contacto, 'notas')})
+    excepciones = {}
+    for excepcion in _lista(datos, 'excepciones'):
+        if not regla:
+            raise ValueError('solo las tareas recurrentes tienen excepciones')
+        if not isinstance(excepcion, dict):
+            raise ValueError('cada excepción debe ser un objeto')
+        dia = _fecha(excepcion.get('fecha'), 'excepciones.fecha', obligatorio=True)
+        if excepcion.get('status') is not None and excepcion['status'] not in STATUS_TAREA:
+            raise ValueError(f"status inválido en la excepción del {dia}: {excepcion['status']}")
+        excepciones[dia] = {'fecha': dia, 'status': excepcion.get('status'), 'omitida': bool(excepcion.get('omitida'))}
+    return fila, enlaces, contactos, list(excepciones.values())
+
+
+def _validar_recordatorio(datos):
+    return {
+        'fecha': _fecha(datos.get('fecha'), 'fecha', obligatorio=True),
+        'titulo': _texto(datos, 'titulo', 100, obligatorio=True),
+        'descripcion': _texto(datos, 'descripcion'),
+        'importancia': _texto(datos, 'importancia', 10, defecto='baja'),
+    }
+
+
+def _validar_preset(datos):
+    music = datos.get('music')
+    return {
+        'name': _texto(datos, 'name', 120, obligatorio=True),
+        'work': _entero(datos.get('work'), 'work', 25),
+        'short': _entero(datos.get('short'), 'short', 5),
+        'long': _entero(datos.get('long'), 'long', 15),
+        'color_work': _texto(datos, 'color_work', 7),
+        'color_short': _texto(datos, 'color_short', 7),
+        'color_long': _texto(datos, 'color_long', 7),
+        'music': json.dumps(music) if isinstance(music, list) else _texto(datos, 'music'),
+    }
+
+
+def _registros_ndjson(flujo):
+    """(línea, tipo, datos) de cada registro; datos es la excepción si la línea no es JSON válido."""
+    for numero, linea in enumerate(io.TextIOWrapper(flujo, encoding='utf-8-sig'), 1):
+        if not linea.strip():
+            continue
+        try:
+            datos = json.loads(linea)
+            if not isinstance(datos, dict):
+                raise ValueError('se esperaba un objeto JSON')
+        except ValueError as e:
+            yield numero, None, ValueError(f'JSON inválido: {e}')
+            continue
+        tipo = datos.pop('tipo', None)
+        if tipo == 'cabecera':
+            version = datos.get('version', VERSION_FORMATO)
+            if not isinstance(version, int) or version > VERSION_FORMATO:
+                raise ValueError(f'versión de formato no admitida: {version}')
+            continue
+        yield numero, tipo, datos
+
+
+def _registros_csv(flujo, tipo):
+    lector = csv.DictReader(io.TextIOWrapper(flujo, encoding='utf-8-sig', newline=''))
+    for fila in lector:
+        datos = {}
+        try:
+            for columna, valor in fila.items():
+                if columna is None or valor is None or valor == '':
+                    continue
+                datos[columna] = json.loads(valor) if columna in COLUMNAS_JSON and valor[:1] in '[{"' else valor
+        except ValueError as e:
+            datos = ValueError(f'JSON inválido en una columna: {e}')
+        yield lector.line_num, TIPOS[tipo], datos
+
+
+class _Lote:
+    """Registros válidos pendientes de escribir, con su línea para informar de errores."""
+
+    def __init__(self):
+        self.tareas, self.recordatorios, self.presets = [], [], []
+
+    def __len__(self):
+        return len(self.tareas) + len(self.recordatorios) + len(self.presets)
+
+    def lineas(self):
+        return [linea for linea, *_ in self.tareas + self.recordatorios + self.presets]
+
+
+def _escribir_lote(user_id, lote):
+    """Inserta el lote en una transacción: una sentencia por tabla. Devuelve {tipo: importados}."""
+    if lote.tareas:
+        filas = [{'user_id': user_id, **fila} for _, fila, *_ in lote.tareas]
+        ids = db.session.execute(
+            db.insert(Tarea).returning(Tarea.id, sort_by_parameter_order=True), filas
+        ).scalars().all()
+        hijos = {Enlace: [], Contacto: [], ExcepcionTarea: []}
+        for (_, _, enlaces, contactos, excepciones), tarea_id in zip(lote.tareas, ids):
+            hijos[Enlace] += [{'tarea_id': tarea_id, **enlace} for enlace in enlaces]
+            hijos[Contacto] += [{'tarea_id': tarea_id, **contacto} for contacto in contactos]
+            hijos[ExcepcionTarea] += [{'tarea_id': tarea_id, **excepcion} for excepcion in excepciones]
+        for modelo, filas_hijas in hijos.items():
+            if filas_hijas:
+                db.session.execute(db.insert(modelo), filas_hijas)
+        contadores.registrar(user_id, despues=filas)
+        eventos.publicar(user_id, 'tarea', 'create', ids)
+    if lote.recordatorios:
+        ids = db.session.execute(
+            db.insert(Recordatorio).returning(Recordatorio.id, sort_by_parameter_order=True),
+            [{'usuario_id': user_id, **fila} for _, fila in lote.recordatorios]
+        ).scalars().all()
+        eventos.publicar(user_id, 'recordatorio', 'create', ids)
+    if lote.presets:
+        db.session.execute(db.insert(PomodoroPreset), [{'user_id': user_id, **fila} for _, fila in lote.presets])
+    db.session.commit()
+    return {'tareas': len(lote.tareas), 'recordatorios': len(lote.recordatorios),
+            'pomodoro_presets': len(lote.presets)}
+
+
+def importar(user_id, flujo, formato, tipo=None, tamano_lote=500, max_errores=100):
+    """Importa los registros del flujo binario. Devuelve el informe para la respuesta.
+
+    Los errores de cada registro se acumulan en el informe (los primeros
+    `max_errores`) y no detienen la importación. Si el flujo deja de poder
+    leerse, se guarda lo leído hasta ahí y el informe lo indica en
+    `interrumpida`; si no se llegó a leer nada, se lanza ValueError. Si el
+    cuerpo (sin Content-Length) supera el tamaño máximo, también se guarda lo
+    leído y el informe lleva `truncada`.
+    """
+    informe = {'importados': {nombre: 0 for nombre in TIPOS}, 'errores': [], 'total_errores': 0, 'lotes': 0}
+    presets_libres = MAX_PRESETS - PomodoroPreset.query.filter_by(user_id=user_id).count()
+    db.session.commit()
+
+    def error(linea, mensaje):
+        informe['total_errores'] += 1
+        if len(informe['errores']) < max_errores:
+            informe['errores'].append({'linea': linea, 'error': mensaje})
+
+    def escribir(lote):
+        try:
+            for nombre, cantidad in _escribir_lote(user_id, lote).items():
+                informe['importados'][nombre] += cantidad
+            informe['lotes'] += 1
+        except Exception as e:
+            db.session.rollback()
+            for linea in lote.lineas():
+                error(linea, f'lote no importado: {e.__class__.__name__}')
+
+    registros = _registros_csv(flujo, tipo) if formato == 'csv' else _registros_ndjson(flujo)
+    lote = _Lote()
+    try:
+        for linea, tipo_registro, datos in registros:
+            try:
+                if isinstance(datos, Exception):
+                    raise datos
+                if tipo_registro == 'tarea':
+                    lote.tareas.append((linea, *_validar_tarea(datos)))
+                elif tipo_registro == 'recordatorio':
+                    lote.recordatorios.append((linea, _validar_recordatorio(datos)))
+                elif tipo_registro == 'pomodoro_preset':
+                    fila = _validar_preset(datos)
+                    if presets_libres <= 0:
+                        raise ValueError(f'Límite de {MAX_PRESETS} presets alcanzado')
+                    presets_libres -= 1
+                    lote.presets.append((linea, fila))
+                else:
+                    raise ValueError(f'tipo desconocido: {tipo_registro}')
+            except (TypeError, ValueError) as e:
+                # TypeError: valores con un tipo inesperado que algún validador no comprueba
+                error(linea, str(e))
+            if len(lote) >= tamano_lote:
+                escribir(lote)
+                lote = _Lote()
+    except ValueError as e:
+        # El resto del fichero no se puede leer (codificación, versión de formato)
+        if not (informe['lotes'] or len(lote) or informe['total_errores']):
+            raise
+        informe['interrumpida'] = str(e)
+    except RequestEntityTooLarge:
+        # El límite de la petición solo se detecta al leer un cuerpo enviado por trozos
+        informe['truncada'] = True
+    if len(lote):
+        escribir(lote)
+    return informe
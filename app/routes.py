@@ -1,12 +1,17 @@
 
 # app/routes.py - Rutas y vistas de la aplicación
-import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify
+import base64
+import hashlib
+from flask import (Blueprint, Response, render_template, request, redirect, url_for, flash, session, current_app,
+                   jsonify, stream_with_context)
 import json
 from flask_login import login_user, login_required, logout_user, current_user
-from app.models import User, Tarea, Enlace, Contacto, Recordatorio, PomodoroPreset
+from app.models import (User, Tarea, ExcepcionTarea, Enlace, Contacto, Recordatorio, PomodoroPreset,
+                        EventoCambio)
 from . import db, oauth
-from datetime import datetime, date
+from app.user_cache import invalidar as invalidar_usuario
+from app import avatares, busqueda, contadores, eventos, pomodoro, recurrencia, respaldo
+from datetime import datetime, date, timedelta
 
 
 main_bp = Blueprint('main', __name__)
@@ -16,28 +21,370 @@ auth_bp = Blueprint('auth', __name__)
 # API de Tareas (Nueva implementación)
 # =============================
 
+# Tamaño de página por defecto y máximo del listado paginado de tareas
+LIMITE_TAREAS_DEFECTO = 50
+LIMITE_TAREAS_MAXIMO = 200
+
+
+def _codificar_cursor(tarea):
+    """Cursor opaco con la posición (updated_at, id) de la última tarea de la página."""
+    valor = json.dumps([tarea.updated_at.isoformat() if tarea.updated_at else None, tarea.id])
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+
+def _decodificar_cursor(cursor):
+    try:
+        updated_at, tarea_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(updated_at) if updated_at else None), int(tarea_id)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+
+def _rango_fechas(args):
+    """(desde, hasta) de la query string como fechas (None si faltan).
+
+    Lanza ValueError si alguna no tiene formato YYYY-MM-DD o si, con las dos,
+    el rango supera recurrencia.MAX_DIAS_EXPANSION.
+    """
+    desde = datetime.strptime(args['desde'], '%Y-%m-%d').date() if args.get('desde') else None
+    hasta = datetime.strptime(args['hasta'], '%Y-%m-%d').date() if args.get('hasta') else None
+    if desde and hasta and (hasta - desde).days >= recurrencia.MAX_DIAS_EXPANSION:
+        raise ValueError(f'el rango desde/hasta no puede superar {recurrencia.MAX_DIAS_EXPANSION} días')
+    return desde, hasta
+
+
+def _filtrar_tareas(query, args):
+    """Aplica los filtros status, asunto, importancia y rango desde/hasta de la query string.
+
+    status e importancia aceptan varios valores separados por comas. Con
+    desde/hasta se incluyen también las tareas recurrentes que pueden repetirse
+    en el rango. Lanza ValueError si las fechas no son válidas (_rango_fechas).
+    """
+    if args.get('status'):
+        query = query.filter(Tarea.status.in_(args['status'].split(',')))
+    if args.get('importancia'):
+        query = query.filter(Tarea.importancia.in_(args['importancia'].split(',')))
+    if args.get('asunto'):
+        query = query.filter(Tarea.asunto == args['asunto'])
+    desde, hasta = _rango_fechas(args)
+    if desde or hasta:
+        query = query.filter(recurrencia.filtro_rango(desde, hasta))
+    return query
+
+
+def _serializar_tareas(tareas, desde=None, hasta=None):
+    """to_dict() de las tareas. Con desde y hasta, cada tarea recurrente lleva sus
+    repeticiones en el rango en `ocurrencias` ([{fecha, status}]) y se omiten
+    las que no tienen ninguna."""
+    if desde is None or hasta is None:
+        return [tarea.to_dict() for tarea in tareas]
+    repeticiones = {}
+    for tarea, fecha, status in recurrencia.ocurrencias([t for t in tareas if t.recurrencia], desde, hasta):
+        repeticiones.setdefault(tarea.id, []).append({'fecha': fecha.isoformat(), 'status': status})
+    resultado = []
+    for tarea in tareas:
+        if not tarea.recurrencia:
+            resultado.append(tarea.to_dict())
+        elif tarea.id in repeticiones:
+            resultado.append({**tarea.to_dict(), 'ocurrencias': repeticiones[tarea.id]})
+    return resultado
+
+
+def _estado_tareas(user_id):
+    """Versión de las tareas de un usuario: id de su último evento de tareas, o None.
+
+    Toda alta, cambio o baja de tareas publica un evento (app/eventos.py) y
+    los de un mismo usuario se confirman en el orden de sus ids, así que sirve
+    para el ETag y como marca de updated_since sin cargar ninguna tarea.
+    """
+    return (db.session.query(db.func.max(EventoCambio.id))
+            .filter(EventoCambio.user_id == user_id, EventoCambio.entidad == 'tarea')
+            .scalar())
+
+
+def _respuesta_condicional(estado, construir):
+    """Responde 304 si el cliente ya tiene la versión actual; si no, serializa construir().
+
+    El ETag depende del usuario, de la URL pedida (filtros incluidos) y de
+    _estado_tareas, así que no hace falta cargar ninguna tarea para calcularlo.
+    """
+    base = f'{current_user.id}:{request.full_path}:{estado}'
+    etag = hashlib.sha1(base.encode('utf-8')).hexdigest()
+    # Comparación débil: app/compresion.py marca el ETag como débil al comprimir
+    if request.if_none_match.contains_weak(etag):
+        respuesta = current_app.response_class(status=304)
+    else:
+        respuesta = jsonify(construir())
+    respuesta.set_etag(etag)
+    # no-cache: el navegador guarda la respuesta pero revalida con If-None-Match en cada fetch
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    if estado is not None:
+        respuesta.headers['X-Sincronizado-Hasta'] = str(estado)
+    return respuesta
+
+
+def _cambios_tareas(user_id, marca):
+    """Tareas cambiadas y ids borrados desde la marca, según los eventos posteriores."""
+    ultimo, ids = marca, set()
+    for evento_id, lista in (db.session.query(EventoCambio.id, EventoCambio.ids)
+                             .filter(EventoCambio.user_id == user_id, EventoCambio.entidad == 'tarea',
+                                     EventoCambio.id > marca)):
+        ultimo = max(ultimo, evento_id)
+        ids.update(json.loads(lista))
+    # Las tareas se leen después que los eventos: reflejan al menos hasta `ultimo`
+    tareas = (Tarea.query_con_relaciones().filter(Tarea.user_id == user_id, Tarea.id.in_(ids)).all()
+              if ids else [])
+    return {
+        'tareas': [tarea.to_dict() for tarea in tareas],
+        'eliminadas': sorted(ids - {tarea.id for tarea in tareas}),
+        'sincronizado_hasta': str(ultimo)
+    }
+
+
 @main_bp.route('/api/tareas', methods=['GET'])
 @login_required
 def get_todas_tareas():
-    """Obtiene todas las tareas del usuario autenticado para el tablero Kanban."""
-    tareas = Tarea.query.filter_by(user_id=current_user.id).all()
-    return jsonify([tarea.to_dict() for tarea in tareas])
+    """Obtiene las tareas del usuario autenticado para el tablero Kanban.
+
+    Sin parámetros devuelve la lista completa, como siempre. Acepta filtros
+    (status, asunto, importancia, desde, hasta) y, si se pasa `limit` o `cursor`,
+    pagina por (updated_at, id) de más reciente a más antigua y devuelve
+    {'tareas': [...], 'next_cursor': ...} para que cada columna cargue por partes.
+    Con desde y hasta, las tareas recurrentes incluyen sus repeticiones del rango.
+
+    Con `updated_since` (la cabecera X-Sincronizado-Hasta de la carga anterior)
+    devuelve solo lo que cambió desde esa marca:
+    {'tareas': [...], 'eliminadas': [ids], 'sincronizado_hasta': ...}, o 410 si
+    ya se han borrado los eventos que lo dirían y hay que cargar la lista completa.
+    """
+    estado = _estado_tareas(current_user.id)
+
+    if request.args.get('updated_since'):
+        try:
+            marca = int(request.args['updated_since'])
+        except ValueError:
+            return jsonify({'error': 'updated_since inválido (valor de X-Sincronizado-Hasta)'}), 400
+        if eventos.faltan_desde(marca):
+            # Se han borrado eventos posteriores (EVENTOS_RETENCION_HORAS): no se sabe qué cambió
+            return jsonify({'error': 'updated_since demasiado antiguo: carga la lista completa'}), 410
+        return _respuesta_condicional(estado, lambda: _cambios_tareas(current_user.id, marca))
+
+    query = Tarea.query_con_relaciones().filter_by(user_id=current_user.id)
+    try:
+        query = _filtrar_tareas(query, request.args)
+        desde, hasta = _rango_fechas(request.args)
+        cursor = request.args.get('cursor')
+        limite = request.args.get('limit')
+        if cursor is None and limite is None:
+            return _respuesta_condicional(estado, lambda: _serializar_tareas(query.all(), desde, hasta))
+
+        limite = min(max(int(limite or LIMITE_TAREAS_DEFECTO), 1), LIMITE_TAREAS_MAXIMO)
+        if cursor:
+            updated_at, tarea_id = _decodificar_cursor(cursor)
+            query = query.filter(db.or_(
+                Tarea.updated_at < updated_at,
+                db.and_(Tarea.updated_at == updated_at, Tarea.id < tarea_id)
+            ))
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {e}'}), 400
+
+    def construir_pagina():
+        # Se pide una fila de más para saber si existe una página siguiente
+        tareas = query.order_by(Tarea.updated_at.desc(), Tarea.id.desc()).limit(limite + 1).all()
+        siguiente = _codificar_cursor(tareas[limite - 1]) if len(tareas) > limite else None
+        return {
+            'tareas': _serializar_tareas(tareas[:limite], desde, hasta),
+            'next_cursor': siguiente
+        }
+    return _respuesta_condicional(estado, construir_pagina)
 
 @main_bp.route('/api/tareas/fecha/<fecha>', methods=['GET'])
 @login_required
 def get_tareas_por_fecha(fecha):
-    """Obtiene las tareas de una fecha específica para el calendario."""
+    """Obtiene las tareas de una fecha específica para el calendario, con las repeticiones de ese día."""
     try:
         fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
-        tareas = Tarea.query.filter_by(fecha=fecha_obj, user_id=current_user.id).all()
-        return jsonify([tarea.to_dict() for tarea in tareas])
     except ValueError:
         return jsonify({'error': 'Formato de fecha inválido'}), 400
+    query = (Tarea.query_con_relaciones()
+             .filter(Tarea.user_id == current_user.id, recurrencia.filtro_rango(fecha_obj, fecha_obj)))
+
+    def construir():
+        tareas = query.all()
+        return ([tarea.to_dict() for tarea in tareas if not tarea.recurrencia] +
+                [recurrencia.como_ocurrencia(tarea.to_dict(), dia, status) for tarea, dia, status
+                 in recurrencia.ocurrencias([t for t in tareas if t.recurrencia], fecha_obj, fecha_obj)])
+    return _respuesta_condicional(_estado_tareas(current_user.id), construir)
+
+# Campos de texto de tareas, enlaces y contactos: (obligatorio, longitud máxima de la columna)
+CAMPOS_TEXTO_TAREA = {'titulo': (True, 200), 'descripcion': (False, None), 'importancia': (False, 20),
+                      'asunto': (False, 100)}
+CAMPOS_ENLACE = {'url': (True, 500), 'titulo': (False, 200)}
+CAMPOS_CONTACTO = {'nombre': (True, 100), 'email': (False, 120), 'telefono': (False, 20), 'notas': (False, None)}
+
+
+def _validar_textos(elemento, campos, nombre=None, solo_presentes=False):
+    """Comprueba que los `campos` de `elemento` son textos (o null si no son obligatorios)
+    y caben en su columna. Con solo_presentes, los que no vienen no se comprueban. Lanza ValueError."""
+    for campo, (obligatorio, maximo) in campos.items():
+        if solo_presentes and campo not in elemento:
+            continue
+        etiqueta = f'{nombre}: {campo}' if nombre else campo
+        valor = elemento.get(campo)
+        if valor is None and not obligatorio:
+            continue
+        if not isinstance(valor, str) or (obligatorio and not valor.strip()):
+            raise ValueError(f'{etiqueta} debe ser un texto' + (' no vacío' if obligatorio else ''))
+        if maximo and len(valor) > maximo:
+            raise ValueError(f'{etiqueta} admite como máximo {maximo} caracteres')
+
+
+def _validar_relaciones(datos, parciales=False):
+    """Comprueba los enlaces (URL u objeto {url, titulo}) y contactos ({nombre, ...}) recibidos.
+
+    Con parciales (PUT), un elemento con 'id' puede traer solo los campos que
+    cambian; _sincronizar_relacion comprueba completos los que acaban siendo
+    altas. Lanza ValueError antes de escribir nada, para responder 400 (o
+    dejar el error en el resultado de la operación del lote).
+    """
+    for nombre, campos in (('enlaces', CAMPOS_ENLACE), ('contactos', CAMPOS_CONTACTO)):
+        elementos = datos.get(nombre) or []
+        if not isinstance(elementos, list):
+            raise ValueError(f'{nombre} debe ser una lista')
+        for elemento in elementos:
+            if nombre == 'enlaces' and isinstance(elemento, str):
+                elemento = {'url': elemento}
+            if not isinstance(elemento, dict):
+                raise ValueError('cada enlace debe ser una URL o un objeto {url, titulo}' if nombre == 'enlaces'
+                                 else 'cada contacto debe ser un objeto {nombre, email, telefono, notas}')
+            parcial = parciales and 'id' in elemento
+            if parcial and (not isinstance(elemento['id'], int) or isinstance(elemento['id'], bool)):
+                raise ValueError(f'{nombre}: id debe ser un número')
+            _validar_textos(elemento, campos, nombre, solo_presentes=parcial)
+
+
+def _fila_enlace(tarea_id, enlace_data):
+    """Fila de Enlace a partir de una URL suelta o de un objeto {url, titulo}."""
+    if isinstance(enlace_data, str):
+        return {'tarea_id': tarea_id, 'url': enlace_data, 'titulo': None}
+    return {'tarea_id': tarea_id, 'url': enlace_data.get('url'), 'titulo': enlace_data.get('titulo', '')}
+
+
+def _fila_contacto(tarea_id, contacto_data):
+    return {
+        'tarea_id': tarea_id,
+        'nombre': contacto_data.get('nombre'),
+        'email': contacto_data.get('email', ''),
+        'telefono': contacto_data.get('telefono', ''),
+        'notas': contacto_data.get('notas', '')
+    }
+
+
+def _sincronizar_relacion(modelo, existentes, entrantes, clave, campos, construir_fila):
+    """Aplica a los enlaces/contactos de una tarea solo los cambios necesarios.
+
+    Cada elemento entrante se empareja con uno existente por 'id' o, si no lo
+    trae, por `clave` (url o nombre). Los emparejados se actualizan solo en los
+    `campos` que vienen en el elemento y han cambiado; los no emparejados se
+    insertan y los existentes que nadie reclama se borran. Cada tipo de cambio
+    es una única sentencia masiva, y si nada cambia no se escribe nada.
+    `campos` es CAMPOS_ENLACE o CAMPOS_CONTACTO; las altas tienen que traer
+    los obligatorios (ValueError si no). Devuelve True si se modificó algo.
+    """
+    por_id = {obj.id: obj for obj in existentes}
+    por_clave = {}
+    for obj in existentes:
+        por_clave.setdefault(getattr(obj, clave), []).append(obj)
+    usados = set()
+    inserciones, actualizaciones = [], []
+
+    for dato in entrantes:
+        item = {clave: dato} if isinstance(dato, str) else dato
+        obj = por_id.get(item.get('id'))
+        if obj is None or obj.id in usados:
+            candidatos = [o for o in por_clave.get(item.get(clave), []) if o.id not in usados]
+            obj = candidatos[0] if candidatos else None
+        if obj is None:
+            _validar_textos(item, campos, modelo.__tablename__)
+            inserciones.append(construir_fila(dato))
+            continue
+        usados.add(obj.id)
+        cambios = {c: item[c] for c in campos if c in item and item[c] != getattr(obj, c)}
+        if cambios:
+            actualizaciones.append({'id': obj.id, **cambios})
+
+    borrados = [obj.id for obj in existentes if obj.id not in usados]
+    if borrados:
+        db.session.execute(db.delete(modelo).where(modelo.id.in_(borrados)),
+                           execution_options={'synchronize_session': False})
+    if actualizaciones:
+        db.session.execute(db.update(modelo), actualizaciones)
+    if inserciones:
+        db.session.execute(db.insert(modelo), inserciones)
+    return bool(borrados or actualizaciones or inserciones)
+
+
+# --- Búsqueda de texto completo (app/busqueda.py) ---
+LIMITE_BUSQUEDA_DEFECTO = 20
+LIMITE_BUSQUEDA_MAXIMO = 100
+
+
+@main_bp.route('/api/tareas/buscar', methods=['GET'])
+@login_required
+def buscar_tareas():
+    """Busca tareas del usuario por título, asunto, descripción, enlaces y contactos.
+
+    ?q= admite varias palabras (todas deben aparecer) y trata cada una como
+    prefijo, para buscar mientras se escribe. Devuelve las tareas ordenadas
+    por relevancia, cada una con su campo 'relevancia'.
+    """
+    q = request.args.get('q', '').strip()
+    try:
+        limite = min(max(int(request.args.get('limit', LIMITE_BUSQUEDA_DEFECTO)), 1), LIMITE_BUSQUEDA_MAXIMO)
+    except ValueError:
+        return jsonify({'error': 'Parámetros inválidos: limit debe ser un número'}), 400
+    if not q:
+        return jsonify({'q': q, 'tareas': []})
+
+    try:
+        resultados = busqueda.buscar_tareas(current_user.id, q, limite)
+    except busqueda.BusquedaNoDisponible as e:
+        current_app.logger.error(f"Búsqueda no disponible: {e}")
+        return jsonify({'error': 'La búsqueda no está disponible: ejecuta flask db upgrade'}), 503
+
+    relevancias = dict(resultados)
+    tareas = Tarea.query_con_relaciones().filter(Tarea.id.in_(relevancias)).all()
+    tareas.sort(key=lambda t: relevancias[t.id], reverse=True)
+    return jsonify({
+        'q': q,
+        'tareas': [{**tarea.to_dict(), 'relevancia': round(relevancias[tarea.id], 6)} for tarea in tareas]
+    })
+
+
+@main_bp.route('/api/tareas/estadisticas', methods=['GET'])
+@login_required
+def estadisticas_tareas():
+    """Totales de tareas del usuario por status, importancia y asunto, más vencidas y para hoy.
+
+    Se leen de contadores_tareas (ver app/contadores.py) sin recorrer las
+    tareas. ?hoy=YYYY-MM-DD permite usar la fecha local del cliente.
+    """
+    try:
+        hoy = datetime.strptime(request.args['hoy'], '%Y-%m-%d').date() if request.args.get('hoy') else date.today()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
+    return jsonify({'hoy': hoy.isoformat(), **contadores.estadisticas(current_user.id, hoy)})
+
+
+def _regla_recurrencia(regla, fecha):
+    """Texto para tareas.recurrencia a partir de la regla recibida (None la quita). Lanza ValueError."""
+    return recurrencia.serializar(recurrencia.validar(regla, fecha)) if regla else None
+
 
 @main_bp.route('/api/tareas', methods=['POST'])
 @login_required
 def crear_tarea():
-    """Crea una nueva tarea."""
+    """Crea una nueva tarea (recurrente si trae `recurrencia`, ver app/recurrencia.py)."""
     data = request.get_json()
     
     try:
@@ -49,6 +396,14 @@ def crear_tarea():
         if fecha_str:
             fecha_obj = datetime.strptime(fecha_str, '%Y-%m-%d').date()
             status_inicial = 'incompleta'
+        try:
+            regla = _regla_recurrencia(data.get('recurrencia'), fecha_obj)
+        except ValueError as e:
+            return jsonify({'error': f'recurrencia inválida: {e}'}), 400
+        try:
+            _validar_relaciones(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Crear la tarea
         nueva_tarea = Tarea(
@@ -58,38 +413,26 @@ def crear_tarea():
             fecha=fecha_obj,
             importancia=data.get('importancia'),
             asunto=data.get('asunto', ''),
-            status=status_inicial
+            status=status_inicial,
+            recurrencia=regla
         )
         
         db.session.add(nueva_tarea)
         db.session.flush()  # Para obtener el ID de la tarea
         
-        # Agregar enlaces si existen
-        enlaces = data.get('enlaces', [])
-        for enlace_data in enlaces:
-            if isinstance(enlace_data, str):  # Si es solo una URL
-                nuevo_enlace = Enlace(tarea_id=nueva_tarea.id, url=enlace_data)
-            else:  # Si es un objeto con url y titulo
-                nuevo_enlace = Enlace(
-                    tarea_id=nueva_tarea.id,
-                    url=enlace_data.get('url'),
-                    titulo=enlace_data.get('titulo', '')
-                )
-            db.session.add(nuevo_enlace)
-        
-        # Agregar contactos si existen
-        contactos = data.get('contactos', [])
-        for contacto_data in contactos:
-            nuevo_contacto = Contacto(
-                tarea_id=nueva_tarea.id,
-                nombre=contacto_data.get('nombre'),
-                email=contacto_data.get('email', ''),
-                telefono=contacto_data.get('telefono', ''),
-                notas=contacto_data.get('notas', '')
-            )
-            db.session.add(nuevo_contacto)
+        # Agregar enlaces y contactos si existen (un INSERT por tabla)
+        enlaces = [_fila_enlace(nueva_tarea.id, e) for e in data.get('enlaces') or []]
+        if enlaces:
+            db.session.execute(db.insert(Enlace), enlaces)
+        contactos = [_fila_contacto(nueva_tarea.id, c) for c in data.get('contactos') or []]
+        if contactos:
+            db.session.execute(db.insert(Contacto), contactos)
         
+        contadores.registrar(current_user.id, despues=[nueva_tarea])
+        eventos.publicar(current_user.id, 'tarea', 'create', [nueva_tarea.id])
         db.session.commit()
+        # Recargar con las relaciones precargadas para serializar sin consultas extra
+        nueva_tarea = Tarea.query_con_relaciones().filter_by(id=nueva_tarea.id).one()
         return jsonify({'success': True, 'id': nueva_tarea.id, 'tarea': nueva_tarea.to_dict()}), 201
         
     except Exception as e:
@@ -100,11 +443,24 @@ def crear_tarea():
 @login_required
 def actualizar_tarea(id):
     """Actualiza una tarea existente."""
-    tarea = Tarea.query.filter_by(id=id, user_id=current_user.id).first()
+    # FOR UPDATE: dos ediciones simultáneas de la misma tarea no pueden partir del mismo
+    # estado anterior, o los contadores restarían dos veces el mismo valor
+    tarea = (Tarea.query_con_relaciones().filter_by(id=id, user_id=current_user.id)
+             .with_for_update(of=Tarea).first())
     if not tarea:
         return jsonify({'error': 'Tarea no encontrada'}), 404
     
     data = request.get_json()
+    # status es una dimensión de los contadores: un valor libre acabaría en las estadísticas
+    if 'status' in data and data['status'] not in STATUS_TAREA:
+        db.session.rollback()
+        return jsonify({'error': f"status inválido: {data['status']}"}), 400
+    try:
+        _validar_relaciones(data, parciales=True)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    antes = contadores.estado(tarea)
     
     try:
         # Actualizar campos básicos
@@ -129,40 +485,47 @@ def actualizar_tarea(id):
             else:
                 tarea.fecha = None
         
-        # Actualizar enlaces si se proporcionan
-        if 'enlaces' in data:
-            # Eliminar enlaces existentes
-            Enlace.query.filter_by(tarea_id=tarea.id).delete()
-            
-            # Agregar nuevos enlaces
-            for enlace_data in data['enlaces']:
-                if isinstance(enlace_data, str):
-                    nuevo_enlace = Enlace(tarea_id=tarea.id, url=enlace_data)
-                else:
-                    nuevo_enlace = Enlace(
-                        tarea_id=tarea.id,
-                        url=enlace_data.get('url'),
-                        titulo=enlace_data.get('titulo', '')
-                    )
-                db.session.add(nuevo_enlace)
+        # La regla se valida contra la fecha resultante (una serie necesita fecha de inicio)
+        try:
+            if 'recurrencia' in data:
+                tarea.recurrencia = _regla_recurrencia(data['recurrencia'], tarea.fecha)
+            elif tarea.recurrencia and 'fecha' in data:
+                recurrencia.validar(json.loads(tarea.recurrencia), tarea.fecha)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': f'recurrencia inválida: {e}'}), 400
+        # Otra regla u otra fecha de inicio es otra serie: las excepciones de la anterior sobran
+        serie_cambiada = antes['recurrencia'] and (tarea.recurrencia, tarea.fecha) != (antes['recurrencia'], antes['fecha'])
+        if serie_cambiada:
+            ExcepcionTarea.query.filter_by(tarea_id=tarea.id).delete(synchronize_session=False)
+        
+        # Enlaces y contactos: solo los INSERT/UPDATE/DELETE necesarios
+        relaciones_cambiadas = False
+        try:
+            if 'enlaces' in data:
+                relaciones_cambiadas |= _sincronizar_relacion(
+                    Enlace, tarea.enlaces, data['enlaces'] or [], 'url', CAMPOS_ENLACE,
+                    lambda e: _fila_enlace(tarea.id, e))
+            if 'contactos' in data:
+                relaciones_cambiadas |= _sincronizar_relacion(
+                    Contacto, tarea.contactos, data['contactos'] or [], 'nombre', CAMPOS_CONTACTO,
+                    lambda c: _fila_contacto(tarea.id, c))
+        except ValueError as e:
+            # Un elemento con un id que no es de esta tarea se da de alta: le faltan campos
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         
-        # Actualizar contactos si se proporcionan
-        if 'contactos' in data:
-            # Eliminar contactos existentes
-            Contacto.query.filter_by(tarea_id=tarea.id).delete()
-            
-            # Agregar nuevos contactos
-            for contacto_data in data['contactos']:
-                nuevo_contacto = Contacto(
-                    tarea_id=tarea.id,
-                    nombre=contacto_data.get('nombre'),
-                    email=contacto_data.get('email', ''),
-                    telefono=contacto_data.get('telefono', ''),
-                    notas=contacto_data.get('notas', '')
-                )
-                db.session.add(nuevo_contacto)
+        # Los cambios en enlaces/contactos no tocan la fila de la tarea: forzar updated_at
+        # para que el ETag y la sincronización incremental los detecten
+        if relaciones_cambiadas:
+            tarea.updated_at = db.func.current_timestamp()
         
+        contadores.registrar(current_user.id, antes=[antes], despues=[contadores.estado(tarea)])
+        eventos.publicar(current_user.id, 'tarea', 'update', [tarea.id])
         db.session.commit()
+        if serie_cambiada:
+            recurrencia.cache_ocurrencias.invalidar([tarea.id])
+        tarea = Tarea.query_con_relaciones().filter_by(id=tarea.id).one()
         return jsonify({'success': True, 'tarea': tarea.to_dict()})
         
     except Exception as e:
@@ -173,18 +536,418 @@ def actualizar_tarea(id):
 @login_required
 def eliminar_tarea(id):
     """Elimina una tarea y sus relaciones asociadas."""
-    tarea = Tarea.query.filter_by(id=id, user_id=current_user.id).first()
+    tarea = Tarea.query.filter_by(id=id, user_id=current_user.id).with_for_update().first()
     if not tarea:
         return jsonify({'error': 'Tarea no encontrada'}), 404
     
     try:
-        db.session.delete(tarea)  # Los enlaces y contactos se eliminan automáticamente por cascade
+        db.session.delete(tarea)  # Enlaces, contactos y excepciones se eliminan por cascade
+        contadores.registrar(current_user.id, antes=[tarea])
+        eventos.publicar(current_user.id, 'tarea', 'delete', [tarea.id])
         db.session.commit()
+        recurrencia.cache_ocurrencias.invalidar([id])
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _serie_y_fecha(id, fecha):
+    """(tarea recurrente bloqueada, fecha, None) de una repetición, o (None, None, respuesta de error)."""
+    try:
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, (jsonify({'error': 'Formato de fecha inválido'}), 400)
+    # FOR UPDATE: serializa los cambios de la serie y de sus repeticiones
+    tarea = Tarea.query.filter_by(id=id, user_id=current_user.id).with_for_update().first()
+    if not tarea:
+        return None, None, (jsonify({'error': 'Tarea no encontrada'}), 404)
+    if not tarea.recurrencia:
+        return None, None, (jsonify({'error': 'La tarea no es recurrente'}), 400)
+    if not recurrencia.es_repeticion(tarea.recurrencia, tarea.fecha, fecha_obj):
+        return None, None, (jsonify({'error': 'La tarea no se repite en esa fecha'}), 404)
+    return tarea, fecha_obj, None
+
+@main_bp.route('/api/tareas/<int:id>/ocurrencias/<fecha>', methods=['PUT'])
+@login_required
+def actualizar_ocurrencia(id, fecha):
+    """Cambia una sola repetición de una tarea recurrente sin crear las demás.
+
+    Cuerpo: {'status': 'completa'} para completarla (o cualquier otro status)
+    o {'omitida': true} para quitarla del calendario.
+    """
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    omitida = bool(data.get('omitida', False))
+    if status is None and not omitida:
+        return jsonify({'error': 'Se esperaba status u omitida'}), 400
+    if status is not None and status not in STATUS_TAREA:
+        return jsonify({'error': f'status inválido: {status}'}), 400
+    tarea, fecha_obj, error = _serie_y_fecha(id, fecha)
+    if error:
+        db.session.rollback()
+        return error
+
+    try:
+        excepcion = db.session.get(ExcepcionTarea, (tarea.id, fecha_obj)) or ExcepcionTarea(tarea_id=tarea.id, fecha=fecha_obj)
+        excepcion.status = status
+        excepcion.omitida = omitida
+        db.session.add(excepcion)
+        # Como con enlaces y contactos: updated_at cambia para el ETag y updated_since
+        tarea.updated_at = db.func.current_timestamp()
+        eventos.publicar(current_user.id, 'tarea', 'update', [tarea.id])
+        db.session.commit()
+        return jsonify({'success': True, 'ocurrencia': {'tarea_id': tarea.id, 'fecha': fecha_obj.isoformat(),
+                                                        'status': status or tarea.status, 'omitida': omitida}})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/tareas/<int:id>/ocurrencias/<fecha>', methods=['DELETE'])
+@login_required
+def restaurar_ocurrencia(id, fecha):
+    """Deshace los cambios de una repetición: vuelve a tener el status de la serie."""
+    tarea, fecha_obj, error = _serie_y_fecha(id, fecha)
+    if error:
+        db.session.rollback()
+        return error
+
+    try:
+        borradas = ExcepcionTarea.query.filter_by(tarea_id=tarea.id, fecha=fecha_obj).delete(synchronize_session=False)
+        if borradas:
+            tarea.updated_at = db.func.current_timestamp()
+            eventos.publicar(current_user.id, 'tarea', 'update', [tarea.id])
+        db.session.commit()
+        return jsonify({'success': True})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# =============================
+# Operaciones en lote sobre tareas (Kanban: mover, re-fechar, completar varias)
+# =============================
+
+MAX_OPERACIONES_BATCH = 500
+STATUS_TAREA = ('inbox', 'incompleta', 'completa')
+CAMPOS_BATCH = ('titulo', 'descripcion', 'importancia', 'asunto', 'status', 'fecha')
+
+
+def _valores_batch(datos):
+    """Columnas escalares de una operación en lote. Lanza ValueError si algún valor no es válido."""
+    if not isinstance(datos, dict):
+        raise ValueError('datos debe ser un objeto')
+    valores = {campo: datos[campo] for campo in CAMPOS_BATCH if campo in datos}
+    _validar_textos(valores, CAMPOS_TEXTO_TAREA, solo_presentes=True)
+    if 'fecha' in valores:
+        try:
+            valores['fecha'] = datetime.strptime(valores['fecha'], '%Y-%m-%d').date() if valores['fecha'] else None
+        except (TypeError, ValueError):
+            raise ValueError('fecha debe tener el formato YYYY-MM-DD')
+    if 'status' in valores and valores['status'] not in STATUS_TAREA:
+        raise ValueError(f"status inválido: {valores['status']}")
+    return valores
+
+
+@main_bp.route('/api/tareas/batch', methods=['POST'])
+@login_required
+def batch_tareas():
+    """Aplica una lista de operaciones create/update/delete en una sola transacción.
+
+    Cuerpo: {'operaciones': [{'op': 'create', 'datos': {...}},
+                             {'op': 'update', 'id': 5, 'datos': {'status': 'completa'}},
+                             {'op': 'delete', 'id': 7}]}
+
+    Las operaciones inválidas (datos erróneos, tarea ajena o inexistente) se
+    informan en su resultado sin impedir las demás. Las válidas se ejecutan con
+    sentencias masivas: un INSERT por tabla para las altas, un UPDATE
+    (executemany) por cada combinación de campos modificados y un DELETE ... IN
+    por tabla para las bajas. Las altas admiten `recurrencia` como POST /api/tareas;
+    las actualizaciones solo campos escalares: enlaces, contactos y la regla de
+    repetición se editan con PUT /api/tareas/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    operaciones = data.get('operaciones')
+    if not isinstance(operaciones, list) or not operaciones:
+        return jsonify({'error': 'Se esperaba una lista no vacía en "operaciones"'}), 400
+    if len(operaciones) > MAX_OPERACIONES_BATCH:
+        return jsonify({'error': f'Máximo {MAX_OPERACIONES_BATCH} operaciones por lote'}), 400
+
+    resultados = [None] * len(operaciones)
+    creaciones, actualizaciones, borrados = [], [], []
+    ids_vistos = set()
+    for i, operacion in enumerate(operaciones):
+        try:
+            if not isinstance(operacion, dict):
+                raise ValueError('operación inválida')
+            tipo = operacion.get('op')
+            if tipo == 'create':
+                datos = operacion.get('datos') or {}
+                valores = _valores_batch(datos)
+                if 'titulo' not in valores:
+                    raise ValueError('titulo es obligatorio')
+                # Como POST /api/tareas: el status inicial se deduce de la fecha
+                if 'status' in valores:
+                    raise ValueError('status no se indica al crear: es inbox sin fecha e incompleta con fecha')
+                _validar_relaciones(datos)
+                try:
+                    valores['recurrencia'] = _regla_recurrencia(datos.get('recurrencia'), valores.get('fecha'))
+                except ValueError as e:
+                    raise ValueError(f'recurrencia inválida: {e}')
+                creaciones.append((i, valores, datos))
+                continue
+            if tipo not in ('update', 'delete'):
+                raise ValueError(f'op desconocida: {tipo}')
+            tarea_id = int(operacion.get('id'))
+            if tarea_id in ids_vistos:
+                raise ValueError('la tarea aparece más de una vez en el lote')
+            ids_vistos.add(tarea_id)
+            if tipo == 'update':
+                datos = operacion.get('datos') or {}
+                if isinstance(datos, dict) and any(campo in datos for campo in ('enlaces', 'contactos', 'recurrencia')):
+                    raise ValueError('enlaces, contactos y recurrencia se actualizan con PUT /api/tareas/<id>')
+                actualizaciones.append((i, tarea_id, _valores_batch(datos)))
+            else:
+                borrados.append((i, tarea_id))
+        except (ValueError, TypeError) as e:
+            resultados[i] = {'indice': i, 'ok': False, 'error': str(e)}
+
+    # Una sola consulta para comprobar pertenencia y conocer el estado actual
+    # (bloqueado hasta el commit, para que los contadores partan de él)
+    estado_actual = {}
+    if ids_vistos:
+        filas = (db.session.query(Tarea.id, *(getattr(Tarea, c) for c in contadores.CAMPOS_ESTADO))
+                 .filter(Tarea.user_id == current_user.id, Tarea.id.in_(ids_vistos))
+                 .order_by(Tarea.id).with_for_update().all())
+        estado_actual = {fila.id: dict(zip(contadores.CAMPOS_ESTADO, fila[1:])) for fila in filas}
+    for i, tarea_id, *_ in actualizaciones + borrados:
+        if tarea_id not in estado_actual:
+            resultados[i] = {'indice': i, 'ok': False, 'error': 'Tarea no encontrada'}
+    # Una tarea recurrente solo puede cambiar a una fecha válida como inicio de su serie
+    for i, tarea_id, valores in actualizaciones:
+        regla = estado_actual.get(tarea_id, {}).get('recurrencia')
+        if regla and 'fecha' in valores:
+            try:
+                recurrencia.validar(json.loads(regla), valores['fecha'])
+            except ValueError as e:
+                resultados[i] = {'indice': i, 'ok': False, 'error': f'recurrencia inválida: {e}'}
+    actualizaciones = [a for a in actualizaciones if a[1] in estado_actual and resultados[a[0]] is None]
+    borrados = [b for b in borrados if b[1] in estado_actual]
+    antes, despues = [], []
+    nuevos_ids = []
+    # Series que cambian de inicio o desaparecen: sus excepciones sobran
+    series_cambiadas = [tarea_id for _, tarea_id, valores in actualizaciones
+                        if estado_actual[tarea_id]['recurrencia'] and 'fecha' in valores
+                        and valores['fecha'] != estado_actual[tarea_id]['fecha']]
+    series_cambiadas += [tarea_id for _, tarea_id in borrados if estado_actual[tarea_id]['recurrencia']]
+
+    tabla = Tarea.__table__
+    try:
+        if creaciones:
+            filas = [{
+                'user_id': current_user.id,
+                'titulo': valores['titulo'],
+                'descripcion': valores.get('descripcion', ''),
+                'fecha': valores.get('fecha'),
+                'importancia': valores.get('importancia'),
+                'asunto': valores.get('asunto', ''),
+                'status': 'incompleta' if valores.get('fecha') else 'inbox',
+                'recurrencia': valores['recurrencia']
+            } for _, valores, _ in creaciones]
+            nuevos_ids = db.session.execute(
+                db.insert(Tarea).returning(Tarea.id, sort_by_parameter_order=True), filas
+            ).scalars().all()
+            despues += filas
+            filas_enlaces, filas_contactos = [], []
+            for (i, _, datos), tarea_id in zip(creaciones, nuevos_ids):
+                filas_enlaces += [_fila_enlace(tarea_id, e) for e in datos.get('enlaces') or []]
+                filas_contactos += [_fila_contacto(tarea_id, c) for c in datos.get('contactos') or []]
+                resultados[i] = {'indice': i, 'ok': True, 'op': 'create', 'id': tarea_id}
+            if filas_enlaces:
+                db.session.execute(db.insert(Enlace), filas_enlaces)
+            if filas_contactos:
+                db.session.execute(db.insert(Contacto), filas_contactos)
+
+        # Agrupar por conjunto de columnas para emitir un UPDATE executemany por grupo
+        grupos = {}
+        for i, tarea_id, valores in actualizaciones:
+            # Misma regla que actualizar_tarea: poner fecha a una tarea del inbox la pasa a incompleta
+            if valores.get('fecha') and valores.get('status', estado_actual[tarea_id]['status']) == 'inbox':
+                valores['status'] = 'incompleta'
+            antes.append(estado_actual[tarea_id])
+            despues.append({**estado_actual[tarea_id], **valores})
+            grupos.setdefault(tuple(sorted(valores)), []).append((tarea_id, valores))
+            resultados[i] = {'indice': i, 'ok': True, 'op': 'update', 'id': tarea_id}
+        for columnas, items in grupos.items():
+            sentencia = (db.update(tabla)
+                         .where(tabla.c.id == db.bindparam('b_id'), tabla.c.user_id == current_user.id)
+                         .values(updated_at=db.func.current_timestamp(),
+                                 **{columna: db.bindparam(f'b_{columna}') for columna in columnas}))
+            db.session.execute(sentencia, [
+                {'b_id': tarea_id, **{f'b_{columna}': valores[columna] for columna in columnas}}
+                for tarea_id, valores in items
+            ])
+
+        if series_cambiadas:
+            db.session.execute(db.delete(ExcepcionTarea).where(ExcepcionTarea.tarea_id.in_(series_cambiadas)))
+
+        if borrados:
+            ids_borrar = [tarea_id for _, tarea_id in borrados]
+            db.session.execute(db.delete(Enlace).where(Enlace.tarea_id.in_(ids_borrar)))
+            db.session.execute(db.delete(Contacto).where(Contacto.tarea_id.in_(ids_borrar)))
+            db.session.execute(db.delete(Tarea).where(Tarea.id.in_(ids_borrar), Tarea.user_id == current_user.id))
+            for i, tarea_id in borrados:
+                resultados[i] = {'indice': i, 'ok': True, 'op': 'delete', 'id': tarea_id}
+                antes.append(estado_actual[tarea_id])
+
+        contadores.registrar(current_user.id, antes=antes, despues=despues)
+        eventos.publicar(current_user.id, 'tarea', 'create', nuevos_ids)
+        eventos.publicar(current_user.id, 'tarea', 'update', [a[1] for a in actualizaciones])
+        eventos.publicar(current_user.id, 'tarea', 'delete', [b[1] for b in borrados])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        # Los datos ya se han validado por operación: el error es de la base de datos y
+        # su texto (con la sentencia y sus parámetros) no se devuelve al cliente
+        current_app.logger.error(f"Error aplicando un lote de tareas del usuario {current_user.id}: {e}")
+        return jsonify({'error': 'No se pudo aplicar el lote; no se ha guardado ninguna operación'}), 500
+    recurrencia.cache_ocurrencias.invalidar(series_cambiadas)
+
+    return jsonify({'success': True, 'resultados': resultados})
+
+# Máximo de días que se pueden pedir de una vez a /api/calendario
+MAX_DIAS_CALENDARIO = 62
+
+@main_bp.route('/api/calendario', methods=['GET'])
+@login_required
+def get_calendario():
+    """Devuelve tareas y recordatorios de un rango de fechas agrupados por día.
+
+    Sustituye a pedir /api/tareas completo más un /api/recordatorios/<fecha>
+    por cada día del mes: son dos consultas por rango en lugar de 32 (más
+    una para las excepciones si hay tareas recurrentes). Las repeticiones
+    de las tareas recurrentes se calculan solo para el rango y llevan
+    'recurrente': true.
+    """
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d').date()
+        hasta = datetime.strptime(request.args.get('hasta', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Parámetros desde/hasta inválidos (YYYY-MM-DD)'}), 400
+    if hasta < desde:
+        return jsonify({'error': 'hasta debe ser mayor o igual que desde'}), 400
+    if (hasta - desde).days >= MAX_DIAS_CALENDARIO:
+        return jsonify({'error': f'El rango no puede superar {MAX_DIAS_CALENDARIO} días'}), 400
+
+    tareas = (Tarea.query
+              .filter(Tarea.user_id == current_user.id,
+                      recurrencia.filtro_rango(desde, hasta))
+              .order_by(Tarea.fecha, Tarea.id)
+              .all())
+    recordatorios = (Recordatorio.query
+                     .filter(Recordatorio.usuario_id == current_user.id,
+                             Recordatorio.fecha >= desde,
+                             Recordatorio.fecha <= hasta)
+                     .order_by(Recordatorio.fecha, Recordatorio.id)
+                     .all())
+
+    dias = {}
+    for tarea in tareas:
+        if tarea.recurrencia:
+            continue
+        dia = dias.setdefault(tarea.fecha.isoformat(), {'tareas': [], 'recordatorios': []})
+        dia['tareas'].append(tarea.to_calendar_dict())
+    for tarea, fecha, status in recurrencia.ocurrencias([t for t in tareas if t.recurrencia], desde, hasta):
+        dia = dias.setdefault(fecha.isoformat(), {'tareas': [], 'recordatorios': []})
+        dia['tareas'].append(recurrencia.como_ocurrencia(tarea.to_calendar_dict(), fecha, status))
+    for recordatorio in recordatorios:
+        dia = dias.setdefault(recordatorio.fecha.isoformat(), {'tareas': [], 'recordatorios': []})
+        dia['recordatorios'].append(recordatorio.to_dict())
+
+    return jsonify({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': dias
+    })
+
+# =============================
+# Stream de cambios (server-sent events, ver app/eventos.py)
+# =============================
+
+@main_bp.route('/api/eventos', methods=['GET'])
+@login_required
+def stream_eventos():
+    """Envía los cambios de tareas y recordatorios del usuario según se confirman.
+
+    Se reanuda desde Last-Event-ID (lo envía el navegador al reconectar) o ?desde=.
+    """
+    desde = request.headers.get('Last-Event-ID') or request.args.get('desde')
+    try:
+        desde = int(desde) if desde else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID / desde debe ser un número de evento'}), 400
+    respuesta = eventos.respuesta_stream(current_user.id, desde)
+    if respuesta is None:
+        return jsonify({'error': 'Demasiadas conexiones de eventos, reintenta más tarde'}), 503, {'Retry-After': '30'}
+    return respuesta
+
+# =============================
+# Exportación e importación de los datos del usuario (ver app/respaldo.py)
+# =============================
+
+def _formato_y_tipo(args):
+    """(formato, tipo) de la query string. Lanza ValueError si no son válidos."""
+    formato = args.get('formato', 'ndjson')
+    tipo = args.get('tipo') or None
+    if formato not in respaldo.FORMATOS:
+        raise ValueError(f'formato debe ser uno de: {", ".join(respaldo.FORMATOS)}')
+    if tipo is not None and tipo not in respaldo.TIPOS:
+        raise ValueError(f'tipo debe ser uno de: {", ".join(respaldo.TIPOS)}')
+    if formato == 'csv' and tipo is None:
+        raise ValueError('el formato csv necesita tipo')
+    return formato, tipo
+
+@main_bp.route('/api/exportar', methods=['GET'])
+@login_required
+def exportar_datos():
+    """Descarga las tareas, recordatorios y presets del usuario como NDJSON o CSV (stream)."""
+    try:
+        formato, tipo = _formato_y_tipo(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    nombre = f"planeador-{tipo or 'completo'}-{date.today().isoformat()}.{formato}"
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(respaldo.exportar(current_user.id, formato, tipo)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"', 'Cache-Control': 'no-store'})
+
+@main_bp.route('/api/importar', methods=['POST'])
+@login_required
+def importar_datos():
+    """Importa un fichero de /api/exportar enviado como cuerpo de la petición.
+
+    Las filas válidas se guardan por lotes aunque otras fallen: la respuesta
+    indica cuántas se importaron de cada tipo y el error de cada línea rechazada.
+    Un cuerpo con Content-Length mayor que IMPORTACION_MAX_BYTES se rechaza sin
+    leerlo; uno enviado por trozos que lo supera responde 413 con el informe de
+    lo ya importado.
+    """
+    try:
+        formato, tipo = _formato_y_tipo(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    config = current_app.config
+    request.max_content_length = config.get('IMPORTACION_MAX_BYTES')
+    try:
+        informe = respaldo.importar(current_user.id, request.stream, formato, tipo,
+                                    tamano_lote=config.get('IMPORTACION_LOTE', 500),
+                                    max_errores=config.get('IMPORTACION_MAX_ERRORES', 100))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Fichero no importable: {e}'}), 400
+    if informe.pop('truncada', False):
+        return jsonify({'success': False, **informe,
+                        'error': f'Importación truncada: el fichero supera {config.get("IMPORTACION_MAX_BYTES")} bytes; '
+                                 'solo se ha importado lo leído hasta el límite'}), 413
+    return jsonify({'success': True, **informe})
+
 # =============================
 # API de Recordatorios (Mantener compatibilidad con calendario existente)
 # =============================
@@ -195,10 +958,15 @@ def actualizar_recordatorio(id):
     if not recordatorio:
         return jsonify({'error': 'No encontrado'}), 404
     data = request.get_json()
-    recordatorio.fecha = data.get('fecha', recordatorio.fecha)
+    if data.get('fecha'):
+        try:
+            recordatorio.fecha = datetime.strptime(data['fecha'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Formato de fecha inválido'}), 400
     recordatorio.titulo = data.get('titulo', recordatorio.titulo)
     recordatorio.descripcion = data.get('descripcion', recordatorio.descripcion)
     recordatorio.importancia = data.get('importancia', recordatorio.importancia)
+    eventos.publicar(current_user.id, 'recordatorio', 'update', [recordatorio.id])
     db.session.commit()
     return jsonify({'success': True})
 # =============================
@@ -206,30 +974,31 @@ def actualizar_recordatorio(id):
 @main_bp.route('/api/recordatorios/<fecha>', methods=['GET'])
 @login_required
 def get_recordatorios(fecha):
-    recordatorios = Recordatorio.query.filter_by(fecha=fecha, usuario_id=current_user.id).all()
-    resultado = [
-        {
-            'id': r.id,
-            'fecha': r.fecha,
-            'titulo': r.titulo,
-            'descripcion': r.descripcion,
-            'importancia': r.importancia
-        } for r in recordatorios
-    ]
-    return jsonify(resultado)
+    try:
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
+    recordatorios = Recordatorio.query.filter_by(fecha=fecha_obj, usuario_id=current_user.id).all()
+    return jsonify([r.to_dict() for r in recordatorios])
 
 @main_bp.route('/api/recordatorios', methods=['POST'])
 @login_required
 def crear_recordatorio():
     data = request.get_json()
+    try:
+        fecha_obj = datetime.strptime(data.get('fecha') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
     nuevo = Recordatorio(
         usuario_id=current_user.id,
-        fecha=data.get('fecha'),
+        fecha=fecha_obj,
         titulo=data.get('titulo'),
         descripcion=data.get('descripcion'),
         importancia=data.get('importancia', 'baja')
     )
     db.session.add(nuevo)
+    db.session.flush()
+    eventos.publicar(current_user.id, 'recordatorio', 'create', [nuevo.id])
     db.session.commit()
     return jsonify({'success': True, 'id': nuevo.id}), 201
 
@@ -240,6 +1009,7 @@ def eliminar_recordatorio(id):
     if not recordatorio:
         return jsonify({'error': 'No encontrado'}), 404
     db.session.delete(recordatorio)
+    eventos.publicar(current_user.id, 'recordatorio', 'delete', [recordatorio.id])
     db.session.commit()
     return jsonify({'success': True})
 
@@ -309,6 +1079,9 @@ def login():
 
         # Verificar usuario y contraseña con los métodos del modelo
         if user and user.check_password(password):
+            if not user.is_active:
+                flash('Esta cuenta ha sido desactivada.', 'danger')
+                return render_template('sesion.html')
             login_user(user, remember=True) # remember=True es una buena práctica
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main.principal'))
@@ -368,6 +1141,9 @@ def google_callback():
     user = User.query.filter_by(email=email).first()
 
     if user:
+        if not user.is_active:
+            flash('Esta cuenta ha sido desactivada.', 'danger')
+            return redirect(url_for('auth.login'))
         if not user.google_id:
             user.google_id = google_id
             db.session.commit()
@@ -542,29 +1318,102 @@ def delete_pomodoro_preset(preset_id):
     db.session.commit()
     return jsonify({'success': True})
 
+
+# API: Historial del Pomodoro (ver app/pomodoro.py)
+@main_bp.route('/api/pomodoro/sesiones', methods=['POST'])
+@login_required
+def registrar_sesiones_pomodoro():
+    """Recibe un lote de eventos de intervalos del Pomodoro.
+
+    Los válidos se aceptan (202) y se guardan por lotes en segundo plano; los
+    inválidos se devuelven con su posición en `errores` y el cliente no debe
+    reenviarlos.
+    """
+    data = request.get_json(silent=True) or {}
+    recibidos = data.get('eventos')
+    if not isinstance(recibidos, list) or not recibidos:
+        return jsonify({'error': 'eventos debe ser una lista no vacía'}), 400
+    if len(recibidos) > pomodoro.MAX_EVENTOS_LOTE:
+        return jsonify({'error': f'Máximo {pomodoro.MAX_EVENTOS_LOTE} eventos por lote'}), 400
+
+    filas, errores = [], []
+    ahora = datetime.utcnow()
+    for indice, datos in enumerate(recibidos):
+        try:
+            filas.append(pomodoro.validar_evento(datos, ahora))
+        except ValueError as e:
+            errores.append({'indice': indice, 'error': str(e)})
+    try:
+        if filas:
+            pomodoro.filtrar_referencias(current_user.id, filas)
+            for fila in filas:
+                fila['user_id'] = current_user.id
+            pomodoro.buffer_sesiones.agregar(filas)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'registrar_sesiones_pomodoro error: {str(e)}'}), 500
+    return jsonify({'aceptados': len(filas), 'errores': errores}), 202
+
+@main_bp.route('/api/pomodoro/resumen', methods=['GET'])
+@login_required
+def resumen_pomodoro():
+    """Tiempo de concentración por día o semana (?periodo=dia|semana&desde=&hasta=).
+
+    Solo aparecen los días o semanas con actividad; por defecto, los últimos
+    30 días o las últimas 12 semanas hasta hoy.
+    """
+    periodo = request.args.get('periodo', 'dia')
+    if periodo not in pomodoro.PERIODOS:
+        return jsonify({'error': f'periodo debe ser uno de: {", ".join(pomodoro.PERIODOS)}'}), 400
+    try:
+        desde, hasta = _rango_fechas(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    hasta = hasta or date.today()
+    if desde is None:
+        desde = hasta - timedelta(days=29) if periodo == 'dia' else hasta - timedelta(weeks=11)
+    if periodo == 'semana':
+        desde = pomodoro.inicio_semana(desde)
+    if desde > hasta or (hasta - desde).days >= pomodoro.MAX_DIAS_RESUMEN:
+        return jsonify({'error': f'el rango desde/hasta debe ser de 1 a {pomodoro.MAX_DIAS_RESUMEN} días'}), 400
+    # Lo recibido por este proceso y aún no escrito también cuenta
+    pomodoro.buffer_sesiones.vaciar()
+    filas = pomodoro.resumen(current_user.id, periodo, desde, hasta)
+    return jsonify({
+        'periodo': periodo,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'resumen': filas,
+        'total': {campo: sum(fila[campo] for fila in filas)
+                  for campo in ('segundos_foco', 'completados', 'abortados')}
+    })
+
 @main_bp.route('/upload_profile_photo', methods=['POST'])
 @login_required
 def upload_profile_photo():
-    import uuid
-    from werkzeug.utils import secure_filename
     foto = request.files.get('foto')
     if not foto:
         flash('No se seleccionó ninguna imagen.', 'warning')
         return redirect(url_for('main.profile'))
     ext = foto.filename.rsplit('.', 1)[-1].lower()
-    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+    if ext not in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
         flash('Formato de imagen no permitido.', 'danger')
         return redirect(url_for('main.profile'))
-    filename = f"{current_user.id}_{uuid.uuid4().hex}.{ext}"
-    path = os.path.join(current_app.static_folder, 'images', 'profiles')
-    os.makedirs(path, exist_ok=True)
-    file_path = os.path.join(path, filename)
-    foto.save(file_path)
-    # Actualizar usuario (requiere campo en modelo)
-    current_user.profile_image = f"images/profiles/{filename}"
-    db.session.commit()
-    flash('Foto de perfil actualizada.', 'success')
+    datos = foto.read(current_app.config['AVATAR_MAX_BYTES'] + 1)
+    if len(datos) > current_app.config['AVATAR_MAX_BYTES']:
+        flash('La imagen es demasiado grande.', 'danger')
+        return redirect(url_for('main.profile'))
+    try:
+        avatares.validar_imagen(datos)
+    except ValueError:
+        flash('El archivo no es una imagen válida.', 'danger')
+        return redirect(url_for('main.profile'))
+    # El recorte, el redimensionado y la sustitución de la foto anterior se hacen
+    # en segundo plano (app/avatares.py); la nueva foto aparece en unos segundos.
+    avatares.encolar(current_user.id, datos)
+    flash('Foto de perfil recibida. Se actualizará en unos segundos.', 'success')
     return redirect(url_for('main.profile'))
+
 @main_bp.route('/update_password', methods=['POST'])
 @login_required
 def update_password():
@@ -581,6 +1430,7 @@ def update_password():
         return redirect(url_for('main.profile'))
     current_user.set_password(nueva_contrasena)
     db.session.commit()
+    invalidar_usuario(current_user.id)
     flash('Contraseña actualizada correctamente.', 'success')
     return redirect(url_for('main.profile'))
 
@@ -593,6 +1443,7 @@ def update_name():
         return redirect(url_for('main.profile'))
     current_user.name = nuevo_nombre
     db.session.commit()
+    invalidar_usuario(current_user.id)
     flash('Nombre actualizado correctamente.', 'success')
     return redirect(url_for('main.profile'))
 
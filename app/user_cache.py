@@ -0,0 +1,118 @@
+# app/user_cache.py - Caché de usuarios para el user_loader de Flask-Login
+"""
+Flask-Login llama a load_user en cada petición autenticada, incluidas todas
+las llamadas a /api/*. Esta caché por proceso guarda una copia de las
+columnas del usuario durante USER_CACHE_TTL segundos (LRU de como máximo
+USER_CACHE_MAXSIZE entradas) y reconstruye la instancia sin consultar la base
+de datos.
+
+La instancia devuelta se adjunta a la sesión actual con merge(load=False),
+así que las rutas pueden modificar current_user y hacer commit como siempre.
+
+Las rutas que cambian un usuario llaman a invalidar(user_id). La caché es
+por proceso: en otros workers el cambio se ve, como mucho, al expirar el TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class CacheUsuarios:
+    """LRU con TTL, segura entre hilos, con contadores de aciertos y fallos."""
+
+    def __init__(self, maxsize=1024, ttl=60, enabled=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('USER_CACHE_ENABLED', True)
+        self.maxsize = app.config.get('USER_CACHE_MAXSIZE', 1024)
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.limpiar()
+
+    def obtener(self, user_id):
+        """Columnas cacheadas del usuario, o None si no están o han caducado."""
+        with self._lock:
+            entrada = self._datos.get(user_id)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[user_id]
+                self.misses += 1
+                return None
+            self._datos.move_to_end(user_id)
+            self.hits += 1
+            return entrada[1]
+
+    def guardar(self, user_id, columnas):
+        with self._lock:
+            self._datos[user_id] = (time.monotonic() + self.ttl, columnas)
+            self._datos.move_to_end(user_id)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            if self._datos.pop(user_id, None) is not None:
+                self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entradas': len(self._datos),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidaciones': self.invalidaciones,
+                'ratio_aciertos': round(self.hits / total, 4) if total else None,
+            }
+
+
+cache_usuarios = CacheUsuarios()
+
+
+def cargar_usuario(user_id):
+    """Implementación del user_loader: usa la caché si está activada."""
+    from app import db
+    from app.models import User
+
+    if not cache_usuarios.enabled:
+        user = db.session.get(User, user_id)
+        return user if user is not None and user.is_active else None
+
+    columnas = cache_usuarios.obtener(user_id)
+    if columnas is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        cache_usuarios.guardar(user_id, {
+            attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs
+        })
+        return user if user.is_active else None
+
+    # Las cuentas desactivadas pierden la sesión aunque tengan la cookie
+    if columnas.get('disabled_at') is not None:
+        return None
+
+    # Reconstruir la instancia como si viniera de la base de datos, sin emitir SQL
+    user = User(**columnas)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidar(user_id):
+    cache_usuarios.invalidar(user_id)
@@ -43,9 +43,116 @@ class Config:
     DB_PORT = os.environ.get('DB_PORT', '5432')
 
     # --- Configuración de SQLAlchemy ---
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    SQLALCHEMY_DATABASE_URI = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?client_encoding=utf8"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- Pool de conexiones ---
+    # Un único pool, el del engine de SQLAlchemy, sirve tanto al ORM como a las
+    # consultas SQL directas de app/database.py (panel de administración).
+    # DB_POOL_SIZE: conexiones que se mantienen abiertas por proceso.
+    # DB_MAX_OVERFLOW: conexiones extra permitidas en picos (se cierran al devolverse).
+    # DB_POOL_TIMEOUT: segundos de espera por una conexión libre antes de fallar.
+    # DB_POOL_RECYCLE: segundos tras los que una conexión se reabre (evita cortes por inactividad).
+    # DB_POOL_PRE_PING: comprueba la conexión con un ping antes de prestarla.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+    # --- Caché de usuarios de Flask-Login ---
+    # Evita consultar la tabla users en cada petición autenticada. Es por proceso:
+    # USER_CACHE_TTL (segundos) acota cuánto tarda otro worker en ver un cambio de rol.
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    USER_CACHE_MAXSIZE = int(os.environ.get('USER_CACHE_MAXSIZE', '1024'))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+
+    # --- Purga de cuentas eliminadas desde el panel de administración ---
+    # Filas borradas por transacción. Con PURGA_EN_SEGUNDO_PLANO=false los trabajos
+    # solo se procesan con `flask purgar-usuarios` (p. ej. desde cron).
+    PURGA_TAMANO_LOTE = int(os.environ.get('PURGA_TAMANO_LOTE', '500'))
+    PURGA_EN_SEGUNDO_PLANO = os.environ.get('PURGA_EN_SEGUNDO_PLANO', 'true').lower() in ('1', 'true', 'yes')
+    # Segundos entre la desactivación y el primer borrado: otros workers pueden seguir
+    # sirviendo al usuario desde su caché (USER_CACHE_TTL) y escribir tareas mientras tanto.
+    PURGA_ESPERA_SEGUNDOS = int(os.environ.get('PURGA_ESPERA_SEGUNDOS', str(USER_CACHE_TTL + 10)))
+    # Segundos sin avanzar tras los que un trabajo 'en_curso' se da por abandonado (su worker
+    # murió sin pararlo, p. ej. con SIGKILL) y vuelve a la cola. Cada lote confirmado lo renueva.
+    PURGA_CADUCIDAD_EN_CURSO = int(os.environ.get('PURGA_CADUCIDAD_EN_CURSO', '600'))
+
+    # --- Fotos de perfil (app/avatares.py) ---
+    # Tamaños en píxeles de las variantes WebP: 80 y 192 cubren a 2x los avatares de 40 y 96 px
+    AVATAR_TAMANOS = (80, 192)
+    AVATAR_CALIDAD = 80
+    AVATAR_MAX_BYTES = 10 * 1024 * 1024
+
+    # --- Bundles de CSS/JS (app/assets.py) ---
+    # 'auto': usar static/dist/manifest.json si existe y la app no está en modo debug.
+    ASSETS_USAR_MANIFEST = {'true': True, 'false': False}.get(
+        os.environ.get('ASSETS_USAR_MANIFEST', 'auto').lower(), 'auto')
+
+    # --- Compresión de respuestas (app/compresion.py) ---
+    COMPRESION_ACTIVADA = os.environ.get('COMPRESION_ACTIVADA', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', '1024'))
+    COMPRESION_NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', '6'))
+    # Calidad 4-5 de brotli comprime más que gzip -6 con un coste de CPU parecido
+    COMPRESION_NIVEL_BROTLI = int(os.environ.get('COMPRESION_NIVEL_BROTLI', '4'))
+    COMPRESION_TIPOS = ('application/json', 'text/html', 'text/css', 'text/javascript',
+                        'application/javascript', 'text/plain', 'image/svg+xml')
+
+    # --- Métricas por petición (app/metricas.py, /admin/metrics) ---
+    # METRICAS_TOKEN: si se define, /admin/metrics acepta también
+    # 'Authorization: Bearer <token>' para que Prometheus pueda leerlo sin sesión.
+    METRICAS_ACTIVADAS = os.environ.get('METRICAS_ACTIVADAS', 'true').lower() in ('1', 'true', 'yes')
+    METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+
+    # --- Detector de N+1 y consultas lentas (app/detector_sql.py), para desarrollo y pruebas ---
+    # DETECTOR_SQL_REPETICIONES: ejecuciones de la misma sentencia en una petición que se consideran N+1.
+    # DETECTOR_SQL_MAX_SENTENCIAS: presupuesto de sentencias por petición (vacío = sin límite).
+    # DETECTOR_SQL_ESTRICTO: convertir los avisos en error (falla la prueba que hizo la petición).
+    DETECTOR_SQL_ACTIVADO = os.environ.get('DETECTOR_SQL_ACTIVADO', 'false').lower() in ('1', 'true', 'yes')
+    DETECTOR_SQL_REPETICIONES = int(os.environ.get('DETECTOR_SQL_REPETICIONES', '5'))
+    DETECTOR_SQL_LENTA_MS = float(os.environ.get('DETECTOR_SQL_LENTA_MS', '100'))
+    DETECTOR_SQL_MAX_SENTENCIAS = (int(os.environ['DETECTOR_SQL_MAX_SENTENCIAS'])
+                                   if os.environ.get('DETECTOR_SQL_MAX_SENTENCIAS') else None)
+    DETECTOR_SQL_ESTRICTO = os.environ.get('DETECTOR_SQL_ESTRICTO', 'false').lower() in ('1', 'true', 'yes')
+
+    # --- Stream de cambios /api/eventos (app/eventos.py) ---
+    # EVENTOS_MAX_CONEXIONES: streams abiertos a la vez por proceso; cada uno ocupa un hilo
+    # del worker (ver GUNICORN_THREADS). EVENTOS_LATIDO: segundos entre comentarios de
+    # keep-alive. EVENTOS_DURACION_MAXIMA: segundos tras los que se cierra el stream y el
+    # navegador reconecta. EVENTOS_INTERVALO_SONDEO: solo sin PostgreSQL (sin LISTEN/NOTIFY).
+    EVENTOS_MAX_CONEXIONES = int(os.environ.get('EVENTOS_MAX_CONEXIONES', '20'))
+    EVENTOS_LATIDO = int(os.environ.get('EVENTOS_LATIDO', '15'))
+    EVENTOS_DURACION_MAXIMA = int(os.environ.get('EVENTOS_DURACION_MAXIMA', '300'))
+    EVENTOS_REINTENTO_MS = int(os.environ.get('EVENTOS_REINTENTO_MS', '3000'))
+    EVENTOS_RETENCION_HORAS = float(os.environ.get('EVENTOS_RETENCION_HORAS', '24'))
+    EVENTOS_INTERVALO_SONDEO = float(os.environ.get('EVENTOS_INTERVALO_SONDEO', '1'))
+
+    # --- Tareas recurrentes (app/recurrencia.py) ---
+    # RECURRENCIA_CACHE_MAXSIZE: expansiones (tarea, rango) guardadas por proceso.
+    RECURRENCIA_CACHE_MAXSIZE = int(os.environ.get('RECURRENCIA_CACHE_MAXSIZE', '4096'))
+
+    # --- Exportación e importación (app/respaldo.py) ---
+    # IMPORTACION_LOTE: registros por transacción. IMPORTACION_MAX_ERRORES: errores por
+    # línea incluidos en la respuesta (el total se cuenta siempre).
+    IMPORTACION_LOTE = int(os.environ.get('IMPORTACION_LOTE', '500'))
+    IMPORTACION_MAX_ERRORES = int(os.environ.get('IMPORTACION_MAX_ERRORES', '100'))
+    IMPORTACION_MAX_BYTES = int(os.environ.get('IMPORTACION_MAX_BYTES', str(50 * 1024 * 1024)))
+
+    # --- Historial del Pomodoro (app/pomodoro.py) ---
+    # Los eventos recibidos se guardan por lotes: al juntar POMODORO_BUFFER_MAX o cada
+    # POMODORO_BUFFER_SEGUNDOS (0 = escribir en la misma petición, sin buffer).
+    POMODORO_BUFFER_MAX = int(os.environ.get('POMODORO_BUFFER_MAX', '200'))
+    POMODORO_BUFFER_SEGUNDOS = float(os.environ.get('POMODORO_BUFFER_SEGUNDOS', '5'))
+
     # LOGIN_VIEW: La ruta a la que se redirigirá a los usuarios si intentan acceder
     # a una página protegida sin haber iniciado sesión. 'auth.login' se refiere
     # al blueprint 'auth' y la ruta 'login'.
@@ -58,3 +165,26 @@ class Config:
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
     GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+
+
+class ProductionConfig(Config):
+    """
+    Configuración para servir con Gunicorn (wsgi.py + gunicorn.conf.py).
+    Sin modo debug ni herramientas de desarrollo, y con cookies seguras.
+    """
+
+    DEBUG = False
+    TESTING = False
+    DETECTOR_SQL_ACTIVADO = False
+
+    # Las cookies de sesión solo viajan por HTTPS (SESSION_COOKIE_SECURE=false para probar sin TLS)
+    SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'true').lower() in ('1', 'true', 'yes')
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    REMEMBER_COOKIE_SECURE = SESSION_COOKIE_SECURE
+    REMEMBER_COOKIE_HTTPONLY = True
+    PREFERRED_URL_SCHEME = 'https'
+
+    # PROXIES_CONFIABLES: número de proxies inversos (nginx, balanceador) delante de
+    # Gunicorn cuyas cabeceras X-Forwarded-* se aceptan. 0 si Gunicorn está expuesto.
+    PROXIES_CONFIABLES = int(os.environ.get('PROXIES_CONFIABLES', '1'))
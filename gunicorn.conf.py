@@ -0,0 +1,101 @@
+# gunicorn.conf.py - Configuración de Gunicorn para producción
+"""
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- La aplicación se importa una vez en el proceso maestro (preload_app) y se
+  comparte con los workers por copy-on-write; create_app() no abre
+  conexiones, y cada worker descarta tras el fork el pool heredado.
+- GUNICORN_WORKERS procesos con GUNICORN_THREADS hilos cada uno (gthread).
+  Cada stream abierto de /api/eventos ocupa un hilo: por defecto hay 4 hilos
+  más uno por cada stream admitido (EVENTOS_MAX_CONEXIONES).
+- Cada worker se recicla tras GUNICORN_MAX_REQUESTS peticiones (más un
+  margen aleatorio para que no se reinicien todos a la vez), lo que acota
+  las fugas de memoria.
+
+Señales al proceso maestro:
+    HUP    recarga la configuración y sustituye los workers de forma ordenada
+           (con preload_app el código no se recarga: para desplegar código
+           nuevo, reiniciar el servicio o usar USR2 + QUIT sobre el maestro antiguo)
+    TERM   parada ordenada: los workers terminan las peticiones en curso
+           durante GUNICORN_GRACEFUL_TIMEOUT segundos
+    TTIN/TTOU  añade/quita un worker
+"""
+import multiprocessing
+import os
+import signal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _entero(nombre, defecto):
+    valor = os.environ.get(nombre)
+    return int(valor) if valor else defecto
+
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = _entero('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+threads = _entero('GUNICORN_THREADS', 4 + _entero('EVENTOS_MAX_CONEXIONES', 20))
+worker_class = 'gthread'
+preload_app = True
+
+max_requests = _entero('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _entero('GUNICORN_MAX_REQUESTS_JITTER', 200)
+timeout = _entero('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _entero('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _entero('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+proc_name = 'planeador-escolar'
+
+
+def post_fork(server, worker):
+    """Cada worker abre sus propias conexiones: nunca se comparten sockets con el maestro."""
+    from app import db
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Con TERM, cierra también los streams de /api/eventos.
+
+    Si no, la parada ordenada esperaría a que terminaran (EVENTOS_DURACION_MAXIMA)
+    y Gunicorn los cortaría al agotar GUNICORN_GRACEFUL_TIMEOUT.
+
+    Además retoma las purgas de cuentas que dejaron workers ya reciclados.
+    """
+    from app import eventos, purga
+    from wsgi import app
+
+    purga.revisar_al_arrancar(app)
+
+    salir = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        salir(sig, frame)
+        eventos.repartidor.detener()
+
+    signal.signal(signal.SIGTERM, handle_exit)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    """Al reciclar o parar un worker, deja en un punto seguro los hilos en segundo plano.
+
+    La purga de usuarios se detiene tras el lote en curso y su trabajo vuelve a
+    'pendiente' (lo retoma el worker que lo sustituye, ver post_worker_init);
+    las fotos de perfil ya encoladas se terminan de procesar y los eventos del
+    Pomodoro pendientes se escriben.
+    """
+    from app import avatares, eventos, purga
+    from app.pomodoro import buffer_sesiones
+
+    eventos.repartidor.detener()
+    purga.detener_worker(espera=graceful_timeout / 2)
+    avatares.detener()
+    buffer_sesiones.detener()
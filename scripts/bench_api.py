@@ -0,0 +1,620 @@
+# scripts/bench_api.py - Prueba de carga reproducible de la API y las páginas
+"""
+Crea la aplicación con create_app() contra una base de datos local, aplica
+las migraciones, genera datos realistas y lanza peticiones HTTP concurrentes
+contra un servidor werkzeug multihilo levantado en el propio proceso:
+
+- --usuarios usuarios, cada uno con --tareas tareas (con 0-3 enlaces y 0-2
+  contactos), --recordatorios recordatorios y un preset de pomodoro.
+- --concurrencia usuarios virtuales, cada uno con su sesión y su conexión
+  keep-alive, eligen al azar (con pesos, ver ESCENARIOS) entre todos los
+  endpoints /api/*, las páginas principales y las del panel de administración.
+- Los primeros --calentamiento segundos no se miden.
+
+Por endpoint informa de peticiones por segundo, latencia p50/p95/p99 (tiempo
+de respuesta completo visto por el cliente), bytes enviados y sentencias SQL
+por petición (contadas en el servidor). El resultado se guarda en JSON
+(--salida) y --comparar muestra la diferencia con una ejecución anterior.
+
+La semilla (--semilla) fija los datos y la secuencia de peticiones de cada
+usuario virtual; el reparto entre hilos depende del planificador, así que
+conviene comparar ejecuciones con los mismos parámetros y en la misma máquina.
+
+Uso:
+    python scripts/bench_api.py [--usuarios 20] [--tareas 200] [--concurrencia 8]
+                                [--duracion 20] [--calentamiento 3]
+                                [--db-url postgresql+psycopg2://.../planeador_bench [--recrear]]
+                                [--salida bench-results/api.json] [--comparar anterior.json]
+
+Por defecto usa una base de datos SQLite temporal. Con --db-url se puede usar
+un PostgreSQL local desechable: el script se niega a tocarlo si ya tiene
+usuarios, salvo con --recrear (que revierte todas las migraciones y lo vacía).
+"""
+import argparse
+import gzip
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from flask import g, has_app_context  # noqa: E402
+from sqlalchemy import event, inspect  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import create_app, db, contadores, migrations  # noqa: E402
+from app.models import User, Tarea, Enlace, Contacto, Recordatorio, PomodoroPreset  # noqa: E402
+from config import Config  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FORMATO_RESULTADOS = 1
+CONTRASENA = 'bench123'
+ASUNTOS = ['Matemáticas', 'Lengua', 'Historia', 'Biología', 'Inglés', 'Física', 'Química']
+TEMAS = ['ecuaciones', 'redacción', 'revolución', 'célula', 'vocabulario', 'fuerzas', 'reacciones',
+         'fracciones', 'poesía', 'imperio', 'genética', 'gramática', 'energía', 'enlaces']
+IMPORTANCIAS = ['baja', 'media', 'alta']
+
+
+# =============================================================================
+# Aplicación y datos
+# =============================================================================
+
+def crear_app(db_url, concurrencia):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = db_url
+        SECRET_KEY = 'bench'
+        DEBUG = False
+        PURGA_EN_SEGUNDO_PLANO = False
+        # Una conexión por hilo del servidor sin esperar al pool
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            **Config.SQLALCHEMY_ENGINE_OPTIONS,
+            'pool_size': concurrencia + 2,
+            'max_overflow': concurrencia,
+            **({'connect_args': {'timeout': 30}} if db_url.startswith('sqlite') else {}),
+        }
+
+    return create_app(BenchConfig)
+
+
+def preparar_esquema(app, recrear):
+    with app.app_context():
+        engine = db.engine
+        if inspect(engine).has_table('users') and db.session.query(User.id).first() is not None:
+            if not recrear:
+                sys.exit('La base de datos ya tiene usuarios: usa una desechable o añade --recrear.')
+            migrations.downgrade(engine, hasta='0000')
+            db.drop_all()
+        migrations.upgrade(engine)
+
+
+def sembrar(app, num_usuarios, num_tareas, num_recordatorios, semilla):
+    """Crea los usuarios y sus datos. Devuelve la información que necesitan los usuarios virtuales."""
+    aleatorio = random.Random(semilla)
+    hoy = date.today()
+    hash_contrasena = generate_password_hash(CONTRASENA)
+    usuarios = []
+    with app.app_context():
+        for n in range(num_usuarios):
+            # Administradores para poder medir también las páginas de /admin
+            user = User(name=f'Bench {n:04d}', email=f'bench{n:04d}@example.com',
+                        password_hash=hash_contrasena, is_admin=True)
+            db.session.add(user)
+            db.session.flush()
+
+            filas = []
+            for i in range(num_tareas):
+                asunto = aleatorio.choice(ASUNTOS)
+                tema = aleatorio.choice(TEMAS)
+                fecha = hoy + timedelta(days=aleatorio.randint(-20, 40)) if aleatorio.random() < 0.85 else None
+                filas.append({
+                    'user_id': user.id,
+                    'titulo': f'{asunto}: {tema} {i}',
+                    'descripcion': f'Repasar {tema} del tema {i % 12 + 1} de {asunto} y preparar los ejercicios.',
+                    'fecha': fecha,
+                    'importancia': aleatorio.choice(IMPORTANCIAS),
+                    'asunto': asunto,
+                    'status': aleatorio.choice(['incompleta', 'incompleta', 'completa']) if fecha else 'inbox',
+                })
+            ids = db.session.execute(
+                db.insert(Tarea).returning(Tarea.id, sort_by_parameter_order=True), filas).scalars().all() if filas else []
+            enlaces, contactos = [], []
+            for tarea_id in ids:
+                enlaces += [{'tarea_id': tarea_id, 'url': f'https://classroom.example.com/t/{tarea_id}/{j}',
+                             'titulo': f'Material {j + 1}'} for j in range(aleatorio.randint(0, 3))]
+                contactos += [{'tarea_id': tarea_id, 'nombre': f'Compañero {j + 1}',
+                               'email': f'companero{j + 1}@example.com', 'telefono': '600000000'}
+                              for j in range(aleatorio.randint(0, 2))]
+            if enlaces:
+                db.session.execute(db.insert(Enlace), enlaces)
+            if contactos:
+                db.session.execute(db.insert(Contacto), contactos)
+
+            recordatorios = [{'usuario_id': user.id, 'fecha': hoy + timedelta(days=aleatorio.randint(-10, 30)),
+                              'titulo': f'Recordatorio {i}', 'descripcion': 'Llevar el material',
+                              'importancia': aleatorio.choice(IMPORTANCIAS)} for i in range(num_recordatorios)]
+            ids_recordatorios = db.session.execute(
+                db.insert(Recordatorio).returning(Recordatorio.id, sort_by_parameter_order=True),
+                recordatorios).scalars().all() if recordatorios else []
+            preset = PomodoroPreset(user_id=user.id, name='Estudio', music=json.dumps(
+                [{'title': 'Lo-fi', 'url': 'https://music.example.com/lofi'}]))
+            db.session.add(preset)
+            db.session.flush()
+
+            usuarios.append({
+                'email': user.email,
+                'tareas': list(ids),
+                'fechas': sorted({f['fecha'].isoformat() for f in filas if f['fecha']}) or [hoy.isoformat()],
+                'recordatorios': list(ids_recordatorios),
+                'preset': preset.id,
+            })
+            db.session.commit()
+        # Las altas masivas no pasan por las rutas: construir los contadores desde las tareas
+        contadores.verificar(reparar=True)
+    return usuarios
+
+
+def instrumentar(app):
+    """Cuenta las sentencias SQL de cada petición y las devuelve en X-Bench-SQL."""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _contar(conn, cursor, sentencia, parametros, contexto, executemany):
+        if has_app_context():
+            g.bench_sql = g.get('bench_sql', 0) + 1
+
+    @app.after_request
+    def _cabecera(response):
+        response.headers['X-Bench-SQL'] = str(g.get('bench_sql', 0))
+        return response
+
+
+# =============================================================================
+# Cliente HTTP
+# =============================================================================
+
+Respuesta = namedtuple('Respuesta', ['status', 'cabeceras', 'datos', 'ms'])
+
+
+class Cliente:
+    """Conexión keep-alive con sus cookies de sesión."""
+
+    def __init__(self, puerto, accept_encoding):
+        self.puerto = puerto
+        self.accept_encoding = accept_encoding
+        self.cookies = {}
+        self.conexion = None
+
+    def pedir(self, metodo, ruta, cuerpo=None, cabeceras=None, formulario=None):
+        enviar = {'Accept-Encoding': self.accept_encoding, **(cabeceras or {})}
+        if self.cookies:
+            enviar['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode('utf-8')
+            enviar['Content-Type'] = 'application/json'
+        elif formulario is not None:
+            datos = urlencode(formulario).encode('utf-8')
+            enviar['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        t0 = time.perf_counter()
+        try:
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=60)
+            self.conexion.request(metodo, ruta, body=datos, headers=enviar)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+        except (http.client.HTTPException, OSError):
+            self.conexion = None
+            return Respuesta(0, {}, b'', (time.perf_counter() - t0) * 1000)
+        ms = (time.perf_counter() - t0) * 1000
+        for valor in respuesta.headers.get_all('Set-Cookie') or []:
+            nombre, resto = valor.split('=', 1)
+            self.cookies[nombre] = resto.split(';', 1)[0]
+        return Respuesta(respuesta.status, respuesta.headers, contenido, ms)
+
+
+def json_respuesta(respuesta):
+    datos = respuesta.datos
+    codificacion = respuesta.cabeceras.get('Content-Encoding') if respuesta.status else None
+    if codificacion == 'gzip':
+        datos = gzip.decompress(datos)
+    elif codificacion == 'br' and brotli is not None:
+        datos = brotli.decompress(datos)
+    try:
+        return json.loads(datos)
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# Escenarios
+# =============================================================================
+
+# generar(vu) devuelve una Peticion o None si el escenario no aplica ahora
+# (p. ej. borrar cuando el usuario virtual aún no ha creado nada)
+Peticion = namedtuple('Peticion', ['metodo', 'ruta', 'cuerpo', 'cabeceras', 'tras'], defaults=(None, None, None))
+Escenario = namedtuple('Escenario', ['endpoint', 'peso', 'generar'])
+
+
+class UsuarioVirtual:
+    def __init__(self, datos, cliente, aleatorio):
+        self.datos = datos
+        self.cliente = cliente
+        self.aleatorio = aleatorio
+        self.etag = None
+        self.marca = None  # X-Sincronizado-Hasta para updated_since
+        self.creadas = {'tarea': [], 'recordatorio': [], 'preset': []}
+
+    def tarea(self):
+        return self.aleatorio.choice(self.datos['tareas'])
+
+    def fecha(self):
+        return self.aleatorio.choice(self.datos['fechas'])
+
+    def apuntar(self, tipo, clave='id'):
+        def tras(respuesta):
+            datos = json_respuesta(respuesta) if respuesta.status == 201 else None
+            if datos and datos.get(clave):
+                self.creadas[tipo].append(datos[clave])
+        return tras
+
+    def sacar(self, tipo):
+        return self.creadas[tipo].pop() if self.creadas[tipo] else None
+
+
+def _get(ruta):
+    return lambda vu: Peticion('GET', ruta)
+
+
+def _tareas_condicional(vu):
+    def tras(respuesta):
+        if respuesta.status == 200:
+            vu.etag = respuesta.cabeceras.get('ETag')
+    return Peticion('GET', '/api/tareas', cabeceras={'If-None-Match': vu.etag} if vu.etag else None, tras=tras)
+
+
+def _tareas_sincronizar(vu):
+    def tras(respuesta):
+        datos = json_respuesta(respuesta) if respuesta.status == 200 else None
+        if datos:
+            vu.marca = datos['sincronizado_hasta']
+        elif respuesta.status == 410:
+            vu.marca = None
+    # Sin marca todavía: desde 0, los cambios de todos los eventos conservados
+    return Peticion('GET', f'/api/tareas?updated_since={vu.marca or 0}', tras=tras)
+
+
+def _calendario(vu):
+    desde = date.fromisoformat(vu.fecha()).replace(day=1)
+    hasta = desde + timedelta(days=41)
+    return Peticion('GET', f'/api/calendario?desde={desde.isoformat()}&hasta={hasta.isoformat()}')
+
+
+def _tareas_crear(vu):
+    return Peticion('POST', '/api/tareas', {
+        'titulo': f'Nueva tarea de {vu.aleatorio.choice(TEMAS)}', 'descripcion': 'Creada por el benchmark',
+        'asunto': vu.aleatorio.choice(ASUNTOS), 'importancia': vu.aleatorio.choice(IMPORTANCIAS),
+        'fecha': vu.fecha(), 'enlaces': [{'url': 'https://example.com/material', 'titulo': 'Material'}],
+    }, tras=vu.apuntar('tarea'))
+
+
+def _tareas_actualizar(vu):
+    return Peticion('PUT', f'/api/tareas/{vu.tarea()}', {
+        'status': vu.aleatorio.choice(['incompleta', 'completa']), 'importancia': vu.aleatorio.choice(IMPORTANCIAS)})
+
+
+def _tareas_eliminar(vu):
+    tarea_id = vu.sacar('tarea')
+    return Peticion('DELETE', f'/api/tareas/{tarea_id}') if tarea_id else None
+
+
+def _tareas_batch(vu):
+    ids = vu.aleatorio.sample(vu.datos['tareas'], min(10, len(vu.datos['tareas'])))
+    return Peticion('POST', '/api/tareas/batch', {'operaciones': [
+        {'op': 'update', 'id': tarea_id, 'datos': {'status': vu.aleatorio.choice(['incompleta', 'completa'])}}
+        for tarea_id in ids]})
+
+
+def _recordatorios_crear(vu):
+    return Peticion('POST', '/api/recordatorios', {
+        'fecha': vu.fecha(), 'titulo': 'Recordatorio del benchmark', 'importancia': 'media'},
+        tras=vu.apuntar('recordatorio'))
+
+
+def _recordatorios_actualizar(vu):
+    if not vu.datos['recordatorios']:
+        return None
+    return Peticion('PUT', f"/api/recordatorios/{vu.aleatorio.choice(vu.datos['recordatorios'])}",
+                    {'descripcion': f'Revisado {vu.aleatorio.randint(1, 1000)}'})
+
+
+def _recordatorios_eliminar(vu):
+    recordatorio_id = vu.sacar('recordatorio')
+    return Peticion('DELETE', f'/api/recordatorios/{recordatorio_id}') if recordatorio_id else None
+
+
+def _presets_crear(vu):
+    # Máximo 3 presets por usuario: uno sembrado y como mucho uno creado aquí
+    if vu.creadas['preset']:
+        return None
+    return Peticion('POST', '/api/pomodoro/presets', {'name': 'Examen', 'work': 50, 'short': 10, 'long': 20},
+                    tras=vu.apuntar('preset'))
+
+
+def _presets_eliminar(vu):
+    preset_id = vu.sacar('preset')
+    return Peticion('DELETE', f'/api/pomodoro/presets/{preset_id}') if preset_id else None
+
+
+ESCENARIOS = {
+    # Páginas
+    'pagina_principal': Escenario('GET /', 4, _get('/')),
+    'pagina_calendario': Escenario('GET /calendario', 2, _get('/calendario')),
+    'pagina_pomodoro': Escenario('GET /pomodoro', 1, _get('/pomodoro')),
+    'pagina_perfil': Escenario('GET /profile', 1, _get('/profile')),
+    'admin_usuarios': Escenario('GET /admin/users', 1, _get('/admin/users')),
+    'admin_purgas': Escenario('GET /admin/purgas', 1, _get('/admin/purgas')),
+    # Tareas
+    'tareas_listar': Escenario('GET /api/tareas', 8, _get('/api/tareas')),
+    'tareas_paginar': Escenario('GET /api/tareas?limit=50', 4, _get('/api/tareas?limit=50')),
+    'tareas_condicional': Escenario('GET /api/tareas (If-None-Match)', 6, _tareas_condicional),
+    'tareas_sincronizar': Escenario('GET /api/tareas?updated_since', 6, _tareas_sincronizar),
+    'tareas_fecha': Escenario('GET /api/tareas/fecha/<fecha>', 6, lambda vu: Peticion('GET', f'/api/tareas/fecha/{vu.fecha()}')),
+    'tareas_buscar': Escenario('GET /api/tareas/buscar', 4,
+                               lambda vu: Peticion('GET', '/api/tareas/buscar?' + urlencode({'q': vu.aleatorio.choice(TEMAS)[:5]}))),
+    'tareas_estadisticas': Escenario('GET /api/tareas/estadisticas', 4, _get('/api/tareas/estadisticas')),
+    'tareas_crear': Escenario('POST /api/tareas', 4, _tareas_crear),
+    'tareas_actualizar': Escenario('PUT /api/tareas/<id>', 6, _tareas_actualizar),
+    'tareas_eliminar': Escenario('DELETE /api/tareas/<id>', 3, _tareas_eliminar),
+    'tareas_batch': Escenario('POST /api/tareas/batch', 2, _tareas_batch),
+    'calendario': Escenario('GET /api/calendario', 6, _calendario),
+    # Recordatorios
+    'recordatorios_fecha': Escenario('GET /api/recordatorios/<fecha>', 4,
+                                     lambda vu: Peticion('GET', f'/api/recordatorios/{vu.fecha()}')),
+    'recordatorios_crear': Escenario('POST /api/recordatorios', 2, _recordatorios_crear),
+    'recordatorios_actualizar': Escenario('PUT /api/recordatorios/<id>', 2, _recordatorios_actualizar),
+    'recordatorios_eliminar': Escenario('DELETE /api/recordatorios/<id>', 2, _recordatorios_eliminar),
+    # Pomodoro
+    'presets_listar': Escenario('GET /api/pomodoro/presets', 3, _get('/api/pomodoro/presets')),
+    'presets_crear': Escenario('POST /api/pomodoro/presets', 1, _presets_crear),
+    'presets_actualizar': Escenario('PUT /api/pomodoro/presets/<id>', 1,
+                                    lambda vu: Peticion('PUT', f"/api/pomodoro/presets/{vu.datos['preset']}",
+                                                        {'work': vu.aleatorio.choice([25, 30, 45])})),
+    'presets_eliminar': Escenario('DELETE /api/pomodoro/presets/<id>', 1, _presets_eliminar),
+}
+
+
+# =============================================================================
+# Ejecución
+# =============================================================================
+
+def trabajar(vu, inicio_medicion, fin, muestras):
+    """Bucle de un usuario virtual. Añade (ms, status, sql, bytes) a muestras[escenario]."""
+    nombres = list(ESCENARIOS)
+    pesos = [ESCENARIOS[n].peso for n in nombres]
+    while True:
+        ahora = time.perf_counter()
+        if ahora >= fin:
+            return
+        nombre = vu.aleatorio.choices(nombres, pesos)[0]
+        peticion = ESCENARIOS[nombre].generar(vu)
+        if peticion is None:
+            continue
+        respuesta = vu.cliente.pedir(peticion.metodo, peticion.ruta, peticion.cuerpo, peticion.cabeceras)
+        if peticion.tras:
+            peticion.tras(respuesta)
+        if ahora >= inicio_medicion:
+            sql = respuesta.cabeceras.get('X-Bench-SQL') if respuesta.status else None
+            muestras.setdefault(nombre, []).append(
+                (respuesta.ms, respuesta.status, int(sql) if sql is not None else None, len(respuesta.datos)))
+
+
+def ejecutar(puerto, usuarios, args):
+    virtuales = []
+    for i in range(args.concurrencia):
+        datos = usuarios[i % len(usuarios)]
+        cliente = Cliente(puerto, args.accept_encoding)
+        respuesta = cliente.pedir('POST', '/login', formulario={'email': datos['email'], 'password': CONTRASENA})
+        if respuesta.status != 302:
+            sys.exit(f"No se pudo iniciar sesión como {datos['email']} (HTTP {respuesta.status})")
+        virtuales.append(UsuarioVirtual(datos, cliente, random.Random(args.semilla * 1000 + i)))
+
+    muestras = [{} for _ in virtuales]
+    inicio = time.perf_counter()
+    inicio_medicion = inicio + args.calentamiento
+    fin = inicio_medicion + args.duracion
+    hilos = [threading.Thread(target=trabajar, args=(vu, inicio_medicion, fin, m), daemon=True)
+             for vu, m in zip(virtuales, muestras)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio_medicion
+
+    combinadas = {}
+    for parcial in muestras:
+        for nombre, valores in parcial.items():
+            combinadas.setdefault(nombre, []).extend(valores)
+    return combinadas, duracion
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not ordenados:
+        return None
+    indice = min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumir(muestras, duracion):
+    def estadisticas(valores):
+        tiempos = sorted(v[0] for v in valores)
+        sqls = [v[2] for v in valores if v[2] is not None]
+        errores = sum(1 for v in valores if v[1] == 0 or v[1] >= 400)
+        codigos = {}
+        for v in valores:
+            codigos[str(v[1])] = codigos.get(str(v[1]), 0) + 1
+        return {
+            'peticiones': len(valores),
+            'errores': errores,
+            'rps': round(len(valores) / duracion, 2),
+            'p50_ms': round(percentil(tiempos, 50), 3),
+            'p95_ms': round(percentil(tiempos, 95), 3),
+            'p99_ms': round(percentil(tiempos, 99), 3),
+            'max_ms': round(tiempos[-1], 3),
+            'sql_media': round(sum(sqls) / len(sqls), 2) if sqls else None,
+            'sql_max': max(sqls) if sqls else None,
+            'bytes_media': round(sum(v[3] for v in valores) / len(valores)),
+            'status': codigos,
+        }
+
+    endpoints = {nombre: {'endpoint': ESCENARIOS[nombre].endpoint, **estadisticas(valores)}
+                 for nombre, valores in sorted(muestras.items())}
+    todas = [v for valores in muestras.values() for v in valores]
+    return (estadisticas(todas) if todas else {}), endpoints
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =============================================================================
+# Informe
+# =============================================================================
+
+def imprimir(resultado):
+    p = resultado['parametros']
+    print(f"{resultado['base_de_datos']}, {p['usuarios']} usuarios x {p['tareas']} tareas, "
+          f"{p['concurrencia']} usuarios virtuales, {resultado['duracion_s']:.1f} s medidos")
+    print(f'{"escenario":<26} {"peticiones":>10} {"err":>5} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"sql":>6} {"bytes":>8}')
+    filas = list(resultado['endpoints'].items()) + [('TOTAL', resultado['total'])]
+    for nombre, r in filas:
+        sql = f"{r['sql_media']:.1f}" if r.get('sql_media') is not None else '-'
+        print(f"{nombre:<26} {r['peticiones']:>10} {r['errores']:>5} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {sql:>6} {r['bytes_media']:>8}")
+
+
+def comparar(resultado, ruta_anterior):
+    with open(ruta_anterior, encoding='utf-8') as f:
+        anterior = json.load(f)
+    if anterior.get('formato') != FORMATO_RESULTADOS:
+        print(f'\nAviso: {ruta_anterior} tiene otro formato de resultados; no se compara.')
+        return
+
+    def cambio(nuevo, viejo):
+        if nuevo is None or not viejo:
+            return '-'
+        return f'{(nuevo - viejo) / viejo * 100:+.1f}%'
+
+    print(f"\nComparación con {ruta_anterior} (commit {anterior.get('commit')}, {anterior.get('fecha')})")
+    if anterior.get('parametros') != resultado['parametros']:
+        print('Aviso: los parámetros de las dos ejecuciones no coinciden.')
+    print(f'{"escenario":<26} {"rps":>9} {"p50":>9} {"p95":>9} {"p99":>9} {"sql":>9}')
+    filas = [(n, r, anterior['endpoints'].get(n)) for n, r in resultado['endpoints'].items()]
+    filas.append(('TOTAL', resultado['total'], anterior.get('total')))
+    for nombre, nuevo, viejo in filas:
+        if not viejo:
+            print(f'{nombre:<26} (nuevo)')
+            continue
+        sql = '-'
+        if nuevo.get('sql_media') is not None and viejo.get('sql_media') is not None:
+            sql = f"{nuevo['sql_media'] - viejo['sql_media']:+.1f}"
+        print(f"{nombre:<26} {cambio(nuevo['rps'], viejo['rps']):>9} {cambio(nuevo['p50_ms'], viejo['p50_ms']):>9} "
+              f"{cambio(nuevo['p95_ms'], viejo['p95_ms']):>9} {cambio(nuevo['p99_ms'], viejo['p99_ms']):>9} {sql:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API y las páginas')
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--tareas', type=int, default=200, help='Tareas por usuario')
+    parser.add_argument('--recordatorios', type=int, default=30, help='Recordatorios por usuario')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Usuarios virtuales simultáneos')
+    parser.add_argument('--duracion', type=float, default=20.0, help='Segundos medidos')
+    parser.add_argument('--calentamiento', type=float, default=3.0, help='Segundos iniciales sin medir')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--accept-encoding', default='gzip, deflate, br')
+    parser.add_argument('--db-url', default=None, help='Por defecto, SQLite en un directorio temporal')
+    parser.add_argument('--recrear', action='store_true', help='Vaciar la base de datos de --db-url si tiene datos')
+    parser.add_argument('--salida', default=None, help='Archivo JSON de resultados '
+                                                       '(por defecto bench-results/api-<fecha>.json)')
+    parser.add_argument('--comparar', default=None, help='JSON de una ejecución anterior')
+    args = parser.parse_args()
+    if args.usuarios < args.concurrencia:
+        # Cada usuario virtual necesita su propio usuario (límite de 3 presets, borrados propios)
+        parser.error('--usuarios debe ser mayor o igual que --concurrencia')
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as carpeta:
+        db_url = args.db_url or f"sqlite:///{os.path.join(carpeta, 'bench.db')}"
+        app = crear_app(db_url, args.concurrencia)
+        preparar_esquema(app, args.recrear)
+        t0 = time.perf_counter()
+        usuarios = sembrar(app, args.usuarios, args.tareas, args.recordatorios, args.semilla)
+        print(f'Datos generados en {time.perf_counter() - t0:.1f} s', file=sys.stderr)
+        instrumentar(app)
+        with app.app_context():
+            dialecto = db.engine.dialect.name
+
+        servidor = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        try:
+            muestras, duracion = ejecutar(servidor.server_port, usuarios, args)
+        finally:
+            servidor.shutdown()
+            with app.app_context():
+                db.engine.dispose()
+
+    total, endpoints = resumir(muestras, duracion)
+    parametros = {k: getattr(args, k) for k in ('usuarios', 'tareas', 'recordatorios', 'concurrencia',
+                                                'duracion', 'calentamiento', 'semilla', 'accept_encoding')}
+    resultado = {
+        'formato': FORMATO_RESULTADOS,
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'base_de_datos': dialecto,
+        'parametros': parametros,
+        'duracion_s': round(duracion, 3),
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+    salida = args.salida or os.path.join(
+        PROJECT_DIR, 'bench-results', f"api-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    imprimir(resultado)
+    print(f'\nResultados guardados en {salida}')
+    if args.comparar:
+        comparar(resultado, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
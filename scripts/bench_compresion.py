@@ -0,0 +1,144 @@
+# scripts/bench_compresion.py - Bytes y latencia de /api/tareas con y sin compresión
+"""
+Crea la aplicación contra una base de datos SQLite temporal, genera una
+lista de tareas realista (con enlaces y contactos) para un usuario y pide
+las rutas de la API con Accept-Encoding identity, gzip y br:
+
+- bytes:     tamaño del cuerpo enviado
+- p50/p95:   latencia en el servidor (cliente de pruebas, sin red)
+- red:       estimación de p50 + tiempo de transferencia con --ancho-banda
+
+Uso:
+    python scripts/bench_compresion.py [--tareas 300] [--repeticiones 30]
+                                       [--ancho-banda 5] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Tarea, Enlace, Contacto, PomodoroPreset  # noqa: E402
+from config import Config  # noqa: E402
+
+RUTAS = ['/api/tareas', '/api/tareas/fecha/{fecha}', '/api/pomodoro/presets']
+CODIFICACIONES = ['identity', 'gzip', 'br']
+ASUNTOS = ['Matemáticas', 'Lengua', 'Historia', 'Biología', 'Inglés', 'Física', 'Química']
+
+
+def crear_app(ruta_bd):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{ruta_bd}'
+        SECRET_KEY = 'bench'
+        DEBUG = False
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def sembrar(app, num_tareas):
+    """Un usuario con num_tareas tareas, cada una con 0-3 enlaces y 0-2 contactos."""
+    aleatorio = random.Random(42)
+    hoy = date.today()
+    with app.app_context():
+        user = User(name='Bench', email='bench@example.com')
+        user.set_password('bench123')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(num_tareas):
+            asunto = aleatorio.choice(ASUNTOS)
+            tarea = Tarea(
+                user_id=user.id,
+                titulo=f'{asunto}: entrega {i}',
+                descripcion=f'Repasar el tema {i % 12 + 1} de {asunto} y preparar los ejercicios del cuaderno.',
+                fecha=hoy + timedelta(days=aleatorio.randint(-10, 30)),
+                importancia=aleatorio.choice(['baja', 'media', 'alta']),
+                asunto=asunto,
+                status=aleatorio.choice(['pendiente', 'en_progreso', 'completada']),
+            )
+            db.session.add(tarea)
+            db.session.flush()
+            for j in range(aleatorio.randint(0, 3)):
+                db.session.add(Enlace(tarea_id=tarea.id, url=f'https://classroom.example.com/c/{i}/material/{j}',
+                                      titulo=f'Material {j + 1}'))
+            for j in range(aleatorio.randint(0, 2)):
+                db.session.add(Contacto(tarea_id=tarea.id, nombre=f'Compañero {j + 1}',
+                                        email=f'companero{j + 1}@example.com', telefono='600000000'))
+        for i in range(5):
+            db.session.add(PomodoroPreset(user_id=user.id, name=f'Preset {i}', music=json.dumps(
+                [{'title': f'Lista {k}', 'url': f'https://music.example.com/{i}/{k}'} for k in range(3)])))
+        db.session.commit()
+    return hoy.isoformat()
+
+
+def medir(client, ruta, codificacion, repeticiones):
+    tiempos = []
+    tamano = 0
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        respuesta = client.get(ruta, headers={'Accept-Encoding': codificacion})
+        datos = respuesta.get_data()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        tamano = len(datos)
+        assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+        assert respuesta.headers.get('Content-Encoding', 'identity') == codificacion or codificacion == 'identity', \
+            (ruta, codificacion, respuesta.headers.get('Content-Encoding'))
+    tiempos.sort()
+    return {
+        'bytes': tamano,
+        'p50_ms': statistics.median(tiempos),
+        'p95_ms': tiempos[int(len(tiempos) * 0.95) - 1] if len(tiempos) > 1 else tiempos[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de la API')
+    parser.add_argument('--tareas', type=int, default=300)
+    parser.add_argument('--repeticiones', type=int, default=30)
+    parser.add_argument('--ancho-banda', type=float, default=5.0, help='Mbit/s para estimar la transferencia')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        app = crear_app(os.path.join(carpeta, 'bench.db'))
+        fecha = sembrar(app, args.tareas)
+        client = app.test_client()
+        client.post('/login', data={'email': 'bench@example.com', 'password': 'bench123'})
+
+        informe = {}
+        for plantilla in RUTAS:
+            ruta = plantilla.format(fecha=fecha)
+            informe[plantilla] = {}
+            for codificacion in CODIFICACIONES:
+                resultado = medir(client, ruta, codificacion, args.repeticiones)
+                transferencia = resultado['bytes'] * 8 / (args.ancho_banda * 1_000_000) * 1000
+                resultado['red_ms'] = resultado['p50_ms'] + transferencia
+                informe[plantilla][codificacion] = resultado
+
+    if args.json:
+        print(json.dumps({'tareas': args.tareas, 'ancho_banda_mbps': args.ancho_banda, 'rutas': informe}, indent=2))
+        return
+
+    print(f'{args.tareas} tareas, {args.repeticiones} repeticiones, red estimada a {args.ancho_banda} Mbit/s')
+    for ruta, resultados in informe.items():
+        print(f'\n{ruta}')
+        print(f'  {"codificación":<12} {"bytes":>9} {"ratio":>6} {"p50 ms":>8} {"p95 ms":>8} {"red ms":>8}')
+        base = resultados['identity']['bytes']
+        for codificacion, r in resultados.items():
+            ratio = r['bytes'] / base if base else 1
+            print(f'  {codificacion:<12} {r["bytes"]:>9} {ratio:>6.2f} {r["p50_ms"]:>8.2f} '
+                  f'{r["p95_ms"]:>8.2f} {r["red_ms"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# scripts/startup_timing.py - Informe de tiempos de arranque de la aplicación
+"""
+Mide cada fase del arranque en procesos nuevos (imports en frío):
+
+- import:          importar el paquete `app` (Flask, SQLAlchemy, modelos...)
+- create_app:      ejecutar la factoría create_app()
+- primera_peticion: primera petición con el cliente de pruebas (plantillas sin compilar)
+- segunda_peticion: la misma petición ya en caliente, como referencia
+
+También cuenta las conexiones a la base de datos abiertas durante el import y
+create_app(), que en modo servidor deben ser 0 (la inicialización es `flask init`).
+
+Uso:
+    python scripts/startup_timing.py [--repeticiones 5] [--ruta /login] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FASES = ['import', 'create_app', 'primera_peticion', 'segunda_peticion']
+
+
+def medir(ruta):
+    """Una muestra; se ejecuta en un proceso hijo y escribe el resultado como JSON."""
+    sys.path.insert(0, PROJECT_DIR)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    conexiones = []
+    event.listen(Engine, 'connect', lambda *args: conexiones.append(time.perf_counter()))
+
+    t0 = time.perf_counter()
+    from app import create_app
+    t1 = time.perf_counter()
+    app = create_app()
+    t2 = time.perf_counter()
+    conexiones_al_arrancar = len(conexiones)
+    client = app.test_client()
+    status = client.get(ruta).status_code
+    t3 = time.perf_counter()
+    client.get(ruta)
+    t4 = time.perf_counter()
+
+    print(json.dumps({
+        'import': (t1 - t0) * 1000,
+        'create_app': (t2 - t1) * 1000,
+        'primera_peticion': (t3 - t2) * 1000,
+        'segunda_peticion': (t4 - t3) * 1000,
+        'status': status,
+        'conexiones_al_arrancar': conexiones_al_arrancar,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Informe de tiempos de arranque')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--ruta', default='/login', help='Ruta de la primera petición')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir(args.ruta)
+        return
+
+    muestras = []
+    for _ in range(args.repeticiones):
+        salida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--medir', '--ruta', args.ruta],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        # La muestra es la última línea; lo anterior son prints de la aplicación
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+
+    informe = {
+        'ruta': args.ruta,
+        'repeticiones': args.repeticiones,
+        'status': muestras[-1]['status'],
+        'conexiones_al_arrancar': max(m['conexiones_al_arrancar'] for m in muestras),
+        'fases_ms': {
+            fase: {
+                'mediana': statistics.median(m[fase] for m in muestras),
+                'min': min(m[fase] for m in muestras),
+                'max': max(m[fase] for m in muestras),
+            } for fase in FASES
+        },
+    }
+
+    if args.json:
+        print(json.dumps(informe, indent=2))
+        return
+
+    print(f"Arranque ({args.repeticiones} procesos, primera petición GET {args.ruta} -> {informe['status']})")
+    print(f"{'fase':<18}{'mediana':>10}{'min':>10}{'max':>10}  (ms)")
+    for fase in FASES:
+        datos = informe['fases_ms'][fase]
+        print(f"{fase:<18}{datos['mediana']:>10.1f}{datos['min']:>10.1f}{datos['max']:>10.1f}")
+    total = sum(informe['fases_ms'][f]['mediana'] for f in FASES[:3])
+    print(f"{'total hasta 1ª respuesta':<28}{total:>10.1f} ms")
+    print(f"Conexiones a la BD durante import + create_app: {informe['conexiones_al_arrancar']}")
+
+
+if __name__ == '__main__':
+    main()
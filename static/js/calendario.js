@@ -34,58 +34,37 @@ document.addEventListener('DOMContentLoaded', () => {
 async function cargarRecordatoriosMes(year, month) {
     recordatorios = [];
     const diasEnElMes = new Date(year, month + 1, 0).getDate();
-    console.log(`cargarRecordatoriosMes: solicitando recordatorios para ${year}-${String(month+1).padStart(2,'0')}`);
-    // --- También obtener Tareas (modelo Tarea) para mostrarlas en el calendario ---
+    const prefijoMes = `${year}-${String(month + 1).padStart(2, '0')}`;
+    const desde = `${prefijoMes}-01`;
+    const hasta = `${prefijoMes}-${String(diasEnElMes).padStart(2, '0')}`;
+    // Una sola petición por mes: tareas (modelo Tarea) y recordatorios agrupados por día
     try {
-        console.log('fetch -> /api/tareas (obtener todas las tareas del usuario)');
-        const tareasRes = await fetch('/api/tareas');
-        if (tareasRes.ok) {
-            const tareasData = await tareasRes.json();
-            // Filtrar tareas que tienen fecha en el mes solicitado y convertir al formato esperado
-            const prefijoMes = `${year}-${String(month+1).padStart(2,'0')}`;
-            const tareasMes = (tareasData || []).filter(t => t.fecha && t.fecha.startsWith(prefijoMes));
-            tareasMes.forEach(t => {
-                recordatorios.push({
-                    id: t.id,
-                    fecha: t.fecha,
-                    titulo: t.titulo,
-                    descripcion: t.descripcion || '',
-                    importancia: t.importancia || 'baja',
-                    _fuente: 'tarea'
+        console.log('fetch ->', `/api/calendario?desde=${desde}&hasta=${hasta}`);
+        const res = await fetch(`/api/calendario?desde=${desde}&hasta=${hasta}`);
+        if (res.ok) {
+            const data = await res.json();
+            Object.values(data.dias || {}).forEach(dia => {
+                (dia.tareas || []).forEach(t => {
+                    recordatorios.push({
+                        id: t.id,
+                        fecha: t.fecha,
+                        titulo: t.titulo,
+                        descripcion: t.descripcion || '',
+                        importancia: t.importancia || 'baja',
+                        _fuente: 'tarea'
+                    });
+                });
+                (dia.recordatorios || []).forEach(r => {
+                    recordatorios.push({...r, _fuente: 'recordatorio'});
                 });
             });
-            console.log(`Tareas añadidas desde /api/tareas para ${prefijoMes}:`, tareasMes.length);
         } else {
-            console.warn('/api/tareas respondió con status', tareasRes.status);
+            let body = '';
+            try { body = await res.text(); } catch (e) { body = '<no body>'; }
+            console.warn(`Error HTTP obteniendo el calendario de ${prefijoMes}:`, res.status, body);
         }
     } catch (e) {
-        console.error('Error obteniendo /api/tareas:', e);
-    }
-    for (let i = 1; i <= diasEnElMes; i++) {
-        const fechaStr = `${year}-${String(month + 1).padStart(2, '0')}-${String(i).padStart(2, '0')}`;
-        try {
-            console.log('fetch ->', `/api/recordatorios/${fechaStr}`);
-            const res = await fetch(`/api/recordatorios/${fechaStr}`);
-            console.log(`fetch status for ${fechaStr}:`, res.status);
-            if (res.ok) {
-                try {
-                    const data = await res.json();
-                    if (Array.isArray(data) && data.length > 0) {
-                        console.log(`Recordatorios para ${fechaStr}:`, data);
-                    }
-                    // Asegurarse de concatenar un array
-                    if (Array.isArray(data)) recordatorios = recordatorios.concat(data.map(d => ({...d, _fuente: 'recordatorio'})));
-                } catch (parseErr) {
-                    console.error(`Error parseando JSON para ${fechaStr}:`, parseErr);
-                }
-            } else {
-                let body = '';
-                try { body = await res.text(); } catch (e) { body = '<no body>'; }
-                console.warn(`Error HTTP obteniendo ${fechaStr}:`, res.status, body);
-            }
-        } catch (e) {
-            console.error(`Excepción al obtener recordatorios para ${fechaStr}:`, e);
-        }
+        console.error(`Excepción al obtener el calendario de ${prefijoMes}:`, e);
     }
     console.log('Recordatorios cargados para el mes:', recordatorios);
 }
@@ -106,6 +85,9 @@ async function eliminarRecordatorioAPI(id) {
 
 // --- Calendario ---
 async function generarCalendario(year, month) {
+    // Pedir los datos antes de vaciar la rejilla: al recargar por un cambio no parpadea,
+    // y dos llamadas solapadas no mezclan sus días
+    await cargarRecordatoriosMes(year, month);
     gridDiasDiv.innerHTML = '';
     const today = new Date();
     const primerDiaDelMes = new Date(year, month, 1);
@@ -118,7 +100,6 @@ async function generarCalendario(year, month) {
         divVacio.classList.add('dia', 'vacio');
         gridDiasDiv.appendChild(divVacio);
     }
-    await cargarRecordatoriosMes(year, month);
     for (let i = 1; i <= diasEnElMes; i++) {
         const diaDiv = document.createElement('div');
         diaDiv.classList.add('dia');
@@ -251,6 +232,17 @@ async function actualizarRecordatorioAPI(id, fecha, titulo, descripcion, importa
     // --- Inicialización ---
     generarCalendario(currentYear, currentMonth);
 
+    // Cambios de tareas y recordatorios desde otras pestañas o dispositivos (js/cambios.js):
+    // se vuelve a pedir el mes visible, agrupando los eventos que llegan seguidos
+    if (typeof escucharCambios === 'function') {
+        let temporizadorCambios = null;
+        const recargarMes = () => {
+            clearTimeout(temporizadorCambios);
+            temporizadorCambios = setTimeout(() => generarCalendario(currentYear, currentMonth), 300);
+        };
+        escucharCambios({ tarea: recargarMes, recordatorio: recargarMes, recargar: recargarMes });
+    }
+
     // --- Modal lateral (social) ---
     // Elementos del nuevo modal lateral
     const socialModal = document.getElementById('social-modal');
@@ -0,0 +1,66 @@
+// Canal de cambios del servidor (/api/eventos, server-sent events)
+// Avisa de las tareas y recordatorios que cambian en otras pestañas o dispositivos,
+// para no tener que volver a pedir las listas completas.
+
+/**
+ * Abre el stream de cambios del usuario.
+ * manejadores: {tarea(evento), recordatorio(evento), recargar()}
+ *   evento = {id, entidad, accion: 'create'|'update'|'delete', ids: [...]}
+ *   recargar() se llama cuando no se puede saber qué ha cambiado (reconexión
+ *   sin posición o eventos ya borrados en el servidor).
+ */
+function escucharCambios(manejadores) {
+    if (!window.EventSource) return null;
+
+    let ultimoId = null;
+    let fuente = null;
+    let espera = 1000;
+    let primeraConexion = true;
+
+    const recargar = () => {
+        if (manejadores.recargar) manejadores.recargar();
+    };
+
+    function conectar() {
+        // El navegador envía Last-Event-ID en sus reconexiones; ?desde= cubre las que hacemos a mano
+        const url = ultimoId !== null ? `/api/eventos?desde=${ultimoId}` : '/api/eventos';
+        fuente = new EventSource(url);
+
+        fuente.addEventListener('conectado', (e) => {
+            const datos = JSON.parse(e.data);
+            espera = 1000;
+            ultimoId = datos.id;
+            // La primera conexión se abre justo después de que la página cargue sus datos
+            if (!datos.reanudado && !primeraConexion) recargar();
+            primeraConexion = false;
+        });
+        fuente.addEventListener('reset', (e) => {
+            ultimoId = JSON.parse(e.data).id;
+            primeraConexion = false;
+            recargar();
+        });
+        ['tarea', 'recordatorio'].forEach((entidad) => {
+            fuente.addEventListener(entidad, (e) => {
+                const evento = JSON.parse(e.data);
+                ultimoId = evento.id;
+                if (manejadores[entidad]) manejadores[entidad](evento);
+            });
+        });
+
+        fuente.onerror = () => {
+            // Ante una respuesta de error (503, sesión caducada) el navegador no reintenta:
+            // se reconecta a mano con una espera creciente
+            if (fuente.readyState === EventSource.CLOSED) {
+                setTimeout(conectar, espera);
+                espera = Math.min(espera * 2, 60000);
+            }
+        };
+    }
+
+    conectar();
+    return {
+        cerrar() {
+            if (fuente) fuente.close();
+        }
+    };
+}
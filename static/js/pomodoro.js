@@ -1,5 +1,6 @@
 // Pomodoro básico con presets y links de música
 // Guarda presets en localStorage por usuario (si window.APP_USER_ID existe) y gestiona modal
+// Registra cada intervalo (iniciado, completado o abortado) y lo envía por lotes a /api/pomodoro/sesiones
 
 (function(){
     const userKey = window.APP_USER_ID ? `pomodoro_presets_user_${window.APP_USER_ID}` : 'pomodoro_presets_guest';
@@ -13,6 +14,8 @@
     let currentPreset = null;
     let cachedPresets = [];
     let workCycles = 0; // cuántos work se completaron consecutivos
+    let intervalo = null; // intervalo en curso para el historial: {id, fase, inicio, dia, segundos, preset_id}
+    let enviandoSesiones = false;
 
     // Elementos DOM
     const timeEl = document.getElementById('pomodoro-time');
@@ -201,6 +204,7 @@
 
     function applyPreset(p){
         // p: {name, work, short, long, colors: {work, short, long}}
+        terminarIntervalo('abortada');
         mode = 'work';
         remaining = (p.work || 25) * 60;
         updateDisplay();
@@ -306,6 +310,7 @@
     function tick(){
         if(remaining <= 0){
             stopTimer();
+            terminarIntervalo('completada');
             // Reproducir alarma configurada o beep por defecto
             try { playAlarm(); } catch(e){ playBeep(1200, 0.4); }
             // pasar al siguiente modo con conteo de ciclos y long break
@@ -332,6 +337,7 @@
             return;
         }
         remaining -= 1;
+        if(intervalo) intervalo.segundos += 1;
         updateDisplay();
     }
 
@@ -359,6 +365,7 @@
 
     function advancePhase(){
         // Forzar paso inmediato a la siguiente fase
+        terminarIntervalo('abortada');
         if(mode === 'work'){
             workCycles += 1;
             const cyclesSetting = getCyclesBeforeLong();
@@ -396,6 +403,7 @@
         if(running) return;
         running = true;
         if(!remaining) remaining = (getCurrentPreset().work||25)*60;
+        if(!intervalo) iniciarIntervalo();
         timer = setInterval(tick, 1000);
     }
     function stopTimer(){
@@ -408,6 +416,7 @@
     }
     function resetTimer(){
         stopTimer();
+        terminarIntervalo('abortada');
         remaining = (getCurrentPreset().work||25)*60;
         mode = 'work';
         updateDisplay();
@@ -427,7 +436,143 @@
         return presets[0] || {name: 'Default', work:25, short:5, long:15, colors:{work: '#f56565', short:'#f6ad55', long:'#48bb78'}};
     }
 
+    // Historial de sesiones: los eventos se guardan en una cola en localStorage y se
+    // envían por lotes cada 30 s y al ocultar la página. El servidor ignora los
+    // repetidos (mismo intervalo y evento), así que reenviar un lote nunca duplica nada.
+    const FASES_SERVIDOR = {work: 'trabajo', short: 'descanso_corto', long: 'descanso_largo'};
+    const MAX_EVENTOS_LOTE = 500;
+    const MAX_EVENTOS_COLA = 5000;
+
+    function claveSesiones(){
+        return window.APP_USER_ID ? `pomodoro_sesiones_user_${window.APP_USER_ID}` : null;
+    }
+    function leerColaSesiones(){
+        const clave = claveSesiones();
+        if(!clave) return [];
+        try { return JSON.parse(localStorage.getItem(clave) || '[]'); } catch(e){ return []; }
+    }
+    function guardarColaSesiones(cola){
+        const clave = claveSesiones();
+        if(!clave) return;
+        try { localStorage.setItem(clave, JSON.stringify(cola.slice(-MAX_EVENTOS_COLA))); } catch(e){}
+    }
+    function nuevoId(){
+        if(window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, (c)=>{
+            const r = Math.random()*16|0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+    function fechaLocal(d){
+        const pad = (n)=> String(n).padStart(2, '0');
+        return `${d.getFullYear()}-${pad(d.getMonth()+1)}-${pad(d.getDate())}`;
+    }
+    function tareaVinculada(){
+        // /pomodoro?tarea=<id> asocia los intervalos a una tarea
+        const id = parseInt(new URLSearchParams(window.location.search).get('tarea'), 10);
+        return isNaN(id) ? null : id;
+    }
+
+    function encolarEvento(evento){
+        const cola = leerColaSesiones();
+        cola.push({
+            intervalo: intervalo.id,
+            evento: evento,
+            fase: intervalo.fase,
+            inicio: intervalo.inicio,
+            dia: intervalo.dia,
+            duracion: evento === 'iniciada' ? null : intervalo.segundos,
+            preset_id: intervalo.preset_id,
+            tarea_id: tareaVinculada()
+        });
+        guardarColaSesiones(cola);
+    }
+    function iniciarIntervalo(){
+        const ahora = new Date();
+        const preset = getCurrentPreset();
+        intervalo = {
+            id: nuevoId(),
+            fase: FASES_SERVIDOR[mode],
+            inicio: ahora.toISOString(),
+            dia: fechaLocal(ahora),
+            segundos: 0,
+            preset_id: typeof preset.id === 'number' ? preset.id : null
+        };
+        encolarEvento('iniciada');
+    }
+    function terminarIntervalo(evento){
+        if(!intervalo) return;
+        encolarEvento(evento);
+        intervalo = null;
+    }
+
+    async function enviarSesiones(){
+        if(enviandoSesiones) return;
+        const lote = leerColaSesiones().slice(0, MAX_EVENTOS_LOTE);
+        if(lote.length === 0) return;
+        enviandoSesiones = true;
+        try {
+            const res = await fetch('/api/pomodoro/sesiones', {
+                method: 'POST', headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({eventos: lote})
+            });
+            // 202: aceptados (los inválidos no se reintentan); 400: el lote nunca será válido
+            if(res.status === 202 || res.status === 400){
+                guardarColaSesiones(leerColaSesiones().slice(lote.length));
+                if(res.status === 202) cargarHistorial();
+            }
+        } catch(e){ /* sin conexión: se reintenta en el siguiente envío */ }
+        finally { enviandoSesiones = false; }
+    }
+    function enviarSesionesAlSalir(e){
+        // La página se cierra (no solo pasa a la caché del navegador): un intervalo a medias queda abortado
+        if(intervalo && !e.persisted){
+            if(running) stopTimer();
+            terminarIntervalo('abortada');
+        }
+        const lote = leerColaSesiones().slice(0, MAX_EVENTOS_LOTE);
+        if(lote.length === 0 || !navigator.sendBeacon) return;
+        // La cola no se vacía: no se sabe si llegará y reenviarla en la próxima visita es inocuo
+        navigator.sendBeacon('/api/pomodoro/sesiones',
+            new Blob([JSON.stringify({eventos: lote})], {type: 'application/json'}));
+    }
+
+    // Tiempo de concentración de los últimos 7 días (resumen precalculado del servidor)
+    async function cargarHistorial(){
+        const contenedor = document.getElementById('pomodoro-historial');
+        if(!contenedor || !window.APP_USER_ID) return;
+        const hoy = new Date();
+        const dias = [];
+        for(let i = 6; i >= 0; i--){
+            dias.push(fechaLocal(new Date(hoy.getFullYear(), hoy.getMonth(), hoy.getDate() - i)));
+        }
+        try {
+            const res = await fetch(`/api/pomodoro/resumen?periodo=dia&desde=${dias[0]}&hasta=${dias[6]}`);
+            if(!res.ok) return;
+            const datos = await res.json();
+            const porDia = {};
+            datos.resumen.forEach(f => { porDia[f.inicio] = f; });
+            const maximo = Math.max(60, ...datos.resumen.map(f => f.segundos_foco));
+            contenedor.innerHTML = '';
+            dias.forEach(dia => {
+                const fila = porDia[dia] || {segundos_foco: 0, completados: 0};
+                const minutos = Math.round(fila.segundos_foco / 60);
+                const barra = document.createElement('div');
+                barra.className = 'historial-dia';
+                barra.title = `${dia}: ${minutos} min, ${fila.completados} completados`;
+                barra.innerHTML = `<div class="historial-barra" style="height:${Math.round(fila.segundos_foco / maximo * 100)}%"></div>`
+                    + `<span>${dia.slice(8)}</span>`;
+                contenedor.appendChild(barra);
+            });
+            const total = document.getElementById('pomodoro-historial-total');
+            if(total) total.textContent = `${Math.round(datos.total.segundos_foco / 60)} min en 7 días`;
+        } catch(e){ console.warn('No se pudo cargar el historial del Pomodoro', e); }
+    }
+
     // Eventos
+    setInterval(enviarSesiones, 30000);
+    window.addEventListener('pagehide', enviarSesionesAlSalir);
+    document.addEventListener('visibilitychange', ()=>{ if(document.visibilityState === 'hidden') enviarSesiones(); });
     startBtn.addEventListener('click', ()=>{ startTimer(); });
     pauseBtn.addEventListener('click', ()=>{ pauseTimer(); });
     resetBtn.addEventListener('click', ()=>{ resetTimer(); });
@@ -501,6 +646,9 @@
         const all = cachedPresets;
         if(all && all.length>0){ applyPreset(all[0]); currentPreset = all[0].id; }
         updateDisplay();
+        // Eventos pendientes de visitas anteriores
+        enviarSesiones();
+        cargarHistorial();
     })();
 
 })();
@@ -8,6 +8,10 @@ class SistemaTareas {
         this.tareaEditandoId = null;
         this.kanbanColapsado = false;
         this.todasLasTareas = [];
+        this.sincronizadoHasta = null; // marca updated_since para cargas incrementales
+        this.seleccionadas = new Set(); // IDs seleccionados con Ctrl/Cmd + click en el Kanban
+        this.ocurrencias = {}; // fecha -> repeticiones de tareas recurrentes del mes visible
+        this.reglaEditando = null; // regla completa de la tarea recurrente en edición
     this.isSaving = false;
         
     this.init();
@@ -19,6 +23,19 @@ class SistemaTareas {
         this.cargarTodasLasTareas();
         this.setupModal();
         this.setupKanban();
+        this.conectarCambios();
+    }
+
+    conectarCambios() {
+        // Cambios hechos en otras pestañas o dispositivos (js/cambios.js): basta una carga
+        // incremental con updated_since; varios eventos seguidos se agrupan en una sola
+        if (typeof escucharCambios !== 'function') return;
+        let temporizador = null;
+        const sincronizar = () => {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(() => this.cargarTodasLasTareas(), 200);
+        };
+        this.canalCambios = escucharCambios({ tarea: sincronizar, recargar: sincronizar });
     }
 
     setupEventListeners() {
@@ -46,6 +63,14 @@ class SistemaTareas {
             this.toggleKanban();
         });
         
+        // Acción masiva sobre las tarjetas seleccionadas
+        const btnCompletarSel = document.getElementById('completar-seleccionadas');
+        if (btnCompletarSel) {
+            btnCompletarSel.addEventListener('click', () => {
+                this.moverTareasEnLote(Array.from(this.seleccionadas), 'completa');
+            });
+        }
+        
         // Modal
         document.querySelector('.close-btn').addEventListener('click', () => {
             this.cerrarModal();
@@ -111,9 +136,12 @@ class SistemaTareas {
     }
     
     // === CALENDARIO ===
-    renderCalendario() {
+    renderCalendario(recargarOcurrencias = true) {
         const año = this.fechaActual.getFullYear();
         const mes = this.fechaActual.getMonth();
+        if (recargarOcurrencias) {
+            this.cargarOcurrenciasMes(año, mes);
+        }
         
         // Actualizar título
         const meses = [
@@ -165,8 +193,37 @@ class SistemaTareas {
         }
     }
     
+    async cargarOcurrenciasMes(año, mes) {
+        // Las repeticiones de las tareas recurrentes las calcula el servidor solo para el mes visible
+        const clave = `${año}-${String(mes + 1).padStart(2, '0')}`;
+        const ultimo = new Date(año, mes + 1, 0).getDate();
+        try {
+            const response = await fetch(`/api/calendario?desde=${clave}-01&hasta=${clave}-${ultimo}`);
+            if (!response.ok) return;
+            const datos = await response.json();
+            const ocurrencias = {};
+            Object.entries(datos.dias).forEach(([fecha, dia]) => {
+                const repeticiones = dia.tareas.filter(t => t.recurrente);
+                if (repeticiones.length > 0) ocurrencias[fecha] = repeticiones;
+            });
+            // Si mientras tanto se cambió de mes, esta respuesta ya no sirve
+            const actual = `${this.fechaActual.getFullYear()}-${String(this.fechaActual.getMonth() + 1).padStart(2, '0')}`;
+            if (actual !== clave) return;
+            const habiaOcurrencias = Object.keys(this.ocurrencias).length > 0;
+            this.ocurrencias = ocurrencias;
+            if (habiaOcurrencias || Object.keys(ocurrencias).length > 0) {
+                this.renderCalendario(false);
+            }
+        } catch (error) {
+            console.error('Error al cargar repeticiones del mes:', error);
+        }
+    }
+
     agregarIndicadorTareas(divDia, fecha) {
-        const tareasDelDia = this.todasLasTareas.filter(tarea => tarea.fecha === fecha);
+        // Las tareas recurrentes aparecen por sus repeticiones, no por su fecha de inicio
+        const tareasDelDia = this.todasLasTareas
+            .filter(tarea => !tarea.recurrencia && tarea.fecha === fecha)
+            .concat(this.ocurrencias[fecha] || []);
         if (tareasDelDia.length > 0) {
             // Contenedor para múltiples indicadores
             const cont = document.createElement('div');
@@ -272,6 +329,7 @@ class SistemaTareas {
         }
         const tarjeta = document.createElement('div');
         tarjeta.className = `task-card ${tarea.importancia || ''}`;
+        if (this.seleccionadas.has(tarea.id)) tarjeta.classList.add('seleccionada-multi');
         tarjeta.dataset.tareaId = tarea.id;
         
         // Crear HTML para enlaces si existen
@@ -311,7 +369,17 @@ class SistemaTareas {
         // Hacer la tarjeta arrastrable
         tarjeta.draggable = true;
         tarjeta.addEventListener('dragstart', (e) => {
-            e.dataTransfer.setData('text/plain', tarea.id);
+            // Si se arrastra una tarjeta seleccionada, se mueven todas las seleccionadas
+            const ids = this.seleccionadas.has(tarea.id) ? Array.from(this.seleccionadas) : [tarea.id];
+            e.dataTransfer.setData('text/plain', ids.join(','));
+        });
+        
+        // Ctrl/Cmd + click para selección múltiple
+        tarjeta.addEventListener('click', (e) => {
+            if (e.ctrlKey || e.metaKey) {
+                e.preventDefault();
+                this.toggleSeleccion(tarea.id, tarjeta);
+            }
         });
         
         return tarjeta;
@@ -334,10 +402,14 @@ class SistemaTareas {
                 e.preventDefault();
                 columna.style.backgroundColor = '';
                 
-                const tareaId = e.dataTransfer.getData('text/plain');
+                const ids = e.dataTransfer.getData('text/plain').split(',').filter(Boolean);
                 const nuevoStatus = columna.id.replace('kanban-', '');
                 
-                this.cambiarStatusTarea(tareaId, nuevoStatus);
+                if (ids.length > 1) {
+                    this.moverTareasEnLote(ids.map(Number), nuevoStatus);
+                } else {
+                    this.cambiarStatusTarea(ids[0], nuevoStatus);
+                }
             });
         });
     }
@@ -360,6 +432,50 @@ class SistemaTareas {
         }
     }
     
+    toggleSeleccion(tareaId, tarjeta) {
+        if (this.seleccionadas.has(tareaId)) {
+            this.seleccionadas.delete(tareaId);
+            tarjeta.classList.remove('seleccionada-multi');
+        } else {
+            this.seleccionadas.add(tareaId);
+            tarjeta.classList.add('seleccionada-multi');
+        }
+        this.actualizarBarraSeleccion();
+    }
+    
+    actualizarBarraSeleccion() {
+        const btn = document.getElementById('completar-seleccionadas');
+        const contador = document.getElementById('count-seleccionadas');
+        if (contador) contador.textContent = String(this.seleccionadas.size);
+        if (btn) btn.hidden = this.seleccionadas.size === 0;
+    }
+    
+    async moverTareasEnLote(ids, nuevoStatus) {
+        // Una sola petición y una sola transacción para todas las tarjetas
+        if (ids.length === 0) return;
+        try {
+            const response = await fetch('/api/tareas/batch', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    operaciones: ids.map(id => ({op: 'update', id, datos: {status: nuevoStatus}}))
+                })
+            });
+            if (response.ok) {
+                const result = await response.json();
+                const fallidas = result.resultados.filter(r => !r.ok);
+                if (fallidas.length > 0) console.warn('Operaciones del lote con error:', fallidas);
+                this.seleccionadas.clear();
+                this.actualizarBarraSeleccion();
+                await this.cargarTodasLasTareas();
+                this.renderKanban();
+                this.renderCalendario();
+            }
+        } catch (error) {
+            console.error('Error al mover tareas en lote:', error);
+        }
+    }
+    
     toggleKanban() {
         const kanbanSection = document.getElementById('kanban-sidebar');
         this.kanbanColapsado = !this.kanbanColapsado;
@@ -447,6 +563,7 @@ class SistemaTareas {
         // Limpiar el ID de edición
         console.log('Limpiando tareaEditandoId, era:', this.tareaEditandoId);
         this.tareaEditandoId = null;
+        this.reglaEditando = null;
     }
     
     async guardarTarea() {
@@ -520,6 +637,7 @@ class SistemaTareas {
             titulo: document.getElementById('titulo').value.trim(),
             descripcion: document.getElementById('descripcion').value.trim(),
             fecha: document.getElementById('fecha').value || null,
+            recurrencia: this.reglaRecurrencia(),
             importancia: importanciaValue,
             asunto: document.getElementById('asunto-categoria').value.trim() || null,
             enlaces: this.recogerEnlacesTags(),
@@ -527,6 +645,14 @@ class SistemaTareas {
         };
     }
     
+    reglaRecurrencia() {
+        const frecuencia = document.getElementById('recurrencia').value;
+        if (!frecuencia) return null;
+        // Al editar se conserva la regla completa (días, cuenta, hasta) si no cambia la frecuencia
+        if (this.reglaEditando && this.reglaEditando.frecuencia === frecuencia) return this.reglaEditando;
+        return { frecuencia };
+    }
+    
     recogerEnlacesTags() {
         const enlaces = [];
         // Buscar elementos de enlace con prioridad al data-original-url
@@ -612,25 +738,54 @@ class SistemaTareas {
     // === API CALLS ===
     async cargarTodasLasTareas() {
         if (this.isLoading) {
-            console.warn('Ignorando cargarTodasLasTareas: ya hay una carga en curso');
+            // Se repite al terminar: la carga en curso puede no incluir el último cambio
+            this.recargaPendiente = true;
             return;
         }
         this.isLoading = true;
         try {
-            console.log('Fetching /api/tareas ...');
-            const response = await fetch('/api/tareas');
+            // Tras la primera carga solo se piden los cambios desde la última sincronización
+            const url = this.sincronizadoHasta
+                ? `/api/tareas?updated_since=${encodeURIComponent(this.sincronizadoHasta)}`
+                : '/api/tareas';
+            console.log('Fetching', url, '...');
+            const response = await fetch(url);
             if (response.ok) {
-                this.todasLasTareas = await response.json();
+                if (this.sincronizadoHasta) {
+                    const cambios = await response.json();
+                    this.aplicarCambiosTareas(cambios);
+                    this.sincronizadoHasta = cambios.sincronizado_hasta;
+                } else {
+                    this.todasLasTareas = await response.json();
+                    this.sincronizadoHasta = response.headers.get('X-Sincronizado-Hasta');
+                }
                 console.log('Tareas cargadas:', this.todasLasTareas.map(t=>t.id));
                 this.renderKanban();
+            } else if (this.sincronizadoHasta && (response.status === 410 || response.status === 400)) {
+                // El servidor ya no conserva los cambios desde la marca (410) o no la reconoce
+                // (400, marca de otra versión): se repite con una carga completa
+                this.sincronizadoHasta = null;
+                this.recargaPendiente = true;
             }
         } catch (error) {
             console.error('Error al cargar tareas:', error);
         } finally {
             this.isLoading = false;
+            if (this.recargaPendiente) {
+                this.recargaPendiente = false;
+                this.cargarTodasLasTareas();
+            }
         }
     }
     
+    aplicarCambiosTareas(cambios) {
+        // Fusionar la respuesta de updated_since: reemplazar/añadir cambiadas y quitar eliminadas
+        const porId = new Map(this.todasLasTareas.map(t => [t.id, t]));
+        (cambios.tareas || []).forEach(t => porId.set(t.id, t));
+        (cambios.eliminadas || []).forEach(id => porId.delete(id));
+        this.todasLasTareas = Array.from(porId.values());
+    }
+    
     async cargarTareasDelDia(fecha) {
         try {
             const response = await fetch(`/api/tareas/fecha/${fecha}`);
@@ -691,15 +846,17 @@ class SistemaTareas {
                         const action = button.dataset.action;
                         const id = parseInt(button.dataset.id);
                         
+                        // En una repetición los botones afectan solo a ese día
                         if (action === 'completar') {
-                            this.toggleCompletarTarea(id);
+                            tarea.recurrente ? this.toggleCompletarOcurrencia(tarea) : this.toggleCompletarTarea(id);
                         } else if (action === 'eliminar') {
-                            this.eliminarTarea(id);
+                            tarea.recurrente ? this.omitirOcurrencia(tarea) : this.eliminarTarea(id);
                         }
                     } else {
-                        // Click en la tarea (no en botones) - abrir modal
+                        // Click en la tarea (no en botones) - abrir modal; una repetición abre su serie
                         console.log('Abriendo modal para tarea:', tarea.titulo);
-                        this.abrirTareaDetalle(tarea);
+                        const serie = tarea.recurrente ? this.todasLasTareas.find(t => t.id === tarea.id) : null;
+                        this.abrirTareaDetalle(serie || tarea);
                     }
                 });
             }
@@ -720,6 +877,7 @@ class SistemaTareas {
         document.getElementById('fecha').value = tarea.fecha || '';
         document.getElementById('asunto-categoria').value = tarea.asunto || '';
         document.getElementById('importancia').value = tarea.importancia || 'baja';
+        this.mostrarRecurrencia(tarea);
         
         // Seleccionar importancia
         document.querySelectorAll('.boton-importancia').forEach(b => b.classList.remove('seleccionada'));
@@ -778,6 +936,46 @@ class SistemaTareas {
         }
     }
     
+    mostrarRecurrencia(tarea) {
+        this.reglaEditando = tarea.recurrencia || null;
+        document.getElementById('recurrencia').value = tarea.recurrencia ? tarea.recurrencia.frecuencia : '';
+    }
+    
+    async cambiarOcurrencia(tarea, metodo, cuerpo) {
+        // Cambios de una sola repetición (PUT/DELETE /api/tareas/<id>/ocurrencias/<fecha>)
+        try {
+            const response = await fetch(`/api/tareas/${tarea.id}/ocurrencias/${tarea.fecha}`, {
+                method: metodo,
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: cuerpo ? JSON.stringify(cuerpo) : undefined
+            });
+            if (response.ok) {
+                this.renderCalendario();
+                if (this.fechaSeleccionada) {
+                    this.cargarTareasDelDia(this.fechaSeleccionada);
+                }
+            }
+        } catch (error) {
+            console.error('Error al actualizar la repetición:', error);
+        }
+    }
+    
+    toggleCompletarOcurrencia(tarea) {
+        // Deshacer vuelve la repetición al status de la serie
+        if (tarea.status === 'completa') {
+            this.cambiarOcurrencia(tarea, 'DELETE');
+        } else {
+            this.cambiarOcurrencia(tarea, 'PUT', { status: 'completa' });
+        }
+    }
+    
+    omitirOcurrencia(tarea) {
+        if (!confirm('¿Quitar esta repetición? El resto de la serie se mantiene.')) return;
+        this.cambiarOcurrencia(tarea, 'PUT', { omitida: true });
+    }
+    
     async toggleCompletarTarea(id) {
         console.log('Toggling tarea completada:', id);
         try {
@@ -880,6 +1078,7 @@ class SistemaTareas {
         // DESPUÉS establecer el ID para edición (para que no se limpie)
         console.log('Estableciendo ID para edición:', tarea.id);
         this.tareaEditandoId = tarea.id;
+        this.mostrarRecurrencia(tarea);
     }
     
     // === UTILIDADES ===
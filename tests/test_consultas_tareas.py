@@ -0,0 +1,99 @@
+# tests/test_consultas_tareas.py - El número de consultas de la API de tareas no crece con las tareas
+"""
+/api/tareas y /api/tareas/fecha/<fecha> cargan los enlaces y contactos con
+selectinload (Tarea.query_con_relaciones): una consulta por tabla, no una
+por tarea. Se cuentan las sentencias de una petición con 1 y con N tareas
+(todas con enlaces y contactos) y deben ser las mismas.
+
+    python -m pytest tests/
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import User, Tarea, Enlace, Contacto
+from config import Config
+
+FECHA = '2026-03-02'
+MUCHAS_TAREAS = 25
+
+
+@pytest.fixture
+def app(tmp_path):
+    class ConfigPruebas(Config):
+        TESTING = True
+        SECRET_KEY = 'pruebas'
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'pruebas.db'}"
+
+    app = create_app(ConfigPruebas)
+    with app.app_context():
+        db.create_all()
+        user = User(name='Prueba', email='prueba@example.com')
+        user.set_password('secreto1')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'email': 'prueba@example.com', 'password': 'secreto1'})
+    assert respuesta.status_code == 302
+    return cliente
+
+
+def _crear_tareas(app, cantidad):
+    with app.app_context():
+        user = User.query.filter_by(email='prueba@example.com').one()
+        for i in range(cantidad):
+            tarea = Tarea(user_id=user.id, titulo=f'Tarea {i}', fecha=date.fromisoformat(FECHA), status='incompleta')
+            db.session.add(tarea)
+            db.session.flush()
+            db.session.add_all([
+                Enlace(tarea_id=tarea.id, url=f'https://example.com/{i}', titulo='Enlace'),
+                Enlace(tarea_id=tarea.id, url=f'https://example.com/{i}/b', titulo='Otro'),
+                Contacto(tarea_id=tarea.id, nombre=f'Contacto {i}', email='c@example.com'),
+            ])
+        db.session.commit()
+
+
+def _sentencias(app, cliente, url):
+    """Número de sentencias SQL que ejecuta una petición GET a `url`."""
+    sentencias = []
+
+    def contar(conn, cursor, sql, parametros, contexto, executemany):
+        sentencias.append(sql)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', contar)
+    try:
+        respuesta = cliente.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', contar)
+    assert respuesta.status_code == 200
+    return len(sentencias), respuesta.get_json()
+
+
+@pytest.mark.parametrize('url', ['/api/tareas', f'/api/tareas/fecha/{FECHA}'])
+def test_consultas_no_crecen_con_las_tareas(app, cliente, url):
+    _crear_tareas(app, 1)
+    # Primera petición fuera de la medida: cachés (usuario, ocurrencias) en el mismo estado en ambas
+    cliente.get(url)
+    con_una, datos = _sentencias(app, cliente, url)
+    assert len(datos) == 1
+    assert len(datos[0]['enlaces']) == 2 and len(datos[0]['contactos']) == 1
+
+    _crear_tareas(app, MUCHAS_TAREAS - 1)
+    cliente.get(url)
+    con_muchas, datos = _sentencias(app, cliente, url)
+    assert len(datos) == MUCHAS_TAREAS
+    assert all(len(t['enlaces']) == 2 and len(t['contactos']) == 1 for t in datos)
+
+    assert con_muchas == con_una
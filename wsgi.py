@@ -0,0 +1,31 @@
+# wsgi.py - Punto de entrada para servidores WSGI de producción
+"""
+Crea la aplicación con ProductionConfig. Con Gunicorn:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py carga este módulo una sola vez en el proceso maestro
+(preload_app) y después crea los workers con fork. Para desarrollo sigue
+usándose `python run.py`.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from werkzeug.middleware.proxy_fix import ProxyFix  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import ProductionConfig  # noqa: E402
+
+# Sin SECRET_KEY, Config usa una clave de desarrollo conocida: las sesiones se podrían falsificar
+if not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('Define SECRET_KEY en el entorno antes de arrancar en producción.')
+
+app = create_app(ProductionConfig)
+
+proxies = app.config['PROXIES_CONFIABLES']
+if proxies:
+    # url_for(_external=True) (p. ej. el redirect_uri de Google) usa el esquema y host del proxy
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)